@@ -0,0 +1,61 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+from dlpx.virtualization.libs import libs
+
+#
+# Content is passed to the host in environment variables, and Linux limits
+# the size of a single variable to 128KB. Larger content is written in chunks
+# of CHUNK_BYTES.
+#
+CHUNK_BYTES = 120 * 1024
+
+
+def write_chunked(remote_connection,
+                  content,
+                  variables,
+                  content_variable,
+                  first_script,
+                  next_script,
+                  commit_script,
+                  check=False):
+    """Writes content to a host in chunks of CHUNK_BYTES, one run_bash call
+    per chunk.
+
+    Each chunk is passed in the content_variable environment variable, along
+    with variables. first_script is run with the first chunk and next_script
+    with every following chunk, and commit_script is run after the last chunk
+    in the same call. Writing stops at the first call that exits with a
+    non-zero code or prints anything, so that first_script can skip content
+    that is already stored by printing a word.
+
+    Args:
+        remote_connection (RemoteConnection): Connection to the host.
+        content (str): The content to write.
+        variables (dict): The other environment variables of the scripts.
+        content_variable (str): The environment variable of the chunks.
+        first_script (str): Bash script writing the first chunk.
+        next_script (str): Bash script appending a following chunk.
+        commit_script (str): Bash script run once every chunk is written.
+        check (bool): Whether to raise if a call exits with a non-zero code.
+
+    Returns:
+        RunBashResponse: The result of the last call.
+    """
+    chunks = [
+        content[i:i + CHUNK_BYTES] for i in range(0, len(content), CHUNK_BYTES)
+    ] or ['']
+    variables = dict(variables)
+    for index, chunk in enumerate(chunks):
+        script = first_script if index == 0 else next_script
+        if index == len(chunks) - 1:
+            script = '{}\n{}'.format(script, commit_script)
+        variables[content_variable] = chunk
+        result = libs.run_bash(remote_connection,
+                               script,
+                               variables=variables,
+                               check=check)
+        if result.exit_code != 0 or result.stdout.strip():
+            break
+    return result
@@ -0,0 +1,230 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+# -*- coding: utf-8 -*-
+"""Incremental discovery based on a host fingerprint.
+
+Discovering the repositories and source configs on a large host can take many
+run_bash calls, and an environment refresh runs the whole discovery again even
+when nothing changed on the host. cached_discovery() lets a discovery
+operation declare a cheap fingerprint command instead, for example a listing
+of the installation directories. The output of that command is hashed and
+stored with the discovered objects in the scratch path of the host. On the
+next discovery, the fingerprint is computed again and the stored objects are
+returned without running the expensive discovery if it did not change:
+
+  from dlpx.virtualization.libs import discovery_cache
+  from generated.definitions import RepositoryDefinition
+
+  @plugin.discovery.repository()
+  def repository_discovery(source_connection):
+      return discovery_cache.cached_discovery(
+          source_connection,
+          'repositories',
+          'ls -l --time-style=+%s /opt/postgres',
+          RepositoryDefinition,
+          lambda: find_repositories(source_connection))
+
+Checking the fingerprint and reading the stored objects takes a single
+run_bash call. The stored objects are discarded once they are older than
+max_age seconds, and force_refresh=True, or invalidate(), always runs the
+discovery. The fingerprint command must change its output whenever a
+discovery would find something different. Only Unix hosts are supported.
+"""
+import hashlib
+import json
+import logging
+import re
+import time
+import uuid
+
+from dlpx.virtualization.common._common_classes import RemoteConnection
+from dlpx.virtualization.libs import _chunked, libs
+from dlpx.virtualization.libs.exceptions import (IncorrectArgumentTypeError,
+                                                 IncorrectCacheNameError)
+
+__all__ = ['cached_discovery', 'invalidate']
+
+logger = logging.getLogger(__name__)
+
+# The number of seconds the result of a discovery is reused for by default.
+DEFAULT_MAX_AGE = 24 * 60 * 60
+
+# The directory in the scratch path of the host the results are stored in.
+CACHE_DIRECTORY = '.dvp_discovery_cache'
+
+# The names results are stored under, which are used as file names.
+_NAME_FORMAT = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+CACHE_MARKER = '--- DVP DISCOVERY CACHE ---'
+
+_READ_SCRIPT = '''(
+{fingerprint_command}
+) || exit 1
+echo
+echo "$DVP_CACHE_MARKER"
+cat "$DVP_CACHE_FILE" 2>/dev/null
+exit 0'''
+
+_FIRST_CHUNK_SCRIPT = '''mkdir -p "$DVP_CACHE_DIRECTORY" || exit 1
+printf "%s" "$DVP_CACHE_CONTENT" > "$DVP_CACHE_TMP_FILE" || exit 1'''
+
+_NEXT_CHUNK_SCRIPT = ('printf "%s" "$DVP_CACHE_CONTENT"'
+                      ' >> "$DVP_CACHE_TMP_FILE" || exit 1')
+
+_COMMIT_SCRIPT = 'mv "$DVP_CACHE_TMP_FILE" "$DVP_CACHE_FILE"'
+
+_DISCARD_SCRIPT = 'rm -f "$DVP_CACHE_TMP_FILE"'
+
+_REMOVE_SCRIPT = 'rm -f "$DVP_CACHE_FILE"'
+
+_clock = time.time
+
+
+def _check_name(name):
+    if not _NAME_FORMAT.match(name) or name in ('.', '..'):
+        raise IncorrectCacheNameError(name, _NAME_FORMAT.pattern)
+
+
+def _cache_paths(remote_connection, name):
+    directory = '{}/{}'.format(
+        remote_connection.environment.host.scratch_path.rstrip('/'),
+        CACHE_DIRECTORY)
+    return directory, '{}/{}.json'.format(directory, name)
+
+
+def _load(cached, fingerprint, definition_class, max_age):
+    """Returns the stored definitions if they are for fingerprint and not
+    older than max_age seconds, None otherwise."""
+    try:
+        cache = json.loads(cached)
+        if cache['fingerprint'] != fingerprint:
+            return None
+        age = _clock() - cache['created']
+        if age < 0 or (max_age is not None and age > max_age):
+            return None
+        return [definition_class.from_dict(d) for d in cache['definitions']]
+    except Exception as err:
+        # A cache that cannot be read is a cache miss.
+        logger.debug('Ignoring unreadable discovery cache: {}'.format(err))
+        return None
+
+
+def _store(remote_connection, name, fingerprint, definitions):
+    content = json.dumps({
+        'fingerprint': fingerprint,
+        'created': _clock(),
+        'definitions': [definition.to_dict() for definition in definitions]
+    })
+    directory, path = _cache_paths(remote_connection, name)
+    variables = {
+        'DVP_CACHE_DIRECTORY': directory,
+        'DVP_CACHE_FILE': path,
+        'DVP_CACHE_TMP_FILE': '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+    }
+
+    result = _chunked.write_chunked(remote_connection, content, variables,
+                                    'DVP_CACHE_CONTENT', _FIRST_CHUNK_SCRIPT,
+                                    _NEXT_CHUNK_SCRIPT, _COMMIT_SCRIPT)
+    if result.exit_code != 0:
+        logger.warning('Unable to store the {} discovery result in {}: {}'
+                       .format(name, path, result.stderr))
+        libs.run_bash(remote_connection,
+                      _DISCARD_SCRIPT,
+                      variables=variables)
+
+
+def cached_discovery(remote_connection,
+                     name,
+                     fingerprint_command,
+                     definition_class,
+                     discover,
+                     max_age=DEFAULT_MAX_AGE,
+                     force_refresh=False):
+    """Returns the result of discover(), reusing the result stored on the host
+    while the output of fingerprint_command does not change.
+
+    Args:
+        remote_connection (RemoteConnection): Connection to the host the
+            discovery runs on.
+        name (str): Name of the stored result, unique within the plugin, e.g.
+            'repositories'. Used as a file name, so it may only contain
+            letters, digits, '_', '.' and '-'.
+        fingerprint_command (str): Bash command whose output changes whenever
+            the result of discover() would. A command that exits with a
+            non-zero code disables the reuse of results.
+        definition_class (Type): The generated class of the discovered
+            objects, used to rebuild them from the stored result.
+        discover (function): Runs the discovery and returns a list of
+            definition_class objects.
+        max_age (float): Number of seconds a stored result is reused for, or
+            None to reuse it for as long as the fingerprint matches.
+        force_refresh (bool): Whether to run discover() regardless of the
+            stored result.
+
+    Returns:
+        list: The discovered definition_class objects.
+
+    Raises:
+        IncorrectCacheNameError: If name cannot be used as a file name.
+    """
+    if not isinstance(remote_connection, RemoteConnection):
+        raise IncorrectArgumentTypeError('remote_connection',
+                                         type(remote_connection),
+                                         RemoteConnection)
+    if not isinstance(name, basestring):
+        raise IncorrectArgumentTypeError('name', type(name), basestring)
+    _check_name(name)
+    if not isinstance(fingerprint_command, basestring):
+        raise IncorrectArgumentTypeError('fingerprint_command',
+                                         type(fingerprint_command),
+                                         basestring)
+
+    _, path = _cache_paths(remote_connection, name)
+    result = libs.run_bash(
+        remote_connection,
+        _READ_SCRIPT.format(fingerprint_command=fingerprint_command),
+        variables={
+            'DVP_CACHE_MARKER': CACHE_MARKER,
+            'DVP_CACHE_FILE': path
+        })
+    if result.exit_code != 0:
+        logger.debug('The fingerprint command for {} failed, running the'
+                     ' discovery: {}'.format(name, result.stderr))
+        return list(discover())
+
+    output, _, cached = result.stdout.rpartition('\n{}\n'.format(CACHE_MARKER))
+    fingerprint = hashlib.sha256(output.encode('utf-8')).hexdigest()
+
+    if not force_refresh and cached:
+        definitions = _load(cached, fingerprint, definition_class, max_age)
+        if definitions is not None:
+            logger.debug('Reusing {} {} discovered earlier.'.format(
+                len(definitions), name))
+            return definitions
+
+    definitions = list(discover())
+    _store(remote_connection, name, fingerprint, definitions)
+    return definitions
+
+
+def invalidate(remote_connection, name):
+    """Removes the result stored by cached_discovery() for name, so that the
+    next discovery runs in full.
+
+    Args:
+        remote_connection (RemoteConnection): Connection to the host.
+        name (str): Name the result was stored under.
+    """
+    if not isinstance(remote_connection, RemoteConnection):
+        raise IncorrectArgumentTypeError('remote_connection',
+                                         type(remote_connection),
+                                         RemoteConnection)
+    if not isinstance(name, basestring):
+        raise IncorrectArgumentTypeError('name', type(name), basestring)
+    _check_name(name)
+    _, path = _cache_paths(remote_connection, name)
+    libs.run_bash(remote_connection,
+                  _REMOVE_SCRIPT,
+                  variables={'DVP_CACHE_FILE': path})
@@ -85,3 +85,21 @@ class IncorrectArgumentTypeError(PluginRuntimeError):
             expected,
             (' if defined', '')[required]))
         super(IncorrectArgumentTypeError, self).__init__(message)
+
+
+class IncorrectCacheNameError(PluginRuntimeError):
+    """IncorrectCacheNameError is thrown when a discovery cache function gets
+    called with a name that cannot be used as a file name.
+
+    Args:
+        name (str): The name that was passed in.
+        pattern (str): The regular expression names must match.
+
+    Attributes:
+        message (str): A user-readable message describing the exception.
+    """
+
+    def __init__(self, name, pattern):
+        message = ("The discovery cache name '{}' does not match '{}'.".format(
+            name, pattern))
+        super(IncorrectCacheNameError, self).__init__(message)
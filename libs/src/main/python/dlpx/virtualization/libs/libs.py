@@ -19,6 +19,11 @@ that one can invoke libs.run_bash(run_bash_request). In Jython, that
 object will in fact be a Java object that will delegate to a Java implementation
 of a lib operation.
 
+The wrappers keep no state between calls, so they may be called from several
+plugin operations running on different threads at the same time, as may the
+PlatformHandler logging handler. The engine side of the libs API must accept
+concurrent requests.
+
 .. _Google Python Style Guide:
    http://google.github.io/styleguide/pyguide.html
 
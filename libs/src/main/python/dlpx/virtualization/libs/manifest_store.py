@@ -0,0 +1,152 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+# -*- coding: utf-8 -*-
+"""Content addressed storage of bulky snapshot data on the staging host.
+
+The Delphix Engine keeps the metadata of every snapshot, so a snapshot that
+records a large file manifest makes the engine store it again and again.
+store_manifest() writes such data to the scratch path of the staging host
+instead and returns a short reference, derived from a hash of the content,
+to be kept in the snapshot. load_manifest() reads the data back and checks it
+against the reference:
+
+  from dlpx.virtualization.libs import manifest_store
+
+  @plugin.linked.post_snapshot()
+  def linked_post_snapshot(staged_source, repository, source_config,
+                           optional_snapshot_parameters):
+      files = list_data_files(staged_source)
+      reference = manifest_store.store_manifest(
+          staged_source.staged_connection, files)
+      return SnapshotDefinition(files_manifest=reference)
+
+  @plugin.virtual.configure()
+  def configure(virtual_source, snapshot, repository):
+      virtual_connection = virtual_source.connection
+      files = manifest_store.load_manifest(virtual_connection,
+                                           snapshot.files_manifest)
+
+The data must be JSON serializable. Identical data is stored once. The
+scratch path is not managed by the Delphix Engine, so the data is lost with
+the host it was stored on, and load_manifest() must be given a connection to
+that host, as in the example above where the virtual source runs on the
+staging host. Only Unix hosts are supported.
+"""
+import hashlib
+import json
+import re
+import uuid
+
+from dlpx.virtualization.common._common_classes import RemoteConnection
+from dlpx.virtualization.libs import _chunked, libs
+from dlpx.virtualization.libs.exceptions import (IncorrectArgumentTypeError,
+                                                 PluginScriptError)
+
+__all__ = ['store_manifest', 'load_manifest']
+
+# The directory in the scratch path of the host the manifests are stored in.
+MANIFEST_DIRECTORY = '.dvp_manifests'
+
+REFERENCE_PREFIX = 'sha256:'
+
+_REFERENCE_FORMAT = re.compile(r'^sha256:[0-9a-f]{64}$')
+
+_FIRST_CHUNK_SCRIPT = '''if [ -f "$DVP_MANIFEST_FILE" ]; then
+  echo exists
+  exit 0
+fi
+mkdir -p "$DVP_MANIFEST_DIRECTORY" || exit 1
+printf "%s" "$DVP_MANIFEST_CONTENT" > "$DVP_MANIFEST_TMP_FILE" || exit 1'''
+
+_NEXT_CHUNK_SCRIPT = ('printf "%s" "$DVP_MANIFEST_CONTENT"'
+                      ' >> "$DVP_MANIFEST_TMP_FILE" || exit 1')
+
+_COMMIT_SCRIPT = 'mv "$DVP_MANIFEST_TMP_FILE" "$DVP_MANIFEST_FILE"'
+
+_READ_SCRIPT = 'cat "$DVP_MANIFEST_FILE"'
+
+
+def _manifest_paths(remote_connection, digest):
+    directory = '{}/{}'.format(
+        remote_connection.environment.host.scratch_path.rstrip('/'),
+        MANIFEST_DIRECTORY)
+    return directory, '{}/{}.json'.format(directory, digest)
+
+
+def store_manifest(remote_connection, data):
+    """Stores data on the host and returns the reference to keep in the
+    snapshot.
+
+    Args:
+        remote_connection (RemoteConnection): Connection to the host, usually
+            the staged connection of the staged source.
+        data: The JSON serializable data to store.
+
+    Returns:
+        str: The reference of the data, e.g. 'sha256:<hex digest>'.
+    """
+    if not isinstance(remote_connection, RemoteConnection):
+        raise IncorrectArgumentTypeError('remote_connection',
+                                         type(remote_connection),
+                                         RemoteConnection)
+
+    content = json.dumps(data, separators=(',', ':'), sort_keys=True)
+    digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+    directory, path = _manifest_paths(remote_connection, digest)
+    variables = {
+        'DVP_MANIFEST_DIRECTORY': directory,
+        'DVP_MANIFEST_FILE': path,
+        'DVP_MANIFEST_TMP_FILE': '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+    }
+
+    _chunked.write_chunked(remote_connection,
+                           content,
+                           variables,
+                           'DVP_MANIFEST_CONTENT',
+                           _FIRST_CHUNK_SCRIPT,
+                           _NEXT_CHUNK_SCRIPT,
+                           _COMMIT_SCRIPT,
+                           check=True)
+    return REFERENCE_PREFIX + digest
+
+
+def load_manifest(remote_connection, reference):
+    """Returns the data stored on the host by store_manifest().
+
+    Args:
+        remote_connection (RemoteConnection): Connection to the host the data
+            was stored on.
+        reference (str): The reference returned by store_manifest().
+
+    Returns:
+        The stored data.
+
+    Raises:
+        PluginScriptError: If the data cannot be read or does not match the
+            reference.
+    """
+    if not isinstance(remote_connection, RemoteConnection):
+        raise IncorrectArgumentTypeError('remote_connection',
+                                         type(remote_connection),
+                                         RemoteConnection)
+    if not isinstance(reference, basestring):
+        raise IncorrectArgumentTypeError('reference', type(reference),
+                                         basestring)
+    if not _REFERENCE_FORMAT.match(reference):
+        raise ValueError(
+            "'{}' is not a manifest reference.".format(reference))
+
+    digest = reference[len(REFERENCE_PREFIX):]
+    _, path = _manifest_paths(remote_connection, digest)
+    result = libs.run_bash(remote_connection,
+                           _READ_SCRIPT,
+                           variables={'DVP_MANIFEST_FILE': path},
+                           check=True)
+    if hashlib.sha256(result.stdout.encode('utf-8')).hexdigest() != digest:
+        raise PluginScriptError(
+            'The manifest stored in {} on {} does not match its reference'
+            ' {}.'.format(path, remote_connection.environment.host.name,
+                          reference))
+    return json.loads(result.stdout)
@@ -2,7 +2,12 @@
 # Copyright (c) 2019 by Delphix. All rights reserved.
 #
 
+import os
+import subprocess
+
+import mock
 import pytest
+from dlpx.virtualization.api import libs_pb2
 from dlpx.virtualization.common._common_classes import RemoteUser, RemoteHost, RemoteEnvironment, RemoteConnection
 
 
@@ -26,3 +31,43 @@ def remote_environment(remote_host):
 @pytest.fixture
 def remote_connection(remote_environment, remote_user):
     return RemoteConnection(remote_environment, remote_user)
+
+
+class LocalHost(object):
+    """Stand-in for the engine's libs that runs bash commands locally."""
+    def __init__(self):
+        self.commands = []
+
+    def run_bash(self, request):
+        self.commands.append(request.command)
+        env = dict(os.environ)
+        env.update(request.variables)
+        process = subprocess.Popen(['bash', '-c', request.command],
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   env=env)
+        stdout, stderr = process.communicate()
+        response = libs_pb2.RunBashResponse()
+        response.return_value.exit_code = process.returncode
+        response.return_value.stdout = stdout
+        response.return_value.stderr = stderr
+        return response
+
+
+@pytest.fixture
+def local_host():
+    host = LocalHost()
+    with mock.patch('dlpx.virtualization._engine.libs.run_bash',
+                    side_effect=host.run_bash,
+                    create=True):
+        yield host
+
+
+@pytest.fixture
+def local_connection(tmpdir, remote_user):
+    """A connection to a host whose scratch path is in tmpdir."""
+    remote_host = RemoteHost('host', 'host-reference', 'binary_path',
+                             tmpdir.join('scratch').strpath)
+    environment = RemoteEnvironment('environment', 'environment-reference',
+                                    remote_host)
+    return RemoteConnection(environment, remote_user)
@@ -0,0 +1,125 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+import logging
+import threading
+import time
+
+import mock
+import pytest
+
+from dlpx.virtualization import libs
+from dlpx.virtualization.api import libs_pb2
+from dlpx.virtualization.libs import PlatformHandler
+from dlpx.virtualization.libs.exceptions import LibraryError
+
+THREAD_COUNT = 300
+
+
+class FakeEngineLibs(object):
+    """Thread-safe stand-in for dlpx.virtualization._engine.libs that answers
+    every request after a short delay so that calls overlap."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.logged = []
+
+    def run_bash(self, request):
+        time.sleep(0.001)
+        response = libs_pb2.RunBashResponse()
+        if request.command == 'fail':
+            response.error.actionable_error.id = 1
+            response.error.actionable_error.message = 'failed'
+            return response
+        response.return_value.exit_code = 0
+        response.return_value.stdout = '{} {}'.format(
+            request.command, request.variables['INDEX'])
+        return response
+
+    def log(self, request):
+        with self.lock:
+            self.logged.append(request.message)
+        return libs_pb2.LogResponse()
+
+
+def run_threads(target, count=THREAD_COUNT):
+    errors = []
+    start = threading.Event()
+
+    def run(index):
+        start.wait()
+        try:
+            target(index)
+        except Exception as err:
+            errors.append(err)
+
+    threads = [
+        threading.Thread(target=run, args=(i, )) for i in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    start.set()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+class TestConcurrency:
+    @staticmethod
+    @pytest.fixture
+    def engine_libs():
+        engine_libs = FakeEngineLibs()
+        with mock.patch('dlpx.virtualization._engine.libs.run_bash',
+                        side_effect=engine_libs.run_bash, create=True), \
+                mock.patch('dlpx.virtualization._engine.libs.log',
+                           side_effect=engine_libs.log, create=True):
+            yield engine_libs
+
+    @staticmethod
+    @pytest.fixture
+    def logger():
+        logger = logging.getLogger('test_libs_concurrency')
+        handler = PlatformHandler()
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        yield logger
+        logger.removeHandler(handler)
+
+    @staticmethod
+    def test_concurrent_run_bash(remote_connection, engine_libs):
+        results = {}
+
+        def call_run_bash(index):
+            result = libs.run_bash(remote_connection,
+                                   'status',
+                                   variables={'INDEX': str(index)})
+            results[index] = result.stdout
+
+        errors = run_threads(call_run_bash)
+
+        assert errors == []
+        assert results == dict(
+            (i, 'status {}'.format(i)) for i in range(THREAD_COUNT))
+
+    @staticmethod
+    def test_concurrent_run_bash_errors(remote_connection, engine_libs):
+        def call_run_bash(index):
+            command = 'fail' if index % 3 == 0 else 'status'
+            libs.run_bash(remote_connection,
+                          command,
+                          variables={'INDEX': str(index)})
+
+        errors = run_threads(call_run_bash)
+
+        assert len(errors) == len(range(0, THREAD_COUNT, 3))
+        assert all(isinstance(err, LibraryError) for err in errors)
+
+    @staticmethod
+    def test_concurrent_logging(engine_libs, logger):
+        errors = run_threads(
+            lambda index: logger.info('message {}'.format(index)))
+
+        assert errors == []
+        assert sorted(engine_libs.logged) == sorted(
+            'message {}'.format(i) for i in range(THREAD_COUNT))
@@ -0,0 +1,219 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+import mock
+import pytest
+from dlpx.virtualization.libs import _chunked, discovery_cache
+from dlpx.virtualization.libs.exceptions import (IncorrectArgumentTypeError,
+                                                 IncorrectCacheNameError)
+
+
+class Definition(object):
+    def __init__(self, name):
+        self.name = name
+
+    @staticmethod
+    def from_dict(input_dict):
+        return Definition(input_dict['name'])
+
+    def to_dict(self):
+        return {'name': self.name}
+
+
+class TestDiscoveryCache:
+    @staticmethod
+    @pytest.fixture
+    def host(local_host):
+        return local_host
+
+    @staticmethod
+    @pytest.fixture
+    def connection(local_connection):
+        return local_connection
+
+    @staticmethod
+    @pytest.fixture
+    def fingerprint_file(tmpdir):
+        path = tmpdir.join('installed')
+        path.write('postgres-11\n')
+        return path
+
+    @staticmethod
+    @pytest.fixture
+    def discoveries():
+        return []
+
+    @staticmethod
+    @pytest.fixture
+    def discover(discoveries):
+        def discover():
+            discoveries.append(None)
+            return [Definition('a'), Definition('b')]
+
+        return discover
+
+    @staticmethod
+    def discover_with(connection, fingerprint_file, discover, **kwargs):
+        return discovery_cache.cached_discovery(
+            connection, 'repositories',
+            'cat {}'.format(fingerprint_file.strpath), Definition, discover,
+            **kwargs)
+
+    @staticmethod
+    def test_unchanged_fingerprint_reuses_result(host, connection,
+                                                 fingerprint_file, discover,
+                                                 discoveries):
+        first = TestDiscoveryCache.discover_with(connection, fingerprint_file,
+                                                 discover)
+        host.commands = []
+        second = TestDiscoveryCache.discover_with(connection,
+                                                  fingerprint_file, discover)
+
+        assert len(discoveries) == 1
+        assert len(host.commands) == 1
+        assert [d.name for d in first] == ['a', 'b']
+        assert [d.name for d in second] == ['a', 'b']
+
+    @staticmethod
+    def test_changed_fingerprint_runs_discovery(host, connection,
+                                                fingerprint_file, discover,
+                                                discoveries):
+        TestDiscoveryCache.discover_with(connection, fingerprint_file,
+                                         discover)
+        fingerprint_file.write('postgres-11\npostgres-12\n')
+        TestDiscoveryCache.discover_with(connection, fingerprint_file,
+                                         discover)
+        TestDiscoveryCache.discover_with(connection, fingerprint_file,
+                                         discover)
+
+        assert len(discoveries) == 2
+
+    @staticmethod
+    def test_force_refresh(host, connection, fingerprint_file, discover,
+                           discoveries):
+        TestDiscoveryCache.discover_with(connection, fingerprint_file,
+                                         discover)
+        TestDiscoveryCache.discover_with(connection,
+                                         fingerprint_file,
+                                         discover,
+                                         force_refresh=True)
+
+        assert len(discoveries) == 2
+
+    @staticmethod
+    def test_stale_result_runs_discovery(host, connection, fingerprint_file,
+                                         discover, discoveries):
+        now = [1000.0]
+        with mock.patch.object(discovery_cache, '_clock', lambda: now[0]):
+            TestDiscoveryCache.discover_with(connection,
+                                             fingerprint_file,
+                                             discover,
+                                             max_age=60)
+            now[0] += 30
+            TestDiscoveryCache.discover_with(connection,
+                                             fingerprint_file,
+                                             discover,
+                                             max_age=60)
+            assert len(discoveries) == 1
+
+            now[0] += 31
+            TestDiscoveryCache.discover_with(connection,
+                                             fingerprint_file,
+                                             discover,
+                                             max_age=60)
+            assert len(discoveries) == 2
+
+    @staticmethod
+    def test_invalidate(host, connection, fingerprint_file, discover,
+                        discoveries):
+        TestDiscoveryCache.discover_with(connection, fingerprint_file,
+                                         discover)
+        discovery_cache.invalidate(connection, 'repositories')
+        TestDiscoveryCache.discover_with(connection, fingerprint_file,
+                                         discover)
+
+        assert len(discoveries) == 2
+
+    @staticmethod
+    def test_failed_fingerprint_command(host, connection, tmpdir, discover,
+                                        discoveries):
+        missing = tmpdir.join('missing')
+        for _ in range(2):
+            TestDiscoveryCache.discover_with(connection, missing, discover)
+
+        assert len(discoveries) == 2
+        assert not tmpdir.join('scratch').check()
+
+    @staticmethod
+    def test_corrupt_cache(host, connection, tmpdir, fingerprint_file,
+                           discover, discoveries):
+        TestDiscoveryCache.discover_with(connection, fingerprint_file,
+                                         discover)
+        tmpdir.join('scratch', discovery_cache.CACHE_DIRECTORY,
+                    'repositories.json').write('{"fingerprint": ')
+        result = TestDiscoveryCache.discover_with(connection,
+                                                  fingerprint_file, discover)
+
+        assert len(discoveries) == 2
+        assert [d.name for d in result] == ['a', 'b']
+
+    @staticmethod
+    def test_large_result_stored_in_chunks(host, connection, tmpdir,
+                                           fingerprint_file, discoveries):
+        names = [
+            '{:04d}'.format(i) + 'x' * 996
+            for i in range(2 * _chunked.CHUNK_BYTES // 1000)
+        ]
+
+        def discover():
+            discoveries.append(None)
+            return [Definition(name) for name in names]
+
+        TestDiscoveryCache.discover_with(connection, fingerprint_file,
+                                         discover)
+        result = TestDiscoveryCache.discover_with(connection,
+                                                  fingerprint_file, discover)
+
+        assert len(discoveries) == 1
+        assert [d.name for d in result] == names
+        assert [f.basename for f in tmpdir.join(
+            'scratch', discovery_cache.CACHE_DIRECTORY).listdir()] == [
+                'repositories.json'
+            ]
+
+    @staticmethod
+    def test_failed_store_logs_warning(host, connection, tmpdir,
+                                       fingerprint_file, discover,
+                                       discoveries, caplog):
+        tmpdir.join('scratch').write('not a directory')
+
+        TestDiscoveryCache.discover_with(connection, fingerprint_file,
+                                         discover)
+        TestDiscoveryCache.discover_with(connection, fingerprint_file,
+                                         discover)
+
+        assert len(discoveries) == 2
+        assert 'Unable to store the repositories discovery result' in (
+            caplog.text)
+
+    @staticmethod
+    def test_bad_name_type(connection, discover):
+        with pytest.raises(IncorrectArgumentTypeError) as err_info:
+            discovery_cache.cached_discovery(connection, 1, 'true',
+                                             Definition, discover)
+
+        assert err_info.value.message == (
+            "The function cached_discovery's argument 'name' was type 'int'"
+            " but should be of type 'basestring'.")
+
+    @staticmethod
+    @pytest.mark.parametrize('name', ['../x', 'a/b', '..', '', 'a b'])
+    def test_bad_name(connection, discover, tmpdir, name):
+        with pytest.raises(IncorrectCacheNameError):
+            discovery_cache.cached_discovery(connection, name, 'true',
+                                             Definition, discover)
+        with pytest.raises(IncorrectCacheNameError):
+            discovery_cache.invalidate(connection, name)
+
+        assert not tmpdir.join('scratch').check()
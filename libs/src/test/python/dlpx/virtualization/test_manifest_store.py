@@ -0,0 +1,85 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+import mock
+import pytest
+from dlpx.virtualization.libs import _chunked, manifest_store
+from dlpx.virtualization.libs.exceptions import (IncorrectArgumentTypeError,
+                                                 PluginScriptError)
+
+MANIFEST = {'files': ['/data/base/1', '/data/base/2'], 'size': 2}
+
+
+class TestManifestStore:
+    @staticmethod
+    def manifest_directory(tmpdir):
+        return tmpdir.join('scratch', manifest_store.MANIFEST_DIRECTORY)
+
+    @staticmethod
+    def test_store_and_load(local_host, local_connection, tmpdir):
+        reference = manifest_store.store_manifest(local_connection, MANIFEST)
+
+        assert reference.startswith('sha256:')
+        assert len(reference) == len('sha256:') + 64
+        assert manifest_store.load_manifest(local_connection,
+                                            reference) == MANIFEST
+        stored = TestManifestStore.manifest_directory(tmpdir).listdir()
+        assert [p.basename for p in stored] == [reference[7:] + '.json']
+
+    @staticmethod
+    def test_same_data_same_reference(local_host, local_connection):
+        reference = manifest_store.store_manifest(local_connection, MANIFEST)
+        local_host.commands = []
+        again = manifest_store.store_manifest(
+            local_connection, {
+                'size': 2,
+                'files': ['/data/base/1', '/data/base/2']
+            })
+
+        assert again == reference
+        assert len(local_host.commands) == 1
+
+    @staticmethod
+    def test_large_manifest_in_chunks(local_host, local_connection, tmpdir):
+        files = ['/data/base/{:06d}'.format(i) for i in range(20000)]
+        with mock.patch.object(_chunked, 'CHUNK_BYTES', 100 * 1024):
+            reference = manifest_store.store_manifest(local_connection,
+                                                      files)
+
+        assert len(local_host.commands) == 4
+        assert manifest_store.load_manifest(local_connection,
+                                            reference) == files
+        stored = TestManifestStore.manifest_directory(tmpdir).listdir()
+        assert len(stored) == 1
+
+    @staticmethod
+    def test_corrupt_manifest(local_host, local_connection, tmpdir):
+        reference = manifest_store.store_manifest(local_connection, MANIFEST)
+        TestManifestStore.manifest_directory(tmpdir).join(
+            reference[7:] + '.json').write('{"files": []}')
+
+        with pytest.raises(PluginScriptError):
+            manifest_store.load_manifest(local_connection, reference)
+
+    @staticmethod
+    def test_missing_manifest(local_host, local_connection):
+        with pytest.raises(PluginScriptError):
+            manifest_store.load_manifest(local_connection,
+                                         'sha256:' + '0' * 64)
+
+    @staticmethod
+    @pytest.mark.parametrize('reference',
+                             ['', 'md5:abc', 'sha256:../../etc/passwd'])
+    def test_bad_reference(local_connection, reference):
+        with pytest.raises(ValueError):
+            manifest_store.load_manifest(local_connection, reference)
+
+    @staticmethod
+    def test_bad_reference_type(local_connection):
+        with pytest.raises(IncorrectArgumentTypeError) as err_info:
+            manifest_store.load_manifest(local_connection, 1)
+
+        assert err_info.value.message == (
+            "The function load_manifest's argument 'reference' was type 'int'"
+            " but should be of type 'basestring'.")
@@ -0,0 +1,140 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+"""Benchmark for Plugin.dispatch().
+
+Measures the throughput of dispatching serialized requests for a few
+operation types against a plugin whose implementations do no work, so the
+numbers are the overhead of the platform wrappers: parsing the request,
+decoding the plugin defined objects, calling the implementation and
+serializing the response.
+
+The plugin's generated definitions are replaced by a minimal stand-in so the
+benchmark runs without building a plugin. Run from the platform directory
+after installing the package:
+
+    python benchmarks/bench_dispatch.py
+"""
+import imp
+import json
+import sys
+import timeit
+
+from dlpx.virtualization.api import platform_pb2
+
+CALLS = 2000
+REPEAT = 5
+
+
+class Definition(object):
+    swagger_types = {'name': str}
+
+    def __init__(self, name):
+        self.name = name
+
+    @classmethod
+    def from_dict(cls, input_dict):
+        return cls(input_dict.get('name'))
+
+    def to_dict(self):
+        return {'name': self.name}
+
+
+def install_definitions():
+    generated = imp.new_module('generated')
+    definitions = imp.new_module('generated.definitions')
+    for name in ('RepositoryDefinition', 'SourceConfigDefinition',
+                 'LinkedSourceDefinition', 'VirtualSourceDefinition',
+                 'SnapshotDefinition', 'SnapshotParametersDefinition'):
+        setattr(definitions, name, type(name, (Definition, ), {}))
+    generated.definitions = definitions
+    sys.modules['generated'] = generated
+    sys.modules['generated.definitions'] = definitions
+    return definitions
+
+
+def build_plugin(definitions):
+    from dlpx.virtualization.platform import Plugin, Status
+
+    plugin = Plugin()
+
+    @plugin.discovery.repository()
+    def repository_discovery(source_connection):
+        return [
+            definitions.RepositoryDefinition('repository-{}'.format(i))
+            for i in range(10)
+        ]
+
+    @plugin.virtual.status()
+    def virtual_status(virtual_source, repository, source_config):
+        return Status.ACTIVE
+
+    @plugin.linked.status()
+    def linked_status(staged_source, repository, source_config):
+        return Status.ACTIVE
+
+    @plugin.upgrade.repository('1.0')
+    def repository_upgrade(old_repository):
+        return old_repository
+
+    return plugin
+
+
+def requests():
+    parameters = json.dumps({'name': 'object'})
+
+    virtual_status = platform_pb2.VirtualStatusRequest()
+    virtual_status.virtual_source.guid = 'guid'
+    virtual_status.virtual_source.parameters.json = parameters
+    virtual_status.repository.parameters.json = parameters
+    virtual_status.source_config.parameters.json = parameters
+
+    linked_status = platform_pb2.StagedStatusRequest()
+    linked_status.staged_source.linked_source.guid = 'guid'
+    linked_status.staged_source.linked_source.parameters.json = parameters
+    linked_status.repository.parameters.json = parameters
+    linked_status.source_config.parameters.json = parameters
+
+    upgrade = platform_pb2.UpgradeRequest()
+    upgrade.type = platform_pb2.UpgradeRequest.REPOSITORY
+    upgrade.migration_ids.append('1')
+    for i in range(100):
+        upgrade.pre_upgrade_parameters['REPOSITORY-{}'.format(i)] = parameters
+
+    return [
+        ('discovery.repository', platform_pb2.RepositoryDiscoveryRequest()),
+        ('virtual.status', virtual_status),
+        ('linked.status', linked_status),
+        ('upgrade.repository', upgrade),
+    ]
+
+
+def main():
+    plugin = build_plugin(install_definitions())
+    print('Plugin warmed up in {:.2f} ms'.format(plugin.warm_up() * 1000))
+
+    for name, request in requests():
+        operations_type, method_name = name.split('.')
+        internal_method = getattr(getattr(plugin, operations_type),
+                                  '_internal_{}'.format(method_name))
+        request_bytes = request.SerializeToString()
+
+        def direct():
+            internal_method(request)
+
+        def dispatch():
+            plugin.dispatch(name, request_bytes)
+
+        direct_seconds = min(
+            timeit.repeat(direct, number=CALLS, repeat=REPEAT))
+        dispatch_seconds = min(
+            timeit.repeat(dispatch, number=CALLS, repeat=REPEAT))
+        print('{:<24} {:>6} bytes  wrapper {:9.0f} ops/s  dispatch {:9.0f}'
+              ' ops/s'.format(name, len(request_bytes),
+                              CALLS / direct_seconds,
+                              CALLS / dispatch_seconds))
+
+
+if __name__ == '__main__':
+    main()
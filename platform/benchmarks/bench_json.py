@@ -0,0 +1,88 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+"""Benchmark for the JSON facade used by the platform wrappers.
+
+Compares the standard library with dlpx.virtualization.platform._json_util on
+payloads shaped like the large ones the wrappers handle: snapshot metadata
+carrying a file manifest and the pre upgrade parameters of an upgrade request.
+
+Run from the platform directory after installing the package:
+
+    python benchmarks/bench_json.py
+"""
+import json
+import timeit
+
+from dlpx.virtualization.platform import _json_util
+
+REPEAT = 5
+
+
+def snapshot_payload(file_count=20000):
+    return {
+        'snapshotId': 'snapshot-1',
+        'engineVersion': '6.0.2.0',
+        'timestamp': '2020-04-01T12:00:00.000Z',
+        'manifest': [{
+            'path': '/data/shard-{}/file-{}.dbf'.format(i % 64, i),
+            'size': i * 8192,
+            'checksum': '{:032x}'.format(i),
+            'compressed': i % 2 == 0
+        } for i in range(file_count)]
+    }
+
+
+def upgrade_payload(object_count=10000):
+    return dict(('VIRTUAL_SOURCE-{}'.format(i),
+                 json.dumps({
+                     'name': 'vdb-{}'.format(i),
+                     'port': 5432 + i % 100,
+                     'mountLocation': '/mnt/provision/vdb-{}'.format(i),
+                     'config': {
+                         'sharedBuffers': '128MB',
+                         'parameters': ['a', 'b', 'c']
+                     }
+                 })) for i in range(object_count))
+
+
+def best_of(func):
+    return min(timeit.repeat(func, number=1, repeat=REPEAT))
+
+
+def report(name, baseline, candidate):
+    print('{:<40} stdlib {:8.2f} ms  facade {:8.2f} ms  ({:.2f}x)'.format(
+        name, baseline * 1000, candidate * 1000, baseline / candidate))
+
+
+def main():
+    print('JSON backend: {}'.format(_json_util.backend_name()))
+
+    snapshot = snapshot_payload()
+    snapshot_json = json.dumps(snapshot)
+    report('snapshot decode', best_of(lambda: json.loads(snapshot_json)),
+           best_of(lambda: _json_util.loads(snapshot_json)))
+    report('snapshot encode', best_of(lambda: json.dumps(snapshot)),
+           best_of(lambda: _json_util.dumps(snapshot)))
+    report('snapshot encode (compact)', best_of(lambda: json.dumps(snapshot)),
+           best_of(lambda: _json_util.dumps(snapshot, compact=True)))
+    print('snapshot size: {} bytes, compact {} bytes'.format(
+        len(snapshot_json), len(_json_util.dumps(snapshot, compact=True))))
+
+    upgrade = upgrade_payload()
+
+    def stdlib_upgrade():
+        for metadata in upgrade.values():
+            json.dumps(json.loads(metadata))
+
+    def facade_upgrade():
+        for metadata in upgrade.values():
+            _json_util.dumps(_json_util.loads(metadata))
+
+    report('upgrade decode + encode', best_of(stdlib_upgrade),
+           best_of(facade_upgrade))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+"""Benchmark for resolving and running upgrade migration chains.
+
+An upgrade request names the Lua version and the platform migration ids to
+run, and the platform resolves them into the chain of migration functions
+before running it on every object of the request. This compares the time to
+resolve a chain (what every request paid before chains were cached), to look
+up the cached chain of a new request, to look up the chain of a request again
+(the warm path), and to run a chain of trivial migrations on the objects of
+a request, so the resolving cost can be put in perspective.
+
+It then runs a large upgrade of every object type with a plugin that only has
+repository migrations, as an engine upgrade does when most object types have
+nothing to migrate. The objects of the other types are passed through
+untouched, and the time to decode and encode them, which they no longer pay,
+is shown alongside.
+
+Run from the platform directory after installing the package:
+
+    python benchmarks/bench_upgrade.py
+"""
+import itertools
+import json
+import timeit
+
+from dlpx.virtualization.api import platform_pb2
+from dlpx.virtualization.platform import MigrationType, Plugin, _json_util
+
+LUA_MIGRATIONS = 20
+PLATFORM_MIGRATIONS = 200
+CALLS = 200
+REPEAT = 5
+
+# The objects of each type in a large upgrade.
+LARGE_UPGRADE_OBJECTS = 20000
+
+# The upgrade operation and request type of every object type.
+OBJECT_TYPES = [
+    ('repository', platform_pb2.UpgradeRequest.REPOSITORY),
+    ('source_config', platform_pb2.UpgradeRequest.SOURCECONFIG),
+    ('linked_source', platform_pb2.UpgradeRequest.LINKEDSOURCE),
+    ('virtual_source', platform_pb2.UpgradeRequest.VIRTUALSOURCE),
+    ('snapshot', platform_pb2.UpgradeRequest.SNAPSHOT),
+]
+
+
+def build_plugin():
+    plugin = Plugin()
+
+    def migration(input_dict):
+        return input_dict
+
+    for i in range(LUA_MIGRATIONS):
+        plugin.upgrade.repository('1.{}'.format(i + 1),
+                                  MigrationType.LUA)(migration)
+    for i in range(PLATFORM_MIGRATIONS):
+        plugin.upgrade.repository('2020.{}'.format(i + 1))(migration)
+    return plugin
+
+
+def upgrade_request(objects):
+    request = platform_pb2.UpgradeRequest()
+    request.type = platform_pb2.UpgradeRequest.REPOSITORY
+    request.lua_upgrade_version = '1.1'
+    request.migration_ids.extend('2020.{}'.format(i + 1)
+                                 for i in range(PLATFORM_MIGRATIONS))
+    parameters = json.dumps({'name': 'repository', 'version': '1.0'})
+    for i in range(objects):
+        request.pre_upgrade_parameters['REPOSITORY-{}'.format(i)] = parameters
+    return request
+
+
+def large_upgrade_request(request_type, objects):
+    request = platform_pb2.UpgradeRequest()
+    request.type = request_type
+    request.migration_ids.extend('2020.{}'.format(i + 1)
+                                 for i in range(PLATFORM_MIGRATIONS))
+    for i in range(objects):
+        request.pre_upgrade_parameters['OBJECT-{}'.format(i)] = json.dumps({
+            'name': 'object-{}'.format(i),
+            'path': '/var/lib/objects/{}'.format(i),
+            'version': '1.0',
+            'tags': ['a', 'b', 'c']
+        })
+    return request
+
+
+def decode_and_encode(request):
+    for metadata in request.pre_upgrade_parameters.values():
+        _json_util.dumps(_json_util.loads(metadata))
+
+
+def per_call_micros(func):
+    return min(timeit.repeat(func, number=CALLS, repeat=REPEAT)) / CALLS * 1e6
+
+
+def main():
+    upgrade = build_plugin().upgrade
+    lua_getter = upgrade.lua_migrations.get_repository_impls_to_exec
+    platform_getter = upgrade.platform_migrations.get_repository_impls_to_exec
+
+    print('{} Lua and {} platform migrations'.format(LUA_MIGRATIONS,
+                                                     PLATFORM_MIGRATIONS))
+    request = upgrade_request(1)
+    print('resolve chain      {:10.1f} us'.format(
+        per_call_micros(lambda: upgrade._compile_chain(
+            request, lua_getter, platform_getter))))
+    # Alternating between two equal requests looks each one up as new.
+    requests = itertools.cycle([upgrade_request(0), upgrade_request(0)])
+    print('cached chain       {:10.1f} us'.format(
+        per_call_micros(lambda: upgrade._migration_chain(
+            next(requests), lua_getter, platform_getter))))
+    print('warm chain         {:10.1f} us'.format(
+        per_call_micros(lambda: upgrade._migration_chain(
+            request, lua_getter, platform_getter))))
+
+    chain = upgrade._migration_chain(request, lua_getter, platform_getter)
+    for objects in (1, 10, 100):
+        request = upgrade_request(objects)
+        print('run on {:>3} objects {:10.1f} us'.format(
+            objects,
+            per_call_micros(
+                lambda: upgrade._run_migration_chain(request, chain))))
+
+    print('')
+    print('Upgrade of {} objects per type, with repository migrations'
+          ' only'.format(LARGE_UPGRADE_OBJECTS))
+    print('{:<16}{:>12}{:>20}'.format('type', 'upgrade ms',
+                                      'decode+encode ms'))
+    for name, request_type in OBJECT_TYPES:
+        request = large_upgrade_request(request_type, LARGE_UPGRADE_OBJECTS)
+        operation = getattr(upgrade, '_internal_{}'.format(name))
+        print('{:<16}{:>12.1f}{:>20.1f}'.format(
+            name,
+            min(timeit.repeat(lambda: operation(request), number=1,
+                              repeat=REPEAT)) * 1e3,
+            min(timeit.repeat(lambda: decode_and_encode(request), number=1,
+                              repeat=REPEAT)) * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -7,44 +7,137 @@
 
 """
 import json
+import logging
+import types
 
-from dlpx.virtualization.api import common_pb2, platform_pb2
+from dlpx.virtualization.api import platform_pb2
 from dlpx.virtualization.common import RemoteConnection
+from dlpx.virtualization.common.exceptions import IncorrectTypeError
+from dlpx.virtualization.platform import _json_util
 from dlpx.virtualization.platform import validation_util as v
+from dlpx.virtualization.platform._interceptors import (InterceptorChain,
+                                                        intercepted)
 from dlpx.virtualization.platform.exceptions import (
     IncorrectReturnTypeError, OperationAlreadyDefinedError,
     OperationNotDefinedError)
 from dlpx.virtualization.platform.operation import Operation as Op
 
+logger = logging.getLogger(__name__)
+
 __all__ = ['DiscoveryOperations']
 
 
+def _identity_key(definition_dict, identity_fields):
+    """Returns a hashable key that is equal for definitions with equal
+    values for all identity fields. Without identity fields the whole
+    definition is its identity."""
+    if not identity_fields:
+        return json.dumps(definition_dict, sort_keys=True)
+    return tuple(
+        json.dumps(definition_dict.get(field), sort_keys=True)
+        for field in identity_fields)
+
+
+def _add_definitions(operation,
+                     definitions,
+                     definition_class,
+                     container,
+                     deduplicate=False):
+    """Validates the definitions returned by a discovery operation and adds
+    them to the repeated field container of the response.
+
+    Discovery operations return either a list or a generator of definitions.
+    The definitions are validated and encoded in a single pass, one at a time
+    as a generator produces them so that the plugin never has to hold all of
+    them in memory.
+
+    With deduplicate set, only the first of the definitions with the same
+    values for the identityFields of the schema, found in the identity_fields
+    attribute of the generated class, is added to the response.
+
+    Args:
+        operation (Operation): The discovery operation that was run.
+        definitions (list or generator): What the operation returned.
+        definition_class (Type): The class every definition must be of.
+        container (RepeatedCompositeFieldContainer): The repositories or
+            source_configs field of the response.
+        deduplicate (bool): Whether to drop duplicate definitions.
+    """
+    is_list = isinstance(definitions, list)
+    if not is_list and not isinstance(definitions, types.GeneratorType):
+        raise IncorrectReturnTypeError(operation, type(definitions),
+                                       [definition_class])
+
+    identity_fields = getattr(definition_class, 'identity_fields', None)
+    identity_keys = set()
+    duplicates = 0
+    for index, definition in enumerate(definitions):
+        if not isinstance(definition, definition_class):
+            if is_list:
+                invalid_items = v.find_invalid_items(definitions,
+                                                     definition_class, index)
+            else:
+                # The rest of a generator is not consumed.
+                invalid_items = v.InvalidItems('a generator',
+                                               [(index, type(definition))])
+            raise IncorrectReturnTypeError(operation, invalid_items,
+                                           [definition_class])
+        definition_dict = definition.to_dict()
+        if deduplicate:
+            identity_key = _identity_key(definition_dict, identity_fields)
+            if identity_key in identity_keys:
+                duplicates += 1
+                continue
+            identity_keys.add(identity_key)
+        container.add().parameters.json = _json_util.dumps(definition_dict)
+
+    if duplicates:
+        logger.info('Dropped {} duplicate definitions returned by the {}'
+                    ' operation.'.format(duplicates, operation.value))
+
+
 class DiscoveryOperations(object):
-    def __init__(self):
+    def __init__(self, interceptor_chain=None):
         self.repository_impl = None
         self.source_config_impl = None
+        self.repository_deduplicate = False
+        self.source_config_deduplicate = False
+        if interceptor_chain is None:
+            interceptor_chain = InterceptorChain()
+        self._interceptor_chain = interceptor_chain
+
+    def repository(self, deduplicate=False):
+        if not isinstance(deduplicate, bool):
+            raise IncorrectTypeError(DiscoveryOperations, 'deduplicate',
+                                     type(deduplicate), bool, False)
 
-    def repository(self):
         def repository_decorator(repository_impl):
             if self.repository_impl:
                 raise OperationAlreadyDefinedError(Op.DISCOVERY_REPOSITORY)
 
             self.repository_impl = v.check_function(repository_impl,
                                                     Op.DISCOVERY_REPOSITORY)
+            self.repository_deduplicate = deduplicate
             return repository_impl
 
         return repository_decorator
 
-    def source_config(self):
+    def source_config(self, deduplicate=False):
+        if not isinstance(deduplicate, bool):
+            raise IncorrectTypeError(DiscoveryOperations, 'deduplicate',
+                                     type(deduplicate), bool, False)
+
         def source_config_decorator(source_config_impl):
             if self.source_config_impl:
                 raise OperationAlreadyDefinedError(Op.DISCOVERY_SOURCE_CONFIG)
             self.source_config_impl = v.check_function(
                 source_config_impl, Op.DISCOVERY_SOURCE_CONFIG)
+            self.source_config_deduplicate = deduplicate
             return source_config_impl
 
         return source_config_decorator
 
+    @intercepted(Op.DISCOVERY_REPOSITORY)
     def _internal_repository(self, request):
         """Repository discovery wrapper.
 
@@ -64,13 +157,6 @@ class DiscoveryOperations(object):
         """
         from generated.definitions import RepositoryDefinition
 
-        def to_protobuf(repository):
-            parameters = common_pb2.PluginDefinedObject()
-            parameters.json = json.dumps(repository.to_dict())
-            repository_protobuf = common_pb2.Repository()
-            repository_protobuf.parameters.CopyFrom(parameters)
-            return repository_protobuf
-
         if not self.repository_impl:
             raise OperationNotDefinedError(Op.DISCOVERY_REPOSITORY)
 
@@ -78,26 +164,15 @@ class DiscoveryOperations(object):
             source_connection=RemoteConnection.from_proto(
                 request.source_connection))
 
-        # Validate that this is a list of Repository objects
-        if not isinstance(repositories, list):
-            raise IncorrectReturnTypeError(Op.DISCOVERY_REPOSITORY,
-                                           type(repositories),
-                                           [RepositoryDefinition])
-
-        if not all(
-                isinstance(repo, RepositoryDefinition)
-                for repo in repositories):
-            raise IncorrectReturnTypeError(
-                Op.DISCOVERY_REPOSITORY, [type(repo) for repo in repositories],
-                [RepositoryDefinition])
-
         repository_discovery_response = (
             platform_pb2.RepositoryDiscoveryResponse())
-        repository_protobuf_list = [to_protobuf(repo) for repo in repositories]
-        repository_discovery_response.return_value.repositories.extend(
-            repository_protobuf_list)
+        _add_definitions(
+            Op.DISCOVERY_REPOSITORY, repositories, RepositoryDefinition,
+            repository_discovery_response.return_value.repositories,
+            self.repository_deduplicate)
         return repository_discovery_response
 
+    @intercepted(Op.DISCOVERY_SOURCE_CONFIG)
     def _internal_source_config(self, request):
         """Source config discovery wrapper.
 
@@ -122,43 +197,21 @@ class DiscoveryOperations(object):
         from generated.definitions import RepositoryDefinition
         from generated.definitions import SourceConfigDefinition
 
-        def to_protobuf(source_config):
-            parameters = common_pb2.PluginDefinedObject()
-            parameters.json = json.dumps(source_config.to_dict())
-            source_config_protobuf = common_pb2.SourceConfig()
-            source_config_protobuf.parameters.CopyFrom(parameters)
-            return source_config_protobuf
-
         if not self.source_config_impl:
             raise OperationNotDefinedError(Op.DISCOVERY_SOURCE_CONFIG)
 
         repository_definition = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
+            _json_util.loads(request.repository.parameters.json))
 
         source_configs = self.source_config_impl(
             source_connection=RemoteConnection.from_proto(
                 request.source_connection),
             repository=repository_definition)
 
-        # Validate that this is a list of SourceConfigDefinition objects
-        if not isinstance(source_configs, list):
-            raise IncorrectReturnTypeError(Op.DISCOVERY_SOURCE_CONFIG,
-                                           type(source_configs),
-                                           [SourceConfigDefinition])
-
-        if not all(
-                isinstance(config, SourceConfigDefinition)
-                for config in source_configs):
-            raise IncorrectReturnTypeError(
-                Op.DISCOVERY_SOURCE_CONFIG,
-                [type(config)
-                 for config in source_configs], [SourceConfigDefinition])
-
         source_config_discovery_response = (
             platform_pb2.SourceConfigDiscoveryResponse())
-        source_config_protobuf_list = [
-            to_protobuf(config) for config in source_configs
-        ]
-        source_config_discovery_response.return_value.source_configs.extend(
-            source_config_protobuf_list)
+        _add_definitions(
+            Op.DISCOVERY_SOURCE_CONFIG, source_configs, SourceConfigDefinition,
+            source_config_discovery_response.return_value.source_configs,
+            self.source_config_deduplicate)
         return source_config_discovery_response
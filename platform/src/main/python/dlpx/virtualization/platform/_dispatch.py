@@ -0,0 +1,112 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+# -*- coding: utf-8 -*-
+"""Dispatch table for serialized plugin operation requests
+
+Plugin.dispatch() lets the Delphix Engine run an operation with the serialized
+request message and get the serialized response back. Operations are named by
+their Operation, e.g. Operation.VIRTUAL_STATUS for
+VirtualOperations._internal_status. The linked pre and post snapshot
+operations each have a wrapper for direct and for staged linked sources, and
+are dispatched to the direct one with direct=True. The dispatch table binds
+every (Operation, direct) pair to its request message class and wrapper once
+per Plugin, and checks that every Operation is covered, so that a dispatch is
+a single dict lookup.
+"""
+import collections
+
+from dlpx.virtualization.api import platform_pb2
+from dlpx.virtualization.common.exceptions import PlatformError
+from dlpx.virtualization.platform.exceptions import UnknownOperationError
+from dlpx.virtualization.platform.operation import Operation as Op
+
+__all__ = ['DispatchEntry', 'DISPATCH_OPERATIONS']
+
+DispatchEntry = collections.namedtuple(
+    'DispatchEntry', ['operation', 'request_class', 'internal_method'])
+
+# The operations that run plugin code outside of any request.
+UNDISPATCHED_OPERATIONS = frozenset([Op.RUNTIME_INIT])
+
+# The operations with a wrapper for direct and for staged linked sources.
+DIRECT_OPERATIONS = frozenset(
+    [Op.LINKED_PRE_SNAPSHOT, Op.LINKED_POST_SNAPSHOT])
+
+# (Operation, direct, request message class) of every dispatchable operation.
+DISPATCH_OPERATIONS = (
+    (Op.DISCOVERY_REPOSITORY, False, platform_pb2.RepositoryDiscoveryRequest),
+    (Op.DISCOVERY_SOURCE_CONFIG, False,
+     platform_pb2.SourceConfigDiscoveryRequest),
+    (Op.LINKED_PRE_SNAPSHOT, True, platform_pb2.DirectPreSnapshotRequest),
+    (Op.LINKED_POST_SNAPSHOT, True, platform_pb2.DirectPostSnapshotRequest),
+    (Op.LINKED_PRE_SNAPSHOT, False, platform_pb2.StagedPreSnapshotRequest),
+    (Op.LINKED_POST_SNAPSHOT, False, platform_pb2.StagedPostSnapshotRequest),
+    (Op.LINKED_START_STAGING, False, platform_pb2.StartStagingRequest),
+    (Op.LINKED_STOP_STAGING, False, platform_pb2.StopStagingRequest),
+    (Op.LINKED_STATUS, False, platform_pb2.StagedStatusRequest),
+    (Op.LINKED_WORKER, False, platform_pb2.StagedWorkerRequest),
+    (Op.LINKED_MOUNT_SPEC, False, platform_pb2.StagedMountSpecRequest),
+    (Op.VIRTUAL_CONFIGURE, False, platform_pb2.ConfigureRequest),
+    (Op.VIRTUAL_UNCONFIGURE, False, platform_pb2.UnconfigureRequest),
+    (Op.VIRTUAL_RECONFIGURE, False, platform_pb2.ReconfigureRequest),
+    (Op.VIRTUAL_START, False, platform_pb2.StartRequest),
+    (Op.VIRTUAL_STOP, False, platform_pb2.StopRequest),
+    (Op.VIRTUAL_PRE_SNAPSHOT, False, platform_pb2.VirtualPreSnapshotRequest),
+    (Op.VIRTUAL_POST_SNAPSHOT, False,
+     platform_pb2.VirtualPostSnapshotRequest),
+    (Op.VIRTUAL_STATUS, False, platform_pb2.VirtualStatusRequest),
+    (Op.VIRTUAL_INITIALIZE, False, platform_pb2.InitializeRequest),
+    (Op.VIRTUAL_MOUNT_SPEC, False, platform_pb2.VirtualMountSpecRequest),
+    (Op.UPGRADE_REPOSITORY, False, platform_pb2.UpgradeRequest),
+    (Op.UPGRADE_SOURCE_CONFIG, False, platform_pb2.UpgradeRequest),
+    (Op.UPGRADE_LINKED_SOURCE, False, platform_pb2.UpgradeRequest),
+    (Op.UPGRADE_VIRTUAL_SOURCE, False, platform_pb2.UpgradeRequest),
+    (Op.UPGRADE_SNAPSHOT, False, platform_pb2.UpgradeRequest),
+)
+
+
+def internal_method_name(operation, direct=False):
+    """Returns the type of the operations object and the name of the wrapper
+    of an operation, e.g. ('virtual', '_internal_status') for
+    Operation.VIRTUAL_STATUS."""
+    operations_type, method_name = operation.value[:-len('()')].split('.')
+    if operation in DIRECT_OPERATIONS:
+        method_name = '{}_{}'.format('direct' if direct else 'staged',
+                                     method_name)
+    return operations_type, '_internal_{}'.format(method_name)
+
+
+def build_dispatch_table(operations_by_type):
+    """Binds every dispatchable operation to its wrapper.
+
+    Args:
+        operations_by_type (dict): The operations objects of a Plugin keyed
+            on their type name ('discovery', 'linked', 'virtual', 'upgrade').
+
+    Returns:
+        dict: The DispatchEntry of every (Operation, direct) pair.
+
+    Raises:
+        UnknownOperationError: If an entry is not a dispatchable Operation.
+        PlatformError: If an Operation has no entry.
+    """
+    table = {}
+    for operation, direct, request_class in DISPATCH_OPERATIONS:
+        if (not isinstance(operation, Op)
+                or operation in UNDISPATCHED_OPERATIONS
+                or (direct and operation not in DIRECT_OPERATIONS)):
+            raise UnknownOperationError(operation, direct)
+        operations_type, method_name = internal_method_name(operation, direct)
+        internal_method = getattr(operations_by_type[operations_type],
+                                  method_name)
+        table[(operation, direct)] = DispatchEntry(operation, request_class,
+                                                   internal_method)
+
+    missing = (set(Op) - UNDISPATCHED_OPERATIONS -
+               set(operation for operation, _ in table))
+    if missing:
+        raise PlatformError('The operations {} have no dispatch entry.'.format(
+            ', '.join(sorted(operation.value for operation in missing))))
+    return table
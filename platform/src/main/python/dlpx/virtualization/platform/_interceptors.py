@@ -0,0 +1,170 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+# -*- coding: utf-8 -*-
+"""Interceptors for plugin operations
+
+An interceptor is run around every plugin operation the Delphix Engine
+dispatches to the plugin (the _internal_* wrappers of DiscoveryOperations,
+LinkedOperations, VirtualOperations and UpgradeOperations). Interceptors are
+given to the Plugin object in the order they should run, the first one being
+the outermost:
+
+  from dlpx.virtualization.platform import OperationInterceptor, Plugin
+
+  class LatencyLogger(OperationInterceptor):
+      def after(self, invocation):
+          logger.debug('{} took {:.3f}s'.format(
+              invocation.operation.value, invocation.latency))
+
+  my_db_plugin = Plugin(interceptors=[LatencyLogger()])
+
+Interceptors that only observe operations override before and after. Those
+that need to wrap the call itself (e.g. to enable a profiler) override
+intercept and must call proceed() exactly once.
+"""
+import functools
+import timeit
+
+from dlpx.virtualization.common.exceptions import IncorrectTypeError
+from dlpx.virtualization.platform import _operation_context
+from dlpx.virtualization.platform import validation_util as v
+
+__all__ = ['OperationInterceptor', 'OperationInvocation', 'InterceptorChain']
+
+
+class OperationInvocation(object):
+    """A single dispatch of a plugin operation.
+
+    latency, response and exception are only set once the wrapper has
+    returned, i.e. in OperationInterceptor.after or after proceed() returns.
+    """
+    def __init__(self, operation, request):
+        self._operation = operation
+        self._request = request
+        self._request_size = None
+        self.latency = None
+        self.response = None
+        self.exception = None
+
+    @property
+    def operation(self):
+        """Operation: The operation being run."""
+        return self._operation
+
+    @property
+    def request(self):
+        """The protobuf request message sent by the Delphix Engine."""
+        return self._request
+
+    @property
+    def source_guid(self):
+        """str: The guid of the source the operation runs on, or None if the
+        operation does not run on a source."""
+        return _operation_context.request_source_guid(self._request)
+
+    @property
+    def request_size(self):
+        """int: The serialized size of the request in bytes."""
+        if self._request_size is None:
+            self._request_size = self._request.ByteSize()
+        return self._request_size
+
+
+class OperationInterceptor(object):
+    """Base class for interceptors of plugin operations."""
+    def intercept(self, invocation, proceed):
+        """Runs around the operation.
+
+        Args:
+            invocation (OperationInvocation): The operation being run.
+            proceed (callable): Runs the rest of the chain and the operation
+                and returns its response.
+
+        Returns:
+            The response of the operation.
+        """
+        self.before(invocation)
+        try:
+            return proceed()
+        finally:
+            self.after(invocation)
+
+    def before(self, invocation):
+        """Called before the operation is run."""
+        pass
+
+    def after(self, invocation):
+        """Called after the operation is run, whether it failed or not."""
+        pass
+
+
+class InterceptorChain(object):
+    """The ordered interceptors shared by the operations of a Plugin.
+
+    Args:
+        interceptors (list of OperationInterceptor): The interceptors, the
+            first one being the outermost.
+    """
+    def __init__(self, interceptors=None):
+        interceptors = list(interceptors) if interceptors else []
+        invalid_interceptors = v.find_invalid_items(interceptors,
+                                                    OperationInterceptor)
+        if invalid_interceptors:
+            raise IncorrectTypeError(InterceptorChain, 'interceptors',
+                                     invalid_interceptors,
+                                     [OperationInterceptor])
+        self._interceptors = tuple(interceptors)
+
+    @property
+    def interceptors(self):
+        """tuple of OperationInterceptor: The interceptors of this chain."""
+        return self._interceptors
+
+    def invoke(self, operation, internal_method, request):
+        """Runs internal_method(request) through every interceptor."""
+        if not self._interceptors:
+            return internal_method(request)
+
+        invocation = OperationInvocation(operation, request)
+
+        def run_operation():
+            start = timeit.default_timer()
+            try:
+                invocation.response = internal_method(request)
+                return invocation.response
+            except Exception as err:
+                invocation.exception = err
+                raise
+            finally:
+                invocation.latency = timeit.default_timer() - start
+
+        proceed = run_operation
+        for interceptor in reversed(self._interceptors):
+            proceed = functools.partial(interceptor.intercept, invocation,
+                                        proceed)
+        return proceed()
+
+
+def intercepted(operation):
+    """Decorator for the _internal_* wrappers of the operations classes.
+
+    The decorated method dispatches through the InterceptorChain stored on
+    the operations object, with the operation set as the OperationContext of
+    the current thread.
+    """
+    def intercepted_decorator(internal_method):
+        @functools.wraps(internal_method)
+        def intercepted_wrapper(self, request):
+            previous = _operation_context.enter(operation, request)
+            try:
+                return self._interceptor_chain.invoke(
+                    operation, functools.partial(internal_method, self),
+                    request)
+            finally:
+                _operation_context.restore(previous)
+
+        return intercepted_wrapper
+
+    return intercepted_decorator
@@ -0,0 +1,92 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+# -*- coding: utf-8 -*-
+"""JSON facade for the platform wrappers
+
+Every plugin defined object crosses the wrappers as a JSON string. This module
+is the single place the wrappers use to convert between those strings and
+Python objects.
+
+Decoding uses orjson when it is importable and falls back to the standard
+library when it is not, or when orjson rejects a document the standard library
+accepts, so the set of documents accepted and the objects produced do not
+change. orjson parses numbers exactly like json.loads: floats are rounded
+correctly to the nearest double, and integers that do not fit in 64 bits as
+well as NaN and Infinity are rejected and therefore decoded by the standard
+library. Other fast libraries such as ujson are deliberately not used because
+they round some floats differently and handle big integers differently, which
+would change the values given to plugins.
+
+orjson only supports Python 3, so on Python 2.7, which the wrappers run on
+today, loads() is json.loads() and this module is a plain indirection with no
+speedup. It only keeps the choice of decoder in one place for when the
+wrappers run on Python 3.
+
+Encoding always goes through the standard library encoder, and dumps() returns
+exactly the same bytes as json.dumps(). dumps(obj, compact=True) drops the
+whitespace after separators and therefore changes the bytes. It is only used
+for output that is not compared with text encoded before: the snapshots
+returned by post snapshot operations, which are encoded once when the snapshot
+is taken and stored as they are, and the summary logged by upgrades.
+"""
+import json
+
+__all__ = ['loads', 'dumps', 'backend_name']
+
+COMPACT_SEPARATORS = (',', ':')
+
+
+def _select_backend():
+    try:
+        import orjson
+        return 'orjson', orjson.loads
+    except ImportError:
+        return 'json', None
+
+
+_BACKEND_NAME, _FAST_LOADS = _select_backend()
+
+
+def backend_name():
+    """str: The name of the library used to decode JSON."""
+    return _BACKEND_NAME
+
+
+def loads(json_string):
+    """Decodes a JSON string.
+
+    Args:
+        json_string (str): The JSON document to decode.
+
+    Returns:
+        The decoded Python object.
+    """
+    if _FAST_LOADS is not None:
+        try:
+            return _FAST_LOADS(json_string)
+        except (ValueError, OverflowError):
+            #
+            # The standard library accepts a few documents orjson does not
+            # (NaN, integers that do not fit in 64 bits, ...). Let it decide
+            # so that the behavior matches json.loads, including the error
+            # raised for invalid documents.
+            #
+            pass
+    return json.loads(json_string)
+
+
+def dumps(obj, compact=False):
+    """Encodes obj as a JSON string.
+
+    Args:
+        obj: The Python object to encode.
+        compact (bool): Whether to omit the whitespace after separators.
+
+    Returns:
+        str: The encoded JSON document.
+    """
+    if compact:
+        return json.dumps(obj, separators=COMPACT_SEPARATORS)
+    return json.dumps(obj)
@@ -6,32 +6,41 @@
 """LinkedOperations for the Virtualization Platform
 
 """
-import json
-
 from dlpx.virtualization.api import common_pb2, platform_pb2
 from dlpx.virtualization.common import RemoteConnection, RemoteEnvironment
-from dlpx.virtualization.common.exceptions import PluginRuntimeError
+from dlpx.virtualization.common.exceptions import (IncorrectTypeError,
+                                                   PluginRuntimeError)
 from dlpx.virtualization.platform import (DirectSource, Mount,
                                           MountSpecification, StagedSource,
                                           Status)
+from dlpx.virtualization.platform import _json_util
 from dlpx.virtualization.platform import validation_util as v
+from dlpx.virtualization.platform._interceptors import (InterceptorChain,
+                                                        intercepted)
 from dlpx.virtualization.platform.exceptions import (
     IncorrectReturnTypeError, OperationAlreadyDefinedError,
     OperationNotDefinedError)
 from dlpx.virtualization.platform.operation import Operation as Op
+from dlpx.virtualization.platform.snapshot_metadata import SnapshotSizeLimits
+from dlpx.virtualization.platform.worker import WorkerScheduler
 
 __all__ = ['LinkedOperations']
 
 
 class LinkedOperations(object):
-    def __init__(self):
+    def __init__(self, interceptor_chain=None):
         self.pre_snapshot_impl = None
         self.post_snapshot_impl = None
+        self.post_snapshot_size_limits = SnapshotSizeLimits()
         self.start_staging_impl = None
         self.stop_staging_impl = None
         self.status_impl = None
         self.worker_impl = None
+        self.worker_scheduler = None
         self.mount_specification_impl = None
+        if interceptor_chain is None:
+            interceptor_chain = InterceptorChain()
+        self._interceptor_chain = interceptor_chain
 
     def pre_snapshot(self):
         def pre_snapshot_decorator(pre_snapshot_impl):
@@ -43,12 +52,20 @@ class LinkedOperations(object):
 
         return pre_snapshot_decorator
 
-    def post_snapshot(self):
+    def post_snapshot(self, size_limits=None):
+        if (size_limits is not None
+                and not isinstance(size_limits, SnapshotSizeLimits)):
+            raise IncorrectTypeError(LinkedOperations, 'size_limits',
+                                     type(size_limits), SnapshotSizeLimits,
+                                     False)
+
         def post_snapshot_decorator(post_snapshot_impl):
             if self.post_snapshot_impl:
                 raise OperationAlreadyDefinedError(Op.LINKED_POST_SNAPSHOT)
             self.post_snapshot_impl = v.check_function(post_snapshot_impl,
                                                        Op.LINKED_POST_SNAPSHOT)
+            if size_limits is not None:
+                self.post_snapshot_size_limits = size_limits
             return post_snapshot_impl
 
         return post_snapshot_decorator
@@ -82,11 +99,17 @@ class LinkedOperations(object):
 
         return status_decorator
 
-    def worker(self):
+    def worker(self, scheduler=None):
+        if (scheduler is not None
+                and not isinstance(scheduler, WorkerScheduler)):
+            raise IncorrectTypeError(LinkedOperations, 'scheduler',
+                                     type(scheduler), WorkerScheduler, False)
+
         def worker_decorator(worker_impl):
             if self.worker_impl:
                 raise OperationAlreadyDefinedError(Op.LINKED_WORKER)
             self.worker_impl = v.check_function(worker_impl, Op.LINKED_WORKER)
+            self.worker_scheduler = scheduler
             return worker_impl
 
         return worker_decorator
@@ -101,6 +124,7 @@ class LinkedOperations(object):
 
         return mount_specification_decorator
 
+    @intercepted(Op.LINKED_PRE_SNAPSHOT)
     def _internal_direct_pre_snapshot(self, request):
         """Pre Snapshot Wrapper for direct plugins.
 
@@ -131,7 +155,8 @@ class LinkedOperations(object):
             raise OperationNotDefinedError(Op.LINKED_PRE_SNAPSHOT)
 
         direct_source_definition = LinkedSourceDefinition.from_dict(
-            json.loads(request.direct_source.linked_source.parameters.json))
+            _json_util.loads(
+                request.direct_source.linked_source.parameters.json))
         direct_source = DirectSource(
             guid=request.direct_source.linked_source.guid,
             connection=RemoteConnection.from_proto(
@@ -139,10 +164,11 @@ class LinkedOperations(object):
             parameters=direct_source_definition)
 
         repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
+            _json_util.loads(request.repository.parameters.json))
         source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
-        snap_params = json.loads(request.snapshot_parameters.parameters.json)
+            _json_util.loads(request.source_config.parameters.json))
+        snap_params = _json_util.loads(
+            request.snapshot_parameters.parameters.json)
         #
         # The snapshot_parameters object should be set to None if the json from
         # the protobuf is None to differentiate no snapshot parameters vs empty
@@ -164,6 +190,7 @@ class LinkedOperations(object):
 
         return direct_pre_snapshot_response
 
+    @intercepted(Op.LINKED_POST_SNAPSHOT)
     def _internal_direct_post_snapshot(self, request):
         """Post Snapshot Wrapper for direct plugins.
 
@@ -189,7 +216,8 @@ class LinkedOperations(object):
 
         def to_protobuf(snapshot):
             parameters = common_pb2.PluginDefinedObject()
-            parameters.json = json.dumps(snapshot.to_dict())
+            parameters.json = self.post_snapshot_size_limits.encode(
+                Op.LINKED_POST_SNAPSHOT, snapshot)
             snapshot_protobuf = common_pb2.Snapshot()
             snapshot_protobuf.parameters.CopyFrom(parameters)
             return snapshot_protobuf
@@ -198,7 +226,8 @@ class LinkedOperations(object):
             raise OperationNotDefinedError(Op.LINKED_POST_SNAPSHOT)
 
         direct_source_definition = LinkedSourceDefinition.from_dict(
-            json.loads(request.direct_source.linked_source.parameters.json))
+            _json_util.loads(
+                request.direct_source.linked_source.parameters.json))
         direct_source = DirectSource(
             guid=request.direct_source.linked_source.guid,
             connection=RemoteConnection.from_proto(
@@ -206,10 +235,11 @@ class LinkedOperations(object):
             parameters=direct_source_definition)
 
         repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
+            _json_util.loads(request.repository.parameters.json))
         source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
-        snap_params = json.loads(request.snapshot_parameters.parameters.json)
+            _json_util.loads(request.source_config.parameters.json))
+        snap_params = _json_util.loads(
+            request.snapshot_parameters.parameters.json)
         #
         # The snapshot_parameters object should be set to None if the json from
         # the protobuf is None to differentiate no snapshot parameters vs empty
@@ -237,6 +267,7 @@ class LinkedOperations(object):
 
         return direct_post_snapshot_response
 
+    @intercepted(Op.LINKED_PRE_SNAPSHOT)
     def _internal_staged_pre_snapshot(self, request):
         """Pre Snapshot Wrapper for staged plugins.
 
@@ -268,7 +299,7 @@ class LinkedOperations(object):
 
         linked_source = request.staged_source.linked_source
         staged_source_definition = (LinkedSourceDefinition.from_dict(
-            json.loads(linked_source.parameters.json)))
+            _json_util.loads(linked_source.parameters.json)))
         staged_mount = request.staged_source.staged_mount
         mount = Mount(remote_environment=RemoteEnvironment.from_proto(
             staged_mount.remote_environment),
@@ -284,10 +315,11 @@ class LinkedOperations(object):
                 request.staged_source.staged_connection))
 
         repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
+            _json_util.loads(request.repository.parameters.json))
         source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
-        snap_params = json.loads(request.snapshot_parameters.parameters.json)
+            _json_util.loads(request.source_config.parameters.json))
+        snap_params = _json_util.loads(
+            request.snapshot_parameters.parameters.json)
         #
         # The snapshot_parameters object should be set to None if the json from
         # the protobuf is None to differentiate no snapshot parameters vs empty
@@ -308,6 +340,7 @@ class LinkedOperations(object):
 
         return response
 
+    @intercepted(Op.LINKED_POST_SNAPSHOT)
     def _internal_staged_post_snapshot(self, request):
         """Post Snapshot Wrapper for staged plugins.
 
@@ -334,7 +367,8 @@ class LinkedOperations(object):
 
         def to_protobuf(snapshot):
             parameters = common_pb2.PluginDefinedObject()
-            parameters.json = json.dumps(snapshot.to_dict())
+            parameters.json = self.post_snapshot_size_limits.encode(
+                Op.LINKED_POST_SNAPSHOT, snapshot)
             snapshot_protobuf = common_pb2.Snapshot()
             snapshot_protobuf.parameters.CopyFrom(parameters)
             return snapshot_protobuf
@@ -343,7 +377,8 @@ class LinkedOperations(object):
             raise OperationNotDefinedError(Op.LINKED_POST_SNAPSHOT)
 
         staged_source_definition = LinkedSourceDefinition.from_dict(
-            json.loads(request.staged_source.linked_source.parameters.json))
+            _json_util.loads(
+                request.staged_source.linked_source.parameters.json))
         mount = Mount(
             remote_environment=RemoteEnvironment.from_proto(
                 request.staged_source.staged_mount.remote_environment),
@@ -359,10 +394,11 @@ class LinkedOperations(object):
                 request.staged_source.staged_connection))
 
         repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
+            _json_util.loads(request.repository.parameters.json))
         source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
-        snap_params = json.loads(request.snapshot_parameters.parameters.json)
+            _json_util.loads(request.source_config.parameters.json))
+        snap_params = _json_util.loads(
+            request.snapshot_parameters.parameters.json)
         #
         # The snapshot_parameters object should be set to None if the json from
         # the protobuf is None to differentiate no snapshot parameters vs empty
@@ -388,6 +424,7 @@ class LinkedOperations(object):
 
         return response
 
+    @intercepted(Op.LINKED_START_STAGING)
     def _internal_start_staging(self, request):
         """Start staging Wrapper for staged plugins.
 
@@ -417,7 +454,8 @@ class LinkedOperations(object):
             raise OperationNotDefinedError(Op.LINKED_START_STAGING)
 
         staged_source_definition = LinkedSourceDefinition.from_dict(
-            json.loads(request.staged_source.linked_source.parameters.json))
+            _json_util.loads(
+                request.staged_source.linked_source.parameters.json))
         mount = Mount(
             remote_environment=(RemoteEnvironment.from_proto(
                 request.staged_source.staged_mount.remote_environment)),
@@ -433,9 +471,9 @@ class LinkedOperations(object):
                 request.staged_source.staged_connection))
 
         repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
+            _json_util.loads(request.repository.parameters.json))
         source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
+            _json_util.loads(request.source_config.parameters.json))
 
         self.start_staging_impl(staged_source=staged_source,
                                 repository=repository,
@@ -447,6 +485,7 @@ class LinkedOperations(object):
 
         return start_staging_response
 
+    @intercepted(Op.LINKED_STOP_STAGING)
     def _internal_stop_staging(self, request):
         """Stop staging Wrapper for staged plugins.
 
@@ -476,7 +515,8 @@ class LinkedOperations(object):
             raise OperationNotDefinedError(Op.LINKED_STOP_STAGING)
 
         staged_source_definition = LinkedSourceDefinition.from_dict(
-            json.loads(request.staged_source.linked_source.parameters.json))
+            _json_util.loads(
+                request.staged_source.linked_source.parameters.json))
         mount = Mount(
             remote_environment=(RemoteEnvironment.from_proto(
                 request.staged_source.staged_mount.remote_environment)),
@@ -492,9 +532,9 @@ class LinkedOperations(object):
                 request.staged_source.staged_connection))
 
         repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
+            _json_util.loads(request.repository.parameters.json))
         source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
+            _json_util.loads(request.source_config.parameters.json))
 
         self.stop_staging_impl(staged_source=staged_source,
                                repository=repository,
@@ -506,6 +546,7 @@ class LinkedOperations(object):
 
         return stop_staging_response
 
+    @intercepted(Op.LINKED_STATUS)
     def _internal_status(self, request):
         """Staged Status Wrapper for staged plugins.
 
@@ -535,7 +576,8 @@ class LinkedOperations(object):
             raise OperationNotDefinedError(Op.LINKED_STATUS)
 
         staged_source_definition = LinkedSourceDefinition.from_dict(
-            json.loads(request.staged_source.linked_source.parameters.json))
+            _json_util.loads(
+                request.staged_source.linked_source.parameters.json))
         mount = Mount(
             remote_environment=(RemoteEnvironment.from_proto(
                 request.staged_source.staged_mount.remote_environment)),
@@ -551,9 +593,9 @@ class LinkedOperations(object):
                 request.staged_source.staged_connection))
 
         repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
+            _json_util.loads(request.repository.parameters.json))
         source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
+            _json_util.loads(request.source_config.parameters.json))
 
         status = self.status_impl(staged_source=staged_source,
                                   repository=repository,
@@ -569,6 +611,7 @@ class LinkedOperations(object):
 
         return staged_status_response
 
+    @intercepted(Op.LINKED_WORKER)
     def _internal_worker(self, request):
         """Staged Worker Wrapper for staged plugins.
 
@@ -597,8 +640,22 @@ class LinkedOperations(object):
         if not self.worker_impl:
             raise OperationNotDefinedError(Op.LINKED_WORKER)
 
+        staged_worker_response = platform_pb2.StagedWorkerResponse()
+        staged_worker_response.return_value.CopyFrom(
+            platform_pb2.StagedWorkerResult())
+
+        #
+        # A tick the scheduler skips is answered before anything in the
+        # request is decoded.
+        #
+        scheduler = self.worker_scheduler
+        guid = request.staged_source.linked_source.guid
+        if scheduler is not None and scheduler.should_skip(guid):
+            return staged_worker_response
+
         staged_source_definition = LinkedSourceDefinition.from_dict(
-            json.loads(request.staged_source.linked_source.parameters.json))
+            _json_util.loads(
+                request.staged_source.linked_source.parameters.json))
         mount = Mount(
             remote_environment=(RemoteEnvironment.from_proto(
                 request.staged_source.staged_mount.remote_environment)),
@@ -614,20 +671,23 @@ class LinkedOperations(object):
                 request.staged_source.staged_connection))
 
         repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
+            _json_util.loads(request.repository.parameters.json))
         source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
-
-        self.worker_impl(staged_source=staged_source,
-                         repository=repository,
-                         source_config=source_config)
-
-        staged_worker_response = platform_pb2.StagedWorkerResponse()
-        staged_worker_response.return_value.CopyFrom(
-            platform_pb2.StagedWorkerResult())
+            _json_util.loads(request.source_config.parameters.json))
+
+        if scheduler is None:
+            self.worker_impl(staged_source=staged_source,
+                             repository=repository,
+                             source_config=source_config)
+        else:
+            scheduler.run(
+                guid, lambda: self.worker_impl(staged_source=staged_source,
+                                               repository=repository,
+                                               source_config=source_config))
 
         return staged_worker_response
 
+    @intercepted(Op.LINKED_MOUNT_SPEC)
     def _internal_mount_specification(self, request):
         """Staged Mount/Ownership Spec Wrapper for staged plugins.
 
@@ -671,7 +731,8 @@ class LinkedOperations(object):
             raise OperationNotDefinedError(Op.LINKED_MOUNT_SPEC)
 
         staged_source_definition = LinkedSourceDefinition.from_dict(
-            json.loads(request.staged_source.linked_source.parameters.json))
+            _json_util.loads(
+                request.staged_source.linked_source.parameters.json))
         mount = Mount(
             remote_environment=(RemoteEnvironment.from_proto(
                 request.staged_source.staged_mount.remote_environment)),
@@ -687,7 +748,7 @@ class LinkedOperations(object):
                 request.staged_source.staged_connection))
 
         repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
+            _json_util.loads(request.repository.parameters.json))
 
         mount_spec = self.mount_specification_impl(staged_source=staged_source,
                                                    repository=repository)
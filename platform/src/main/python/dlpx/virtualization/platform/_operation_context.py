@@ -0,0 +1,97 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+# -*- coding: utf-8 -*-
+"""Context of the plugin operation running on the current thread
+
+Several plugin operations can run at the same time in one interpreter, each
+on its own thread. While a wrapper runs, the Operation and the guid of the
+source it runs on are kept in thread local state so that code shared by all
+operations (helpers, loggers, libraries) can find out which operation it is
+running for without having the arguments threaded through:
+
+  from dlpx.virtualization.platform import get_operation_context
+
+  context = get_operation_context()
+  if context is not None:
+      logger.debug('{} on {}'.format(context.operation.value, context.guid))
+
+Operations can be nested on a thread (an operation dispatching another one)
+and the outer context is restored once the inner operation returns.
+OperationContextFilter adds the context to log records as the operation and
+guid attributes, e.g. for a '%(operation)s %(guid)s %(message)s' format.
+"""
+import logging
+import threading
+
+__all__ = [
+    'OperationContext', 'OperationContextFilter', 'get_operation_context'
+]
+
+_LOCAL = threading.local()
+
+
+def request_source_guid(request):
+    """Returns the guid of the source a request message is for, or None if
+    the operation does not run on a source."""
+    fields = request.DESCRIPTOR.fields_by_name
+    if 'virtual_source' in fields:
+        return request.virtual_source.guid or None
+    for name in ('staged_source', 'direct_source'):
+        if name in fields:
+            return getattr(request, name).linked_source.guid or None
+    return None
+
+
+class OperationContext(object):
+    """The plugin operation running on a thread."""
+    def __init__(self, operation, request):
+        self._operation = operation
+        self._request = request
+
+    @property
+    def operation(self):
+        """Operation: The operation being run."""
+        return self._operation
+
+    @property
+    def guid(self):
+        """str: The guid of the source the operation runs on, or None."""
+        return request_source_guid(self._request)
+
+
+def get_operation_context():
+    """Returns the OperationContext of the operation running on the current
+    thread, or None if no operation is running on it."""
+    return getattr(_LOCAL, 'context', None)
+
+
+def enter(operation, request):
+    """Makes operation the operation running on the current thread.
+
+    Returns:
+        The previous OperationContext, to be passed to restore().
+    """
+    previous = getattr(_LOCAL, 'context', None)
+    _LOCAL.context = OperationContext(operation, request)
+    return previous
+
+
+def restore(previous):
+    """Restores the context returned by enter()."""
+    _LOCAL.context = previous
+
+
+class OperationContextFilter(logging.Filter):
+    """Logging filter that sets the operation and guid attributes of every
+    record to those of the operation running on the logging thread."""
+    def filter(self, record):
+        context = get_operation_context()
+        if context is None:
+            record.operation = None
+            record.guid = None
+        else:
+            record.operation = context.operation.value
+            record.guid = context.guid
+        return True
@@ -71,6 +71,39 @@ protobuf message, delegate to the user defined method that has logic for the
 virtualization operation itself (such as configure), and craft a response
 object.
 
+Runtime initialization
+
+The first operation run in a new interpreter also pays for importing the
+generated definitions and building the SDK state. Plugin.warm_up() does that
+work once, along with the plugin code decorated with runtime_init(), and logs
+how long it took:
+
+  @my_db_plugin.runtime_init()
+  def load_version_table():
+    ...
+
+  my_db_plugin.warm_up()
+
+Operations can also be run on serialized messages with Plugin.dispatch(),
+which takes the Operation and the serialized request and returns the
+serialized response:
+
+  response_bytes = my_db_plugin.dispatch(Operation.VIRTUAL_STATUS,
+                                         request_bytes)
+
+Thread safety
+
+The Dynamic Data Platform runtime may run several operations of a plugin at
+the same time on different threads of one interpreter. The plugin object and
+its operations must be fully defined (all decorators applied) when the plugin
+module has been imported; after that, Plugin and the operations classes are
+only read, and the wrappers, dispatch() and warm_up() can be called from any
+number of threads. The state shared by all operations (memoized results, job
+contexts and interceptor chain) is either immutable or guarded by a lock. The
+operation being run and its source guid are kept per thread, see
+get_operation_context(). Interceptors and plugin code must be
+thread-safe themselves.
+
 
 Note on method level imports: In method imports are needed for plugin defined
 modules (from generated.definitions). These imports will fail on a developer's
@@ -79,19 +112,47 @@ imports, the import for dlpx.virtualization.platform.Plugin will more likely
 fail. The internal methods should only be called by the platform so it's safe
 to have the import in the methods as the objects will exist at runtime.
 """
+import logging
+import threading
+import timeit
+
+from dlpx.virtualization.common.exceptions import IncorrectTypeError
 from dlpx.virtualization.platform import (DiscoveryOperations,
-                                          LinkedOperations, UpgradeOperations,
-                                          VirtualOperations)
+                                          InterceptorChain, LinkedOperations,
+                                          UpgradeOperations, VirtualOperations)
+from dlpx.virtualization.platform import _dispatch, _warm_up
+from dlpx.virtualization.platform import validation_util as v
+from dlpx.virtualization.platform.exceptions import (
+    OperationAlreadyDefinedError, UnknownOperationError)
+from dlpx.virtualization.platform.operation import Operation as Op
+
+logger = logging.getLogger(__name__)
 
 __all__ = ['Plugin']
 
 
 class Plugin(object):
-    def __init__(self):
-        self.__discovery = DiscoveryOperations()
-        self.__linked = LinkedOperations()
-        self.__virtual = VirtualOperations()
-        self.__upgrade = UpgradeOperations()
+    def __init__(self, interceptors=None):
+        """
+        Args:
+            interceptors (list of OperationInterceptor): Interceptors run
+                around every plugin operation, the first one being the
+                outermost.
+        """
+        self.__interceptor_chain = InterceptorChain(interceptors)
+        self.__discovery = DiscoveryOperations(self.__interceptor_chain)
+        self.__linked = LinkedOperations(self.__interceptor_chain)
+        self.__virtual = VirtualOperations(self.__interceptor_chain)
+        self.__upgrade = UpgradeOperations(self.__interceptor_chain)
+        self.__runtime_init_impl = None
+        self.__warm_up_lock = threading.Lock()
+        self.__warm_up_seconds = None
+        self.__dispatch_table = _dispatch.build_dispatch_table({
+            'discovery': self.__discovery,
+            'linked': self.__linked,
+            'virtual': self.__virtual,
+            'upgrade': self.__upgrade
+        })
 
     @property
     def discovery(self):
@@ -108,3 +169,68 @@ class Plugin(object):
     @property
     def upgrade(self):
         return self.__upgrade
+
+    @property
+    def interceptors(self):
+        return self.__interceptor_chain.interceptors
+
+    def runtime_init(self):
+        """Decorator for the plugin code to run once per interpreter before
+        the first plugin operation, e.g. to import modules or load data that
+        all operations need. The implementation takes no arguments.
+        """
+        def runtime_init_decorator(runtime_init_impl):
+            if self.__runtime_init_impl:
+                raise OperationAlreadyDefinedError(Op.RUNTIME_INIT)
+            self.__runtime_init_impl = v.check_function(
+                runtime_init_impl, Op.RUNTIME_INIT)
+            return runtime_init_impl
+
+        return runtime_init_decorator
+
+    def warm_up(self):
+        """Builds the SDK state the plugin operations need and runs the
+        runtime_init implementation.
+
+        Only the first call does any work, later calls return right away. If
+        the runtime_init implementation raises, the next call tries again.
+
+        Returns:
+            float: The number of seconds the warm up took.
+        """
+        with self.__warm_up_lock:
+            if self.__warm_up_seconds is None:
+                start = timeit.default_timer()
+                _warm_up.warm_up_sdk(self.__upgrade)
+                if self.__runtime_init_impl:
+                    self.__runtime_init_impl()
+                self.__warm_up_seconds = timeit.default_timer() - start
+                logger.info('Plugin runtime initialized in {:.3f}'
+                            ' seconds.'.format(self.__warm_up_seconds))
+            return self.__warm_up_seconds
+
+    def dispatch(self, operation, serialized_request, direct=False):
+        """Runs a plugin operation on a serialized request.
+
+        The plugin is warmed up first if it has not been yet.
+
+        Args:
+            operation (Operation): The operation to run, e.g.
+                Operation.VIRTUAL_STATUS.
+            serialized_request (bytes): The serialized request message of the
+                operation.
+            direct (bool): Whether to run the linked pre or post snapshot
+                operation of a direct linked source instead of a staged one.
+
+        Returns:
+            bytes: The serialized response message of the operation.
+        """
+        if not isinstance(operation, Op):
+            raise IncorrectTypeError(Plugin, 'operation', type(operation), Op)
+        entry = self.__dispatch_table.get((operation, direct))
+        if entry is None:
+            raise UnknownOperationError(operation, direct)
+        if self.__warm_up_seconds is None:
+            self.warm_up()
+        request = entry.request_class.FromString(serialized_request)
+        return entry.internal_method(request).SerializeToString()
@@ -8,6 +8,7 @@ import six
 from dlpx.virtualization.common import (RemoteConnection, RemoteEnvironment,
                                         RemoteHost)
 from dlpx.virtualization.common.exceptions import IncorrectTypeError
+from dlpx.virtualization.platform import validation_util as v
 from dlpx.virtualization.platform.exceptions import (
     IncorrectReferenceFormatError)
 """Classes used for Plugin Operations
@@ -147,6 +148,31 @@ class MigrationType(Enum):
 #
 
 
+# The references of the environments a Mount can be created from.
+_REFERENCE_FORMAT = re.compile(r"^(UNIX|WINDOWS)_HOST_ENVIRONMENT-\d+$")
+
+#
+# The RemoteEnvironments made up for Mounts created from a reference string.
+# They are immutable, so a single one is shared by all the Mounts on the same
+# environment. The number of environments is bounded by the size of the
+# engine, MAX_DUMMY_ENVIRONMENTS only guards against unexpected growth.
+#
+MAX_DUMMY_ENVIRONMENTS = 4096
+_DUMMY_HOST = RemoteHost("dummy host", "dummy reference", "dummy binary path",
+                         "dummy scratch path")
+_dummy_environments = {}
+
+
+def _dummy_environment(reference):
+    environment = _dummy_environments.get(reference)
+    if environment is None:
+        environment = RemoteEnvironment("dummy name", reference, _DUMMY_HOST)
+        if len(_dummy_environments) < MAX_DUMMY_ENVIRONMENTS:
+            environment = _dummy_environments.setdefault(
+                reference, environment)
+    return environment
+
+
 class Mount(object):
     def __init__(self, remote_environment, mount_path, shared_path=None):
         """A Mount object asks for multiple Python objects (RemoteEnvironment,
@@ -159,41 +185,18 @@ class Mount(object):
         the other parameters to be populated with dummy values. This saves the
         plugin writer from attempting to provide parameter values that they
         won't have access to."""
-        def __is_correct_reference_format(reference):
-            unix_format = re.compile("^UNIX_HOST_ENVIRONMENT-\d+$")
-            win_format = re.compile("^WINDOWS_HOST_ENVIRONMENT-\d+$")
-            return (bool(unix_format.match(reference))
-                    or bool(win_format.match(reference)))
-
-        def __make_remote_environment_from_reference(reference):
-            dummy_host = RemoteHost("dummy host", "dummy reference",
-                                    "dummy binary path", "dummy scratch path")
-            if (not isinstance(remote_environment, RemoteEnvironment)
-                    and not __is_correct_reference_format(remote_environment)):
-                raise RuntimeError(
-                    "Reference '{}' is not a valid host environment reference."
-                    .format(reference))
-            return RemoteEnvironment("dummy name", reference, dummy_host)
-
-        # if reference is not a RemoteEnvironment nor a string
-        if (not isinstance(remote_environment, RemoteEnvironment)
-                and not isinstance(remote_environment, six.string_types)):
+        if isinstance(remote_environment, six.string_types):
+            # If the plugin has provided us with just a valid reference
+            # string, convert to a real Python object
+            if not _REFERENCE_FORMAT.match(remote_environment):
+                raise IncorrectReferenceFormatError(remote_environment)
+            self._remote_environment = _dummy_environment(remote_environment)
+        elif isinstance(remote_environment, RemoteEnvironment):
+            self._remote_environment = remote_environment
+        else:
             raise IncorrectTypeError(Mount, 'remote_environment',
                                      type(remote_environment),
                                      [RemoteEnvironment, six.string_types[0]])
-        # if reference is a string, but incorrectly formatted
-        if isinstance(
-                remote_environment, six.string_types
-        ) and not __is_correct_reference_format(remote_environment):
-            raise IncorrectReferenceFormatError(remote_environment)
-
-        # If the plugin has provided us with just a valid reference string,
-        # convert to a real Python object
-        if isinstance(remote_environment, six.string_types):
-            self._remote_environment = (
-                __make_remote_environment_from_reference(remote_environment))
-        else:
-            self._remote_environment = remote_environment
         if not isinstance(mount_path, six.string_types):
             raise IncorrectTypeError(Mount, 'mount_path', type(mount_path),
                                      six.string_types[0])
@@ -247,10 +250,13 @@ class MountSpecification(object):
         if not isinstance(mounts, list):
             raise IncorrectTypeError(MountSpecification, 'mounts',
                                      type(mounts), [Mount])
-        if not all(isinstance(mount, Mount) for mount in mounts):
+        invalid_mounts = v.find_invalid_items(mounts, Mount)
+        if invalid_mounts:
             raise IncorrectTypeError(MountSpecification, 'mounts',
-                                     [type(mount) for mount in mounts],
-                                     [Mount])
+                                     invalid_mounts, [Mount])
+        self._init(mounts, ownership_specification)
+
+    def _init(self, mounts, ownership_specification):
         self._mounts = mounts
 
         if (ownership_specification and not isinstance(
@@ -262,6 +268,27 @@ class MountSpecification(object):
 
         self._ownership_specification = ownership_specification
 
+    @classmethod
+    def from_tuples(cls, mounts, ownership_specification=None):
+        """Creates a MountSpecification with many mounts in a single pass.
+
+        Each mount is given as the tuple of arguments of Mount, e.g.
+        (environment_reference, mount_path, shared_path). The Mounts are
+        validated as they are created, so the list is not checked again.
+
+        Args:
+            mounts (iterable of tuple): The arguments of each Mount.
+            ownership_specification (OwnershipSpecification): The
+                OwnershipSpecification of the MountSpecification.
+
+        Returns:
+            MountSpecification: The MountSpecification of the mounts.
+        """
+        mount_specification = cls.__new__(cls)
+        mount_specification._init([Mount(*args) for args in mounts],
+                                  ownership_specification)
+        return mount_specification
+
     @property
     def mounts(self):
         """list of Mount: List of mounts for this MountSpecification"""
@@ -1,5 +1,5 @@
 #
-# Copyright (c) 2019 by Delphix. All rights reserved.
+# Copyright (c) 2019, 2020 by Delphix. All rights reserved.
 #
 
 # -*- coding: utf-8 -*-
@@ -11,27 +11,297 @@ decorator specifying the migration id. We save the implementations of each of
 the upgrade functions in a dict for the specific schema. For each new upgrade
 operation of the same schema, the key will be the migration id, and the value
 will be the function that was implemented.
+
+The migrations to run for a request depend only on the object type, the Lua
+version and the migration ids of the request, and an engine upgrade sends the
+same combination for every batch of objects of a type. The resolved chain of
+migrations is therefore compiled once and cached on that key. Requests often
+name migrations that have no implementation for their object type, and when
+the chain is empty the objects are returned as they were sent, without
+decoding and encoding their JSON.
+
+An engine upgrade can send tens of thousands of objects of a type at once.
+With upgrade.parallel(), requests with at least min_objects objects are
+migrated by a pool of processes instead: the objects are sorted by reference
+and split into shards of raw JSON strings, each worker process runs the chain
+on its shards, and the results are put back together in order. The worker
+processes are forked from the plugin process and inherit the compiled chain,
+so migrations must be pure functions of their input and must not call the
+platform libraries. Where processes cannot be forked, e.g. on Windows, the
+objects are always migrated in the plugin process. Serial or parallel, an
+object whose migration fails is reported with an ObjectMigrationError naming
+the object and the type of the exception raised, and a UserError is raised
+to the user as it was raised by the migration.
+
+Many objects of a request often carry identical metadata. Migrations can be
+declared pure with the pure argument of their decorator, and a chain made
+only of pure migrations is run once for each distinct metadata of a request,
+whose result is then given to every object carrying it.
+
+With upgrade.checkpoint(), the objects migrated are recorded in a
+checkpoint store, so that a request sent again after a failure only migrates
+the objects that were not migrated yet.
+
+With upgrade.validate(), the upgraded objects are checked against the schemas
+of the plugin before they are returned, so that all the objects a migration
+left invalid are reported at once instead of the engine rejecting the upgrade
+one object at a time. The objects are validated by the definition classes
+generated from the schemas when the plugin was built, which are looked up
+once, and each distinct upgraded metadata is only validated once.
+
+Either way the upgraded objects are streamed into the map of the response as
+they are migrated, so the decoded metadata of an object is released as soon
+as it is written back and the upgraded JSON is only held by the response.
 """
+import collections
+import hashlib
 import json
 import logging
+import multiprocessing
+import os
+import threading
+import timeit
+import weakref
+
+import six
 
 from dlpx.virtualization.api import platform_pb2
+from dlpx.virtualization.common.exceptions import IncorrectTypeError
 from dlpx.virtualization.platform import (LuaUpgradeMigrations, MigrationType,
                                           PlatformUpgradeMigrations)
+from dlpx.virtualization.platform import _json_util, _warm_up
+from dlpx.virtualization.platform._interceptors import (InterceptorChain,
+                                                        intercepted)
 from dlpx.virtualization.platform.exceptions import (
-    IncorrectUpgradeObjectTypeError, UnknownMigrationTypeError)
+    IncorrectUpgradeObjectTypeError, ObjectMigrationError,
+    UnknownMigrationTypeError, UpgradeValidationError, UserError)
+from dlpx.virtualization.platform.operation import Operation as Op
+from dlpx.virtualization.platform.upgrade_checkpoint import (CheckpointStore,
+                                                             metadata_hash)
 
 logger = logging.getLogger(__name__)
 
 __all__ = ['UpgradeOperations']
 
+# The number of distinct migration chains kept compiled.
+MAX_CACHED_CHAINS = 64
+
+# The number of objects from which a request is migrated in parallel.
+DEFAULT_PARALLEL_MIN_OBJECTS = 1000
+
+# The number of shards given to each worker process.
+SHARDS_PER_PROCESS = 4
+
+# The generated class validating the upgraded objects of each type.
+DEFINITION_CLASS_NAMES = {
+    platform_pb2.UpgradeRequest.REPOSITORY: 'RepositoryDefinition',
+    platform_pb2.UpgradeRequest.SOURCECONFIG: 'SourceConfigDefinition',
+    platform_pb2.UpgradeRequest.LINKEDSOURCE: 'LinkedSourceDefinition',
+    platform_pb2.UpgradeRequest.VIRTUALSOURCE: 'VirtualSourceDefinition',
+    platform_pb2.UpgradeRequest.SNAPSHOT: 'SnapshotDefinition',
+}
+
+# Whether worker processes can be forked. Elsewhere, e.g. on Windows, the
+# objects are always migrated in the plugin process.
+_CAN_FORK = hasattr(os, 'fork')
+
+# The chain run by a worker process and whether its migrations are timed,
+# set when the process starts.
+_worker_chain = None
+_worker_timed = False
+
+_clock = timeit.default_timer
+
+
+class _MigrationChain(object):
+    """The migrations to run on the objects of an upgrade request, in order.
+
+    Calling the chain runs every migration on an object's metadata and
+    returns the upgraded metadata. The chain is pure if all its migrations
+    were declared pure, and its hash identifies it in checkpoints.
+    """
+    def __init__(self, migrations, pure=False, chain_hash=None):
+        self._migrations = tuple(migrations)
+        self.pure = pure
+        self.hash = chain_hash
+
+    def __len__(self):
+        return len(self._migrations)
+
+    def __call__(self, metadata):
+        for migration in self._migrations:
+            metadata = migration(metadata)
+        return metadata
+
+    @property
+    def names(self):
+        """list: The names of the migration functions, in order."""
+        return [migration.__name__ for migration in self._migrations]
+
+    def run_timed(self, metadata, timings):
+        """Runs the chain like calling it, adding one object and the seconds
+        it took to the [objects, seconds] timing of each migration run."""
+        for migration, timing in six.moves.zip(self._migrations, timings):
+            start = _clock()
+            metadata = migration(metadata)
+            timing[0] += 1
+            timing[1] += _clock() - start
+        return metadata
+
+
+class _UpgradeStats(object):
+    """The volume of the objects migrated by a chain for an upgrade request
+    and the timing of each of its migrations."""
+    def __init__(self, chain):
+        self.timings = [[0, 0.0] for _ in range(len(chain))]
+        self.distinct = None
+        self.restored = 0
+        self.migrated = 0
+        self.unchanged = 0
+        self.input_bytes = 0
+        self.output_bytes = 0
+
+    def add_object(self, metadata, upgraded):
+        self.migrated += 1
+        self.input_bytes += len(metadata.encode('utf-8'))
+        self.output_bytes += len(upgraded)
+
+    def add_timings(self, timings):
+        for timing, other in six.moves.zip(self.timings, timings):
+            timing[0] += other[0]
+            timing[1] += other[1]
+
+
+def _error_payload(err):
+    """Returns the picklable description of an exception raised by a
+    migration, a (type name, message, UserError arguments or None) triple."""
+    user_error = err.args if isinstance(err, UserError) else None
+    return type(err).__name__, '{}'.format(err), user_error
+
+
+def _migration_error(object_ref, payload):
+    """Returns the exception to raise for the migration of an object that
+    failed as described by payload. A UserError is meant for the user of the
+    plugin, so it is raised again as a UserError with the same message,
+    action and output, and any other exception is reported with an
+    ObjectMigrationError."""
+    error_type, error_message, user_error = payload
+    if user_error is not None:
+        return UserError(*user_error)
+    return ObjectMigrationError(object_ref, error_type, error_message)
+
+
+def _init_worker(chain, timed):
+    global _worker_chain, _worker_timed
+    _worker_chain = chain
+    _worker_timed = timed
+
+
+def _migrate_shard(shard):
+    """Runs the chain of the worker process on a list of (object reference,
+    JSON metadata) pairs. Returns a list of (object reference, upgraded JSON
+    metadata, error) triples and the [objects, seconds] timing of each
+    migration, which is left at zero unless the worker times them. The shard
+    stops at the first object whose migration fails,
+    whose error is the payload of the exception from _error_payload()."""
+    results = []
+    timings = [[0, 0.0] for _ in range(len(_worker_chain))]
+    for object_ref, metadata in shard:
+        try:
+            current_metadata = _json_util.loads(metadata)
+            if _worker_timed:
+                current_metadata = _worker_chain.run_timed(
+                    current_metadata, timings)
+            else:
+                current_metadata = _worker_chain(current_metadata)
+            upgraded = _json_util.dumps(current_metadata)
+        except Exception as err:
+            results.append((object_ref, None, _error_payload(err)))
+            break
+        results.append((object_ref, upgraded, None))
+    return results, timings
+
+
+class _Checkpoint(object):
+    """The objects of a request migrated by a chain, recorded in a checkpoint
+    store.
+
+    Upgraded objects are set on the checkpoint like on the post upgrade
+    parameters of the response, which it writes them to, and are recorded
+    in batches.
+    """
+    def __init__(self, store, chain_hash, post_upgrade_parameters):
+        self._store = store
+        self._chain_hash = chain_hash
+        self._post_upgrade_parameters = post_upgrade_parameters
+        self._digests = {}
+        self._pending = []
+
+    def restore(self, items):
+        """
+        Writes the recorded upgraded metadata of the (object reference, JSON
+        metadata) items to the post upgrade parameters, and returns the items
+        that are still to be migrated.
+        """
+        recorded = self._store.load(self._chain_hash)
+        remaining = []
+        for object_ref, metadata in items:
+            digest = metadata_hash(metadata)
+            record = recorded.get(object_ref)
+            if record is not None and record[0] == digest:
+                self._post_upgrade_parameters[object_ref] = record[1]
+            else:
+                self._digests[object_ref] = digest
+                remaining.append((object_ref, metadata))
+        if recorded:
+            logger.debug('Restored {} objects from the checkpoint {}, {} left'
+                         ' to migrate'.format(
+                             len(self._post_upgrade_parameters),
+                             self._chain_hash, len(remaining)))
+        return remaining
+
+    def __setitem__(self, object_ref, upgraded):
+        self._post_upgrade_parameters[object_ref] = upgraded
+        self._pending.append(
+            (object_ref, self._digests.pop(object_ref), upgraded))
+        if len(self._pending) >= self._store.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self._store.save(self._chain_hash, self._pending)
+            self._pending = []
+
 
 class UpgradeOperations(object):
-    def __init__(self):
+    def __init__(self, interceptor_chain=None):
         self.platform_migrations = PlatformUpgradeMigrations()
         self.lua_migrations = LuaUpgradeMigrations()
+        if interceptor_chain is None:
+            interceptor_chain = InterceptorChain()
+        self._interceptor_chain = interceptor_chain
+        # (object type, lua version, migration ids) -> _MigrationChain
+        self._chains = {}
+        self._chains_lock = threading.Lock()
+        # (weak reference to the last request, its object type, lua version
+        # and number of migration ids, its _MigrationChain)
+        self._last_chain = None
+        self._parallel_processes = None
+        self._parallel_min_objects = None
+        # The migrations declared pure.
+        self._pure_migrations = set()
+        self._checkpoint_store = None
+        self._validate = False
+        # upgrade request type -> generated definition class, or None if
+        # the generated definitions cannot be imported.
+        self._validators = None
+
+    def repository(self,
+                   migration_id,
+                   migration_type=MigrationType.PLATFORM,
+                   pure=False):
+        self._check_pure(pure)
 
-    def repository(self, migration_id, migration_type=MigrationType.PLATFORM):
         def repository_decorator(repository_impl):
             if migration_type == MigrationType.PLATFORM:
                 self.platform_migrations.add_repository(
@@ -41,13 +311,18 @@ class UpgradeOperations(object):
                                                    repository_impl)
             else:
                 raise UnknownMigrationTypeError(migration_type)
+            self._set_pure(repository_impl, pure)
+            self._clear_chains()
             return repository_impl
 
         return repository_decorator
 
     def source_config(self,
                       migration_id,
-                      migration_type=MigrationType.PLATFORM):
+                      migration_type=MigrationType.PLATFORM,
+                      pure=False):
+        self._check_pure(pure)
+
         def source_config_decorator(source_config_impl):
             if migration_type == MigrationType.PLATFORM:
                 self.platform_migrations.add_source_config(
@@ -57,13 +332,18 @@ class UpgradeOperations(object):
                                                       source_config_impl)
             else:
                 raise UnknownMigrationTypeError(migration_type)
+            self._set_pure(source_config_impl, pure)
+            self._clear_chains()
             return source_config_impl
 
         return source_config_decorator
 
     def linked_source(self,
                       migration_id,
-                      migration_type=MigrationType.PLATFORM):
+                      migration_type=MigrationType.PLATFORM,
+                      pure=False):
+        self._check_pure(pure)
+
         def linked_source_decorator(linked_source_impl):
             if migration_type == MigrationType.PLATFORM:
                 self.platform_migrations.add_linked_source(
@@ -73,13 +353,18 @@ class UpgradeOperations(object):
                                                       linked_source_impl)
             else:
                 raise UnknownMigrationTypeError(migration_type)
+            self._set_pure(linked_source_impl, pure)
+            self._clear_chains()
             return linked_source_impl
 
         return linked_source_decorator
 
     def virtual_source(self,
                        migration_id,
-                       migration_type=MigrationType.PLATFORM):
+                       migration_type=MigrationType.PLATFORM,
+                       pure=False):
+        self._check_pure(pure)
+
         def virtual_source_decorator(virtual_source_impl):
             if migration_type == MigrationType.PLATFORM:
                 self.platform_migrations.add_virtual_source(
@@ -89,11 +374,18 @@ class UpgradeOperations(object):
                                                        virtual_source_impl)
             else:
                 raise UnknownMigrationTypeError(migration_type)
+            self._set_pure(virtual_source_impl, pure)
+            self._clear_chains()
             return virtual_source_impl
 
         return virtual_source_decorator
 
-    def snapshot(self, migration_id, migration_type=MigrationType.PLATFORM):
+    def snapshot(self,
+                 migration_id,
+                 migration_type=MigrationType.PLATFORM,
+                 pure=False):
+        self._check_pure(pure)
+
         def snapshot_decorator(snapshot_impl):
             if migration_type == MigrationType.PLATFORM:
                 self.platform_migrations.add_snapshot(migration_id,
@@ -102,48 +394,418 @@ class UpgradeOperations(object):
                 self.lua_migrations.add_snapshot(migration_id, snapshot_impl)
             else:
                 raise UnknownMigrationTypeError(migration_type)
+            self._set_pure(snapshot_impl, pure)
+            self._clear_chains()
             return snapshot_impl
 
         return snapshot_decorator
 
+    def parallel(self,
+                 processes=None,
+                 min_objects=DEFAULT_PARALLEL_MIN_OBJECTS):
+        """Migrates the objects of large upgrade requests in parallel.
+
+        Args:
+            processes (int): The number of worker processes, or None for the
+                number of CPUs.
+            min_objects (int): The number of objects from which a request is
+                migrated in parallel.
+        """
+        for name, value in (('processes', processes), ('min_objects',
+                                                       min_objects)):
+            if value is not None and (not isinstance(value, six.integer_types)
+                                      or isinstance(value, bool) or value < 1):
+                raise ValueError('The parallel upgrade {} must be a positive'
+                                 ' integer but was {}.'.format(name, value))
+        self._parallel_processes = processes or multiprocessing.cpu_count()
+        self._parallel_min_objects = min_objects or 1
+
+    def checkpoint(self, store):
+        """Records the objects migrated in a checkpoint store, so that a
+        request sent again only migrates the objects that were not migrated.
+
+        Args:
+            store (upgrade_checkpoint.CheckpointStore): The store of the
+                checkpoints, or None to stop recording them.
+        """
+        if store is not None and not isinstance(store, CheckpointStore):
+            raise IncorrectTypeError(UpgradeOperations, 'store', type(store),
+                                     CheckpointStore, False)
+        self._checkpoint_store = store
+
+    def validate(self, enabled=True):
+        """Validates the upgraded objects against the schemas of the plugin,
+        and fails the upgrade with every object that does not match.
+
+        Args:
+            enabled (bool): Whether the upgraded objects are validated.
+        """
+        if not isinstance(enabled, bool):
+            raise IncorrectTypeError(UpgradeOperations, 'enabled',
+                                     type(enabled), bool, False)
+        self._validate = enabled
+
     @property
     def migration_id_list(self):
         return self.platform_migrations.get_sorted_ids()
 
-    @staticmethod
-    def _success_upgrade_response(upgraded_dict):
-        upgrade_result = platform_pb2.UpgradeResult(
-            post_upgrade_parameters=upgraded_dict)
-        upgrade_response = platform_pb2.UpgradeResponse(
-            return_value=upgrade_result)
+    def _upgrade_response(self, operation, request, chain):
+        """
+        Returns the response of request, with the objects upgraded by chain
+        written straight into its post upgrade parameters, and logs the
+        summary of the upgrade whether it succeeded or not.
+        """
+        upgrade_response = platform_pb2.UpgradeResponse()
+        upgrade_result = upgrade_response.return_value
+        upgrade_result.SetInParent()
+        #
+        # The objects are only measured when the summary is logged, as
+        # timing every migration call adds up over large upgrades.
+        #
+        stats = None
+        if logger.isEnabledFor(logging.INFO):
+            stats = _UpgradeStats(chain)
+            start = _clock()
+        failed = True
+        try:
+            self._migrate_objects(request, chain,
+                                  upgrade_result.post_upgrade_parameters,
+                                  stats)
+            if self._validate:
+                self._validate_objects(operation, request.type,
+                                       upgrade_result.post_upgrade_parameters)
+            failed = False
+        finally:
+            if stats is not None:
+                UpgradeOperations._log_summary(operation, request, chain,
+                                               stats, _clock() - start,
+                                               failed)
         return upgrade_response
 
+    def _validator(self, request_type):
+        """
+        Returns the generated definition class validating the objects of a
+        request type, importing the generated definitions the first time.
+        """
+        if self._validators is None:
+            definitions = _warm_up.import_definitions()
+            validators = {}
+            if definitions is None:
+                logger.warning('The upgraded objects cannot be validated as'
+                               ' the generated definitions were not found.')
+            else:
+                for object_type, name in six.iteritems(
+                        DEFINITION_CLASS_NAMES):
+                    validators[object_type] = getattr(definitions, name, None)
+            self._validators = validators
+        return self._validators.get(request_type)
+
+    def _validate_objects(self, operation, request_type,
+                          post_upgrade_parameters):
+        """
+        Validates every distinct upgraded metadata of post_upgrade_parameters
+        once with the definition class of request_type, and raises an
+        UpgradeValidationError listing every object that does not match.
+        """
+        definition_class = self._validator(request_type)
+        if definition_class is None:
+            return
+        errors = {}
+        failures = []
+        for object_ref, upgraded in six.iteritems(post_upgrade_parameters):
+            if upgraded not in errors:
+                try:
+                    definition_class.from_dict(_json_util.loads(upgraded))
+                    errors[upgraded] = None
+                except Exception as err:
+                    errors[upgraded] = '{}: {}'.format(
+                        type(err).__name__, err)
+            if errors[upgraded] is not None:
+                failures.append((object_ref, errors[upgraded]))
+        logger.debug('Validated {} distinct upgraded objects with {}'.format(
+            len(errors), definition_class.__name__))
+        if failures:
+            failures.sort()
+            raise UpgradeValidationError(operation, failures,
+                                         len(post_upgrade_parameters))
+
     @staticmethod
-    def _run_migration_upgrades(request, lua_impls_getter,
-                                platform_impls_getter):
+    def _log_summary(operation, request, chain, stats, seconds, failed):
         """
-        Given the list of lua and platform migration to run, iterate and
-        invoke these migrations on each object and its metadata, and return a
-        dict containing the upgraded parameters.
+        Logs the summary of an upgrade request as one line of JSON: the
+        number of objects of the request, of the distinct payloads migrated
+        once for all the objects carrying them, of the objects restored from
+        the checkpoint, of the objects migrated with their size before and
+        after the upgrade and of the objects passed through unchanged, and the
+        objects and seconds of each migration.
+        """
+        summary = collections.OrderedDict([
+            ('operation', operation.value),
+            ('objects', len(request.pre_upgrade_parameters)),
+            ('distinct', stats.distinct),
+            ('restored', stats.restored),
+            ('migrated', stats.migrated),
+            ('unchanged', stats.unchanged),
+            ('failed', failed),
+            ('seconds', round(seconds, 6)),
+            ('input_bytes', stats.input_bytes),
+            ('output_bytes', stats.output_bytes),
+            ('migrations', [
+                collections.OrderedDict([('name', name), ('objects', objects),
+                                         ('seconds', round(elapsed, 6))])
+                for name, (objects, elapsed) in six.moves.zip(
+                    chain.names, stats.timings)
+            ]),
+        ])
+        logger.info('Upgrade summary {}'.format(
+            _json_util.dumps(summary, compact=True)))
+
+    @staticmethod
+    def _check_pure(pure):
+        if not isinstance(pure, bool):
+            raise IncorrectTypeError(UpgradeOperations, 'pure', type(pure),
+                                     bool, False)
+
+    def _set_pure(self, impl, pure):
+        if pure:
+            self._pure_migrations.add(impl)
+        else:
+            self._pure_migrations.discard(impl)
+
+    def _clear_chains(self):
+        with self._chains_lock:
+            self._chains.clear()
+            self._last_chain = None
+
+    def _migration_chain(self, request, lua_impls_getter,
+                         platform_impls_getter):
+        """
+        Returns the compiled chain of the lua and platform migrations to run
+        for request, resolving it only the first time the combination of
+        object type, lua version and migration ids is seen.
+
+        Building the key copies the migration ids out of the request, so the
+        chain of the last request is also kept against the request itself
+        and a request that is looked up again skips the key altogether.
         """
-        post_upgrade_parameters = {}
+        summary = (request.type, request.lua_upgrade_version,
+                   len(request.migration_ids))
+        last = self._last_chain
+        if last is not None and last[0]() is request and last[1] == summary:
+            return last[2]
+        key = summary[:2] + (tuple(request.migration_ids),)
+        chain = self._chains.get(key)
+        if chain is None:
+            chain = UpgradeOperations._compile_chain(request, lua_impls_getter,
+                                                     platform_impls_getter,
+                                                     self._pure_migrations)
+            with self._chains_lock:
+                if len(self._chains) >= MAX_CACHED_CHAINS:
+                    self._chains.clear()
+                self._chains[key] = chain
+        self._last_chain = (weakref.ref(request), summary, chain)
+        return chain
+
+    @staticmethod
+    def _compile_chain(request,
+                       lua_impls_getter,
+                       platform_impls_getter,
+                       pure_migrations=frozenset()):
         #
         # For the request.migration_ids list, protobuf will preserve the
         # ordering of repeated elements, so we can rely on the backend to
         # give us the already sorted list of migrations
         #
-        impls_list = lua_impls_getter(
-            request.lua_upgrade_version) + platform_impls_getter(
-                request.migration_ids)
-        for (object_ref, metadata) in request.pre_upgrade_parameters.items():
-            # Load the object metadata into a dictionary
-            current_metadata = json.loads(metadata)
-            for migration_function in impls_list:
-                current_metadata = migration_function(current_metadata)
-            post_upgrade_parameters[object_ref] = json.dumps(current_metadata)
+        migrations = (lua_impls_getter(request.lua_upgrade_version) +
+                      platform_impls_getter(request.migration_ids))
+        chain_hash = hashlib.sha256(
+            json.dumps([
+                request.type, request.lua_upgrade_version,
+                list(request.migration_ids),
+                [
+                    '{}.{}'.format(migration.__module__, migration.__name__)
+                    for migration in migrations
+                ]
+            ]).encode('utf-8')).hexdigest()
+        return _MigrationChain(
+            migrations, all(m in pure_migrations for m in migrations),
+            chain_hash)
 
+    @staticmethod
+    def _run_migration_chain(request, chain, post_upgrade_parameters=None):
+        """
+        Invoke the migrations of chain on each object and its metadata, and
+        write the upgraded parameters into post_upgrade_parameters, a new
+        dict if not given, which is returned.
+        """
+        if post_upgrade_parameters is None:
+            post_upgrade_parameters = {}
+        UpgradeOperations._migrate_items(
+            six.iteritems(request.pre_upgrade_parameters), chain,
+            post_upgrade_parameters)
         return post_upgrade_parameters
 
+    @staticmethod
+    def _migrate_items(items, chain, post_upgrade_parameters, stats=None):
+        if not chain:
+            #
+            # No migration to run, so the upgraded objects are the objects
+            # as they were sent and there is no need to decode them, nor to
+            # measure their size.
+            #
+            unchanged = 0
+            for (object_ref, metadata) in items:
+                post_upgrade_parameters[object_ref] = metadata
+                unchanged += 1
+            if stats is not None:
+                stats.unchanged += unchanged
+            return
+        for (object_ref, metadata) in items:
+            try:
+                # Load the object metadata into a dictionary
+                current_metadata = _json_util.loads(metadata)
+                if stats is None:
+                    upgraded = _json_util.dumps(chain(current_metadata))
+                else:
+                    upgraded = _json_util.dumps(
+                        chain.run_timed(current_metadata, stats.timings))
+            except UserError:
+                raise
+            except Exception as err:
+                six.raise_from(
+                    _migration_error(object_ref, _error_payload(err)), err)
+            if stats is not None:
+                stats.add_object(metadata, upgraded)
+            post_upgrade_parameters[object_ref] = upgraded
+
+    def _migrate_objects(self,
+                         request,
+                         chain,
+                         post_upgrade_parameters,
+                         stats=None):
+        """
+        Runs chain on the objects of request, and writes the upgraded
+        parameters into post_upgrade_parameters. If chain is pure, it is run
+        once for each distinct metadata. The objects recorded in the
+        checkpoint store, if any, are not migrated again. The objects are
+        migrated in parallel if enabled and there are enough of them. The
+        objects migrated and the timings of the migrations are added to
+        stats, if given.
+        """
+        items = six.iteritems(request.pre_upgrade_parameters)
+        objects = len(request.pre_upgrade_parameters)
+        duplicates = None
+        if chain and chain.pure and objects > 1:
+            duplicates = UpgradeOperations._group_by_metadata(items)
+            items = [(refs[0], metadata)
+                     for metadata, refs in six.iteritems(duplicates)]
+            logger.debug(
+                'Deduplicated {} objects to {} distinct payloads, a ratio of'
+                ' {:.1f}'.format(objects, len(items),
+                                 float(objects) / max(len(items), 1)))
+            objects = len(items)
+            if stats is not None:
+                stats.distinct = objects
+
+        target = post_upgrade_parameters
+        checkpoint = None
+        if self._checkpoint_store is not None and chain:
+            checkpoint = _Checkpoint(self._checkpoint_store, chain.hash,
+                                     post_upgrade_parameters)
+            remaining = checkpoint.restore(items)
+            if stats is not None:
+                stats.restored = objects - len(remaining)
+            items = remaining
+            objects = len(items)
+            target = checkpoint
+
+        try:
+            if (self._parallel_processes is None or not _CAN_FORK
+                    or self._parallel_processes < 2
+                    or objects < self._parallel_min_objects or not chain):
+                UpgradeOperations._migrate_items(items, chain, target, stats)
+            elif items:
+                UpgradeOperations._migrate_items_parallel(
+                    sorted(items), chain, self._parallel_processes, target,
+                    stats)
+        finally:
+            if checkpoint is not None:
+                checkpoint.flush()
+
+        if duplicates is not None:
+            for refs in six.itervalues(duplicates):
+                upgraded = post_upgrade_parameters[refs[0]]
+                for object_ref in refs[1:]:
+                    post_upgrade_parameters[object_ref] = upgraded
+
+    @staticmethod
+    def _group_by_metadata(items):
+        """
+        Returns a dict from each distinct metadata of items to the sorted list
+        of the references of the objects carrying it.
+        """
+        groups = {}
+        for object_ref, metadata in items:
+            groups.setdefault(metadata, []).append(object_ref)
+        for refs in six.itervalues(groups):
+            refs.sort()
+        return groups
+
+    @staticmethod
+    def _migrate_items_parallel(items,
+                                chain,
+                                processes,
+                                post_upgrade_parameters,
+                                stats=None):
+        """
+        Shards items across a pool of processes running chain, and writes the
+        upgraded parameters of each shard into post_upgrade_parameters as it
+        completes. The first object in reference order whose migration failed
+        is reported like in the plugin process.
+        """
+        shard_count = min(len(items), processes * SHARDS_PER_PROCESS)
+        shard_size = -(-len(items) // shard_count)
+        shards = [
+            items[i:i + shard_size] for i in range(0, len(items), shard_size)
+        ]
+
+        pool = multiprocessing.Pool(min(processes, len(shards)),
+                                    initializer=_init_worker,
+                                    initargs=(chain, stats is not None))
+        try:
+            for shard, (shard_results, timings) in six.moves.zip(
+                    shards, pool.imap(_migrate_shard, shards)):
+                if stats is not None:
+                    stats.add_timings(timings)
+                for (_, metadata), (object_ref, upgraded,
+                                    error) in six.moves.zip(
+                                        shard, shard_results):
+                    if error is not None:
+                        raise _migration_error(object_ref, error)
+                    post_upgrade_parameters[object_ref] = upgraded
+                    if stats is not None:
+                        stats.add_object(metadata, upgraded)
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+    @staticmethod
+    def _run_migration_upgrades(request, lua_impls_getter,
+                                platform_impls_getter):
+        """
+        Given the list of lua and platform migration to run, iterate and
+        invoke these migrations on each object and its metadata, and return a
+        dict containing the upgraded parameters.
+        """
+        return UpgradeOperations._run_migration_chain(
+            request,
+            UpgradeOperations._compile_chain(request, lua_impls_getter,
+                                             platform_impls_getter))
+
+    @intercepted(Op.UPGRADE_REPOSITORY)
     def _internal_repository(self, request):
         """Upgrade repositories for plugins.
         """
@@ -151,14 +813,16 @@ class UpgradeOperations(object):
             raise IncorrectUpgradeObjectTypeError(
                 request.type, platform_pb2.UpgradeRequest.REPOSITORY)
 
-        logger.debug('Upgrade repositories [{}]'.format(', '.join(
-            sorted(request.pre_upgrade_parameters.keys()))))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Upgrade repositories [{}]'.format(', '.join(
+                sorted(request.pre_upgrade_parameters.keys()))))
 
-        post_upgrade_parameters = self._run_migration_upgrades(
+        chain = self._migration_chain(
             request, self.lua_migrations.get_repository_impls_to_exec,
             self.platform_migrations.get_repository_impls_to_exec)
-        return self._success_upgrade_response(post_upgrade_parameters)
+        return self._upgrade_response(Op.UPGRADE_REPOSITORY, request, chain)
 
+    @intercepted(Op.UPGRADE_SOURCE_CONFIG)
     def _internal_source_config(self, request):
         """Upgrade source configs for plugins.
         """
@@ -166,14 +830,16 @@ class UpgradeOperations(object):
             raise IncorrectUpgradeObjectTypeError(
                 request.type, platform_pb2.UpgradeRequest.SOURCECONFIG)
 
-        logger.debug('Upgrade source configs [{}]'.format(', '.join(
-            sorted(request.pre_upgrade_parameters.keys()))))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Upgrade source configs [{}]'.format(', '.join(
+                sorted(request.pre_upgrade_parameters.keys()))))
 
-        post_upgrade_parameters = self._run_migration_upgrades(
+        chain = self._migration_chain(
             request, self.lua_migrations.get_source_config_impls_to_exec,
             self.platform_migrations.get_source_config_impls_to_exec)
-        return self._success_upgrade_response(post_upgrade_parameters)
+        return self._upgrade_response(Op.UPGRADE_SOURCE_CONFIG, request, chain)
 
+    @intercepted(Op.UPGRADE_LINKED_SOURCE)
     def _internal_linked_source(self, request):
         """Upgrade linked source for plugins.
         """
@@ -181,14 +847,16 @@ class UpgradeOperations(object):
             raise IncorrectUpgradeObjectTypeError(
                 request.type, platform_pb2.UpgradeRequest.LINKEDSOURCE)
 
-        logger.debug('Upgrade linked sources [{}]'.format(', '.join(
-            sorted(request.pre_upgrade_parameters.keys()))))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Upgrade linked sources [{}]'.format(', '.join(
+                sorted(request.pre_upgrade_parameters.keys()))))
 
-        post_upgrade_parameters = self._run_migration_upgrades(
+        chain = self._migration_chain(
             request, self.lua_migrations.get_linked_source_impls_to_exec,
             self.platform_migrations.get_linked_source_impls_to_exec)
-        return self._success_upgrade_response(post_upgrade_parameters)
+        return self._upgrade_response(Op.UPGRADE_LINKED_SOURCE, request, chain)
 
+    @intercepted(Op.UPGRADE_VIRTUAL_SOURCE)
     def _internal_virtual_source(self, request):
         """Upgrade virtual sources for plugins.
         """
@@ -196,14 +864,17 @@ class UpgradeOperations(object):
             raise IncorrectUpgradeObjectTypeError(
                 request.type, platform_pb2.UpgradeRequest.VIRTUALSOURCE)
 
-        logger.debug('Upgrade virtual sources [{}]'.format(', '.join(
-            sorted(request.pre_upgrade_parameters.keys()))))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Upgrade virtual sources [{}]'.format(', '.join(
+                sorted(request.pre_upgrade_parameters.keys()))))
 
-        post_upgrade_parameters = self._run_migration_upgrades(
+        chain = self._migration_chain(
             request, self.lua_migrations.get_virtual_source_impls_to_exec,
             self.platform_migrations.get_virtual_source_impls_to_exec)
-        return self._success_upgrade_response(post_upgrade_parameters)
+        return self._upgrade_response(Op.UPGRADE_VIRTUAL_SOURCE, request,
+                                      chain)
 
+    @intercepted(Op.UPGRADE_SNAPSHOT)
     def _internal_snapshot(self, request):
         """Upgrade snapshots for plugins.
         """
@@ -211,10 +882,11 @@ class UpgradeOperations(object):
             raise IncorrectUpgradeObjectTypeError(
                 request.type, platform_pb2.UpgradeRequest.SNAPSHOT)
 
-        logger.debug('Upgrade snapshots [{}]'.format(', '.join(
-            sorted(request.pre_upgrade_parameters.keys()))))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Upgrade snapshots [{}]'.format(', '.join(
+                sorted(request.pre_upgrade_parameters.keys()))))
 
-        post_upgrade_parameters = self._run_migration_upgrades(
+        chain = self._migration_chain(
             request, self.lua_migrations.get_snapshot_impls_to_exec,
             self.platform_migrations.get_snapshot_impls_to_exec)
-        return self._success_upgrade_response(post_upgrade_parameters)
+        return self._upgrade_response(Op.UPGRADE_SNAPSHOT, request, chain)
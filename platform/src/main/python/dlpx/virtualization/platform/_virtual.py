@@ -6,23 +6,26 @@
 """VirtualOperations for the Virtualization Platform
 
 """
-import json
-
 from dlpx.virtualization.api import common_pb2, platform_pb2
 from dlpx.virtualization.common import RemoteConnection, RemoteEnvironment
+from dlpx.virtualization.common.exceptions import IncorrectTypeError
 from dlpx.virtualization.platform import (Mount, MountSpecification, Status,
                                           VirtualSource)
+from dlpx.virtualization.platform import _json_util
 from dlpx.virtualization.platform import validation_util as v
+from dlpx.virtualization.platform._interceptors import (InterceptorChain,
+                                                        intercepted)
 from dlpx.virtualization.platform.exceptions import (
     IncorrectReturnTypeError, OperationAlreadyDefinedError,
     OperationNotDefinedError)
 from dlpx.virtualization.platform.operation import Operation as Op
+from dlpx.virtualization.platform.snapshot_metadata import SnapshotSizeLimits
 
 __all__ = ['VirtualOperations']
 
 
 class VirtualOperations(object):
-    def __init__(self):
+    def __init__(self, interceptor_chain=None):
         self.configure_impl = None
         self.unconfigure_impl = None
         self.reconfigure_impl = None
@@ -30,9 +33,13 @@ class VirtualOperations(object):
         self.stop_impl = None
         self.pre_snapshot_impl = None
         self.post_snapshot_impl = None
+        self.post_snapshot_size_limits = SnapshotSizeLimits()
         self.status_impl = None
         self.initialize_impl = None
         self.mount_specification_impl = None
+        if interceptor_chain is None:
+            interceptor_chain = InterceptorChain()
+        self._interceptor_chain = interceptor_chain
 
     def configure(self):
         def configure_decorator(configure_impl):
@@ -92,12 +99,20 @@ class VirtualOperations(object):
 
         return pre_snapshot_decorator
 
-    def post_snapshot(self):
+    def post_snapshot(self, size_limits=None):
+        if (size_limits is not None
+                and not isinstance(size_limits, SnapshotSizeLimits)):
+            raise IncorrectTypeError(VirtualOperations, 'size_limits',
+                                     type(size_limits), SnapshotSizeLimits,
+                                     False)
+
         def post_snapshot_decorator(post_snapshot_impl):
             if self.post_snapshot_impl:
                 raise OperationAlreadyDefinedError(Op.VIRTUAL_POST_SNAPSHOT)
             self.post_snapshot_impl = v.check_function(
                 post_snapshot_impl, Op.VIRTUAL_POST_SNAPSHOT)
+            if size_limits is not None:
+                self.post_snapshot_size_limits = size_limits
             return post_snapshot_impl
 
         return post_snapshot_decorator
@@ -132,12 +147,29 @@ class VirtualOperations(object):
         return mount_specification_decorator
 
     @staticmethod
-    def _from_protobuf_single_subset_mount(single_subset_mount):
-        return Mount(remote_environment=RemoteEnvironment.from_proto(
-            single_subset_mount.remote_environment),
-                     mount_path=single_subset_mount.mount_path,
-                     shared_path=single_subset_mount.shared_path)
-
+    def _from_protobuf_subset_mounts(subset_mounts):
+        """Converts the mounts of a virtual source. The mounts usually share
+        a few environments, which are only converted once. Environments are
+        keyed on their whole serialized protobuf rather than their reference,
+        so two environments that share a reference but differ otherwise are
+        never mixed up."""
+        environments = {}
+        mounts = []
+        for single_subset_mount in subset_mounts:
+            environment_protobuf = single_subset_mount.remote_environment
+            key = environment_protobuf.SerializeToString()
+            environment = environments.get(key)
+            if environment is None:
+                environment = RemoteEnvironment.from_proto(
+                    environment_protobuf)
+                environments[key] = environment
+            mounts.append(
+                Mount(remote_environment=environment,
+                      mount_path=single_subset_mount.mount_path,
+                      shared_path=single_subset_mount.shared_path))
+        return mounts
+
+    @intercepted(Op.VIRTUAL_CONFIGURE)
     def _internal_configure(self, request):
         """Configure operation wrapper.
 
@@ -170,11 +202,9 @@ class VirtualOperations(object):
             raise OperationNotDefinedError(Op.VIRTUAL_CONFIGURE)
 
         virtual_source_definition = VirtualSourceDefinition.from_dict(
-            json.loads(request.virtual_source.parameters.json))
-        mounts = [
-            VirtualOperations._from_protobuf_single_subset_mount(m)
-            for m in request.virtual_source.mounts
-        ]
+            _json_util.loads(request.virtual_source.parameters.json))
+        mounts = VirtualOperations._from_protobuf_subset_mounts(
+            request.virtual_source.mounts)
 
         virtual_source = VirtualSource(guid=request.virtual_source.guid,
                                        connection=RemoteConnection.from_proto(
@@ -183,9 +213,9 @@ class VirtualOperations(object):
                                        mounts=mounts)
 
         repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
+            _json_util.loads(request.repository.parameters.json))
         snapshot = SnapshotDefinition.from_dict(
-            json.loads(request.snapshot.parameters.json))
+            _json_util.loads(request.snapshot.parameters.json))
 
         config = self.configure_impl(virtual_source=virtual_source,
                                      repository=repository,
@@ -198,9 +228,10 @@ class VirtualOperations(object):
 
         configure_response = platform_pb2.ConfigureResponse()
         configure_response.return_value.source_config.parameters.json = (
-            json.dumps(config.to_dict()))
+            _json_util.dumps(config.to_dict()))
         return configure_response
 
+    @intercepted(Op.VIRTUAL_UNCONFIGURE)
     def _internal_unconfigure(self, request):
         """Unconfigure operation wrapper.
 
@@ -229,11 +260,9 @@ class VirtualOperations(object):
             raise OperationNotDefinedError(Op.VIRTUAL_UNCONFIGURE)
 
         virtual_source_definition = VirtualSourceDefinition.from_dict(
-            json.loads(request.virtual_source.parameters.json))
-        mounts = [
-            VirtualOperations._from_protobuf_single_subset_mount(m)
-            for m in request.virtual_source.mounts
-        ]
+            _json_util.loads(request.virtual_source.parameters.json))
+        mounts = VirtualOperations._from_protobuf_subset_mounts(
+            request.virtual_source.mounts)
 
         virtual_source = VirtualSource(guid=request.virtual_source.guid,
                                        connection=RemoteConnection.from_proto(
@@ -242,9 +271,9 @@ class VirtualOperations(object):
                                        mounts=mounts)
 
         repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
+            _json_util.loads(request.repository.parameters.json))
         source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
+            _json_util.loads(request.source_config.parameters.json))
 
         self.unconfigure_impl(repository=repository,
                               source_config=source_config,
@@ -255,6 +284,7 @@ class VirtualOperations(object):
             platform_pb2.UnconfigureResult())
         return unconfigure_response
 
+    @intercepted(Op.VIRTUAL_RECONFIGURE)
     def _internal_reconfigure(self, request):
         """Reconfigure operation wrapper.
 
@@ -278,11 +308,9 @@ class VirtualOperations(object):
             raise OperationNotDefinedError(Op.VIRTUAL_RECONFIGURE)
 
         virtual_source_definition = VirtualSourceDefinition.from_dict(
-            json.loads(request.virtual_source.parameters.json))
-        mounts = [
-            VirtualOperations._from_protobuf_single_subset_mount(m)
-            for m in request.virtual_source.mounts
-        ]
+            _json_util.loads(request.virtual_source.parameters.json))
+        mounts = VirtualOperations._from_protobuf_subset_mounts(
+            request.virtual_source.mounts)
         virtual_source = VirtualSource(guid=request.virtual_source.guid,
                                        connection=RemoteConnection.from_proto(
                                            request.virtual_source.connection),
@@ -290,11 +318,11 @@ class VirtualOperations(object):
                                        mounts=mounts)
 
         snapshot = SnapshotDefinition.from_dict(
-            json.loads(request.snapshot.parameters.json))
+            _json_util.loads(request.snapshot.parameters.json))
         source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
+            _json_util.loads(request.source_config.parameters.json))
         repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
+            _json_util.loads(request.repository.parameters.json))
 
         config = self.reconfigure_impl(snapshot=snapshot,
                                        repository=repository,
@@ -309,9 +337,10 @@ class VirtualOperations(object):
 
         reconfigure_response = platform_pb2.ReconfigureResponse()
         reconfigure_response.return_value.source_config.parameters.json = (
-            json.dumps(config.to_dict()))
+            _json_util.dumps(config.to_dict()))
         return reconfigure_response
 
+    @intercepted(Op.VIRTUAL_START)
     def _internal_start(self, request):
         """Start operation wrapper.
 
@@ -338,11 +367,9 @@ class VirtualOperations(object):
             raise OperationNotDefinedError(Op.VIRTUAL_START)
 
         virtual_source_definition = VirtualSourceDefinition.from_dict(
-            json.loads(request.virtual_source.parameters.json))
-        mounts = [
-            VirtualOperations._from_protobuf_single_subset_mount(m)
-            for m in request.virtual_source.mounts
-        ]
+            _json_util.loads(request.virtual_source.parameters.json))
+        mounts = VirtualOperations._from_protobuf_subset_mounts(
+            request.virtual_source.mounts)
         virtual_source = VirtualSource(guid=request.virtual_source.guid,
                                        connection=RemoteConnection.from_proto(
                                            request.virtual_source.connection),
@@ -350,9 +377,9 @@ class VirtualOperations(object):
                                        mounts=mounts)
 
         repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
+            _json_util.loads(request.repository.parameters.json))
         source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
+            _json_util.loads(request.source_config.parameters.json))
 
         self.start_impl(repository=repository,
                         source_config=source_config,
@@ -362,6 +389,7 @@ class VirtualOperations(object):
         start_response.return_value.CopyFrom(platform_pb2.StartResult())
         return start_response
 
+    @intercepted(Op.VIRTUAL_STOP)
     def _internal_stop(self, request):
         """Stop operation wrapper.
 
@@ -387,11 +415,9 @@ class VirtualOperations(object):
             raise OperationNotDefinedError(Op.VIRTUAL_STOP)
 
         virtual_source_definition = VirtualSourceDefinition.from_dict(
-            json.loads(request.virtual_source.parameters.json))
-        mounts = [
-            VirtualOperations._from_protobuf_single_subset_mount(m)
-            for m in request.virtual_source.mounts
-        ]
+            _json_util.loads(request.virtual_source.parameters.json))
+        mounts = VirtualOperations._from_protobuf_subset_mounts(
+            request.virtual_source.mounts)
         virtual_source = VirtualSource(guid=request.virtual_source.guid,
                                        connection=RemoteConnection.from_proto(
                                            request.virtual_source.connection),
@@ -399,9 +425,9 @@ class VirtualOperations(object):
                                        mounts=mounts)
 
         repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
+            _json_util.loads(request.repository.parameters.json))
         source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
+            _json_util.loads(request.source_config.parameters.json))
 
         self.stop_impl(repository=repository,
                        source_config=source_config,
@@ -411,6 +437,7 @@ class VirtualOperations(object):
         stop_response.return_value.CopyFrom(platform_pb2.StopResult())
         return stop_response
 
+    @intercepted(Op.VIRTUAL_PRE_SNAPSHOT)
     def _internal_pre_snapshot(self, request):
         """Virtual pre snapshot operation wrapper.
 
@@ -441,11 +468,9 @@ class VirtualOperations(object):
             raise OperationNotDefinedError(Op.VIRTUAL_PRE_SNAPSHOT)
 
         virtual_source_definition = VirtualSourceDefinition.from_dict(
-            json.loads(request.virtual_source.parameters.json))
-        mounts = [
-            VirtualOperations._from_protobuf_single_subset_mount(m)
-            for m in request.virtual_source.mounts
-        ]
+            _json_util.loads(request.virtual_source.parameters.json))
+        mounts = VirtualOperations._from_protobuf_subset_mounts(
+            request.virtual_source.mounts)
         virtual_source = VirtualSource(guid=request.virtual_source.guid,
                                        connection=RemoteConnection.from_proto(
                                            request.virtual_source.connection),
@@ -453,9 +478,9 @@ class VirtualOperations(object):
                                        mounts=mounts)
 
         repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
+            _json_util.loads(request.repository.parameters.json))
         source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
+            _json_util.loads(request.source_config.parameters.json))
 
         self.pre_snapshot_impl(repository=repository,
                                source_config=source_config,
@@ -467,6 +492,7 @@ class VirtualOperations(object):
             platform_pb2.VirtualPreSnapshotResult())
         return virtual_pre_snapshot_response
 
+    @intercepted(Op.VIRTUAL_POST_SNAPSHOT)
     def _internal_post_snapshot(self, request):
         """Virtual post snapshot operation wrapper.
 
@@ -492,7 +518,8 @@ class VirtualOperations(object):
 
         def to_protobuf(snapshot):
             parameters = common_pb2.PluginDefinedObject()
-            parameters.json = json.dumps(snapshot.to_dict())
+            parameters.json = self.post_snapshot_size_limits.encode(
+                Op.VIRTUAL_POST_SNAPSHOT, snapshot)
             snapshot_protobuf = common_pb2.Snapshot()
             snapshot_protobuf.parameters.CopyFrom(parameters)
             return snapshot_protobuf
@@ -501,11 +528,9 @@ class VirtualOperations(object):
             raise OperationNotDefinedError(Op.VIRTUAL_POST_SNAPSHOT)
 
         virtual_source_definition = VirtualSourceDefinition.from_dict(
-            json.loads(request.virtual_source.parameters.json))
-        mounts = [
-            VirtualOperations._from_protobuf_single_subset_mount(m)
-            for m in request.virtual_source.mounts
-        ]
+            _json_util.loads(request.virtual_source.parameters.json))
+        mounts = VirtualOperations._from_protobuf_subset_mounts(
+            request.virtual_source.mounts)
         virtual_source = VirtualSource(guid=request.virtual_source.guid,
                                        connection=RemoteConnection.from_proto(
                                            request.virtual_source.connection),
@@ -513,9 +538,9 @@ class VirtualOperations(object):
                                        mounts=mounts)
 
         repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
+            _json_util.loads(request.repository.parameters.json))
         source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
+            _json_util.loads(request.source_config.parameters.json))
 
         snapshot = self.post_snapshot_impl(repository=repository,
                                            source_config=source_config,
@@ -532,6 +557,7 @@ class VirtualOperations(object):
             to_protobuf(snapshot))
         return virtual_post_snapshot_response
 
+    @intercepted(Op.VIRTUAL_STATUS)
     def _internal_status(self, request):
         """Virtual status operation wrapper.
 
@@ -560,11 +586,9 @@ class VirtualOperations(object):
             raise OperationNotDefinedError(Op.VIRTUAL_STATUS)
 
         virtual_source_definition = VirtualSourceDefinition.from_dict(
-            json.loads(request.virtual_source.parameters.json))
-        mounts = [
-            VirtualOperations._from_protobuf_single_subset_mount(m)
-            for m in request.virtual_source.mounts
-        ]
+            _json_util.loads(request.virtual_source.parameters.json))
+        mounts = VirtualOperations._from_protobuf_subset_mounts(
+            request.virtual_source.mounts)
         virtual_source = VirtualSource(guid=request.virtual_source.guid,
                                        connection=RemoteConnection.from_proto(
                                            request.virtual_source.connection),
@@ -572,9 +596,9 @@ class VirtualOperations(object):
                                        mounts=mounts)
 
         repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
+            _json_util.loads(request.repository.parameters.json))
         source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
+            _json_util.loads(request.source_config.parameters.json))
 
         virtual_status = self.status_impl(repository=repository,
                                           source_config=source_config,
@@ -589,6 +613,7 @@ class VirtualOperations(object):
         virtual_status_response.return_value.status = virtual_status.value
         return virtual_status_response
 
+    @intercepted(Op.VIRTUAL_INITIALIZE)
     def _internal_initialize(self, request):
         """Initialize operation wrapper.
 
@@ -613,11 +638,9 @@ class VirtualOperations(object):
             raise OperationNotDefinedError(Op.VIRTUAL_INITIALIZE)
 
         virtual_source_definition = VirtualSourceDefinition.from_dict(
-            json.loads(request.virtual_source.parameters.json))
-        mounts = [
-            VirtualOperations._from_protobuf_single_subset_mount(m)
-            for m in request.virtual_source.mounts
-        ]
+            _json_util.loads(request.virtual_source.parameters.json))
+        mounts = VirtualOperations._from_protobuf_subset_mounts(
+            request.virtual_source.mounts)
         virtual_source = VirtualSource(guid=request.virtual_source.guid,
                                        connection=RemoteConnection.from_proto(
                                            request.virtual_source.connection),
@@ -625,7 +648,7 @@ class VirtualOperations(object):
                                        mounts=mounts)
 
         repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
+            _json_util.loads(request.repository.parameters.json))
 
         config = self.initialize_impl(repository=repository,
                              virtual_source=virtual_source)
@@ -637,9 +660,10 @@ class VirtualOperations(object):
 
         initialize_response = platform_pb2.InitializeResponse()
         initialize_response.return_value.source_config.parameters.json = (
-            json.dumps(config.to_dict()))
+            _json_util.dumps(config.to_dict()))
         return initialize_response
 
+    @intercepted(Op.VIRTUAL_MOUNT_SPEC)
     def _internal_mount_specification(self, request):
         """Virtual mount spec operation wrapper.
 
@@ -660,20 +684,6 @@ class VirtualOperations(object):
         from generated.definitions import VirtualSourceDefinition
         from generated.definitions import RepositoryDefinition
 
-        def to_protobuf_single_mount(single_mount):
-            single_mount_protobuf = common_pb2.SingleSubsetMount()
-
-            environment_protobuf = single_mount.remote_environment.to_proto()
-
-            single_mount_protobuf.remote_environment.CopyFrom(
-                environment_protobuf)
-            single_mount_protobuf.mount_path = single_mount.mount_path
-
-            if single_mount.shared_path:
-                single_mount_protobuf.shared_path = single_mount.shared_path
-
-            return single_mount_protobuf
-
         def to_protobuf_ownership_spec(ownership_spec):
             ownership_spec_protobuf = common_pb2.OwnershipSpec()
             ownership_spec_protobuf.uid = ownership_spec.uid
@@ -684,11 +694,9 @@ class VirtualOperations(object):
             raise OperationNotDefinedError(Op.VIRTUAL_MOUNT_SPEC)
 
         virtual_source_definition = VirtualSourceDefinition.from_dict(
-            json.loads(request.virtual_source.parameters.json))
-        mounts = [
-            VirtualOperations._from_protobuf_single_subset_mount(m)
-            for m in request.virtual_source.mounts
-        ]
+            _json_util.loads(request.virtual_source.parameters.json))
+        mounts = VirtualOperations._from_protobuf_subset_mounts(
+            request.virtual_source.mounts)
         virtual_source = VirtualSource(guid=request.virtual_source.guid,
                                        connection=RemoteConnection.from_proto(
                                            request.virtual_source.connection),
@@ -696,7 +704,7 @@ class VirtualOperations(object):
                                        mounts=mounts)
 
         repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
+            _json_util.loads(request.repository.parameters.json))
 
         virtual_mount_spec = self.mount_specification_impl(
             repository=repository, virtual_source=virtual_source)
@@ -715,8 +723,24 @@ class VirtualOperations(object):
             virtual_mount_spec_response.return_value.ownership_spec.CopyFrom(
                 ownership_spec)
 
-        mounts_list = [
-            to_protobuf_single_mount(m) for m in virtual_mount_spec.mounts
-        ]
-        virtual_mount_spec_response.return_value.mounts.extend(mounts_list)
+        #
+        # Mounts are added to the response directly. VDBs can have hundreds of
+        # mounts, usually on a few environments, so each environment is only
+        # converted to a protobuf once.
+        #
+        mounts_protobuf = virtual_mount_spec_response.return_value.mounts
+        environment_protobufs = {}
+        for mount in virtual_mount_spec.mounts:
+            environment = mount.remote_environment
+            environment_protobuf = environment_protobufs.get(id(environment))
+            if environment_protobuf is None:
+                environment_protobuf = environment.to_proto()
+                environment_protobufs[id(environment)] = environment_protobuf
+
+            single_mount_protobuf = mounts_protobuf.add()
+            single_mount_protobuf.remote_environment.CopyFrom(
+                environment_protobuf)
+            single_mount_protobuf.mount_path = mount.mount_path
+            if mount.shared_path:
+                single_mount_protobuf.shared_path = mount.shared_path
         return virtual_mount_spec_response
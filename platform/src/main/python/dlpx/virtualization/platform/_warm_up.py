@@ -0,0 +1,56 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+# -*- coding: utf-8 -*-
+"""Warm up of the SDK state used by the plugin operations
+
+The wrappers import the plugin's generated definitions inside the methods and
+the upgrade migrations are only sorted when they are first needed, so the
+first operation run in a new interpreter pays for all of it. Plugin.warm_up()
+calls warm_up_sdk() to pay that cost up front.
+"""
+import importlib
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# The message of the ImportError raised when the definitions of the plugin
+# have not been generated, as opposed to an import failing inside them.
+_NOT_GENERATED = re.compile(
+    r"^No module named '?(generated|generated\.definitions|definitions)'?$")
+
+
+def import_definitions():
+    """Imports the generated definitions of the plugin.
+
+    Returns:
+        module: generated.definitions, or None if it has not been generated.
+
+    Raises:
+        ImportError: If the generated definitions failed to import.
+    """
+    try:
+        return importlib.import_module('generated.definitions')
+    except ImportError as err:
+        if not _NOT_GENERATED.match(str(err)):
+            raise
+        logger.debug('Skipping the import of the generated definitions: '
+                     '{}'.format(err))
+        return None
+
+
+def warm_up_sdk(upgrade_operations):
+    """Imports and builds the state the plugin operations need.
+
+    Args:
+        upgrade_operations (UpgradeOperations): The upgrade operations of the
+            plugin whose migration index should be built.
+    """
+    definitions = import_definitions()
+    migration_ids = upgrade_operations.migration_id_list
+    logger.debug('Warmed up the SDK: generated definitions {}, {}'
+                 ' migrations.'.format(
+                     'imported' if definitions else 'not found',
+                     len(migration_ids)))
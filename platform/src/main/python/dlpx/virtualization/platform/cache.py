@@ -0,0 +1,374 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+# -*- coding: utf-8 -*-
+"""Scoped memoization for plugin operations
+
+Operations such as virtual.status() and linked.status() are called very
+often by the Delphix Engine, and the information they compute (installed
+versions, process lists, configuration files, ...) rarely changes between
+two calls. This module lets plugins cache the result of their helper
+functions for a bounded amount of time, scoped per source or per environment:
+
+  from dlpx.virtualization.platform import Plugin, cache
+
+  my_db_plugin = Plugin(interceptors=[cache.CacheInvalidator()])
+
+  @cache.memoize_per_source(ttl=30)
+  def read_pid(virtual_source):
+      ...
+
+  @cache.memoize_per_environment(ttl=300, max_size=16)
+  def installed_versions(source_connection):
+      ...
+
+The scope of a call is found from its arguments: a VirtualSource,
+StagedSource or DirectSource identifies a source by its guid, and those
+sources, a RemoteConnection or a RemoteEnvironment identify an environment by
+its reference. The other arguments must be hashable (plugin defined objects
+are compared by value) and form the key within the scope.
+
+Cached results are dropped once their ttl has expired, when the cache is full
+(least recently used first) or when they are invalidated. The
+CacheInvalidator interceptor invalidates the source scope after every
+operation in MUTATING_OPERATIONS and the environment scope after repository
+discovery, and then runs the hooks registered with add_invalidation_hook.
+
+Caches are thread-safe. Two threads that miss on the same key at the same
+time both run the function and the last result is kept.
+"""
+import collections
+import functools
+import inspect
+import threading
+import time
+import weakref
+
+import six
+
+from dlpx.virtualization.common import (RemoteConnection, RemoteEnvironment,
+                                        RemoteHost, RemoteUser)
+from dlpx.virtualization.platform._interceptors import OperationInterceptor
+from dlpx.virtualization.platform._plugin_classes import (DirectSource,
+                                                          StagedSource,
+                                                          VirtualSource)
+from dlpx.virtualization.platform.exceptions import (
+    CacheScopeNotFoundError, DecoratorNotFunctionError)
+from dlpx.virtualization.platform.operation import Operation as Op
+from enum import Enum
+
+__all__ = [
+    'Scope', 'ScopedCache', 'CacheInvalidator', 'MUTATING_OPERATIONS',
+    'memoize', 'memoize_per_source', 'memoize_per_environment',
+    'invalidate_source', 'invalidate_environment', 'add_invalidation_hook',
+    'remove_invalidation_hook'
+]
+
+DEFAULT_TTL = 60
+DEFAULT_MAX_SIZE = 128
+
+MUTATING_OPERATIONS = frozenset([
+    Op.LINKED_START_STAGING, Op.LINKED_STOP_STAGING, Op.VIRTUAL_CONFIGURE,
+    Op.VIRTUAL_UNCONFIGURE, Op.VIRTUAL_RECONFIGURE, Op.VIRTUAL_START,
+    Op.VIRTUAL_STOP, Op.VIRTUAL_INITIALIZE
+])
+
+_clock = time.time
+
+_SOURCE_TYPES = (VirtualSource, StagedSource, DirectSource)
+
+# Every ScopedCache created by the memoize decorators.
+_CACHES = weakref.WeakSet()
+_INVALIDATION_HOOKS = []
+_REGISTRY_LOCK = threading.Lock()
+
+
+class Scope(Enum):
+    SOURCE = 'source'
+    ENVIRONMENT = 'environment'
+
+
+class ScopedCache(object):
+    """Thread-safe, size bounded cache of values that expire after ttl
+    seconds.
+
+    Values are stored under a scope (a source guid or an environment
+    reference) and a key within that scope.
+
+    Args:
+        ttl (float): The number of seconds a value stays valid.
+        max_size (int): The maximum number of values kept in the cache.
+    """
+    def __init__(self, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE):
+        if (not isinstance(ttl, (six.integer_types, float))
+                or isinstance(ttl, bool) or ttl <= 0):
+            raise ValueError(
+                'The cache ttl must be a positive number but was {}.'.format(
+                    ttl))
+        if (isinstance(max_size, bool)
+                or not isinstance(max_size, six.integer_types)
+                or max_size < 1):
+            raise ValueError(
+                'The cache size must be a positive integer but was {}.'.format(
+                    max_size))
+        self._ttl = ttl
+        self._max_size = max_size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    @property
+    def ttl(self):
+        """float: The number of seconds a value stays valid."""
+        return self._ttl
+
+    @property
+    def max_size(self):
+        """int: The maximum number of values kept in the cache."""
+        return self._max_size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, scope, key):
+        """Looks up the value stored for key in scope.
+
+        Returns:
+            tuple: (True, value) if a valid value is cached, (False, None)
+            otherwise.
+        """
+        entry_key = (scope, key)
+        with self._lock:
+            entry = self._entries.pop(entry_key, None)
+            if entry is None:
+                self._misses += 1
+                return False, None
+            expires_at, value = entry
+            if expires_at <= _clock():
+                self._expirations += 1
+                self._misses += 1
+                return False, None
+            # Re-insert the entry so it becomes the most recently used.
+            self._entries[entry_key] = entry
+            self._hits += 1
+            return True, value
+
+    def put(self, scope, key, value):
+        """Stores value for key in scope for ttl seconds."""
+        entry_key = (scope, key)
+        with self._lock:
+            self._entries.pop(entry_key, None)
+            self._entries[entry_key] = (_clock() + self._ttl, value)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, scope=None):
+        """Drops the values stored in scope, or all values if scope is None.
+
+        Returns:
+            int: The number of values dropped.
+        """
+        with self._lock:
+            if scope is None:
+                dropped = list(self._entries)
+            else:
+                dropped = [k for k in self._entries if k[0] == scope]
+            for entry_key in dropped:
+                del self._entries[entry_key]
+            self._invalidations += len(dropped)
+            return len(dropped)
+
+    def stats(self):
+        """dict: A snapshot of the cache counters."""
+        with self._lock:
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'invalidations': self._invalidations,
+                'size': len(self._entries),
+                'max_size': self._max_size,
+                'ttl': self._ttl
+            }
+
+    def clear(self):
+        """Drops all values and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+            self._expirations = 0
+            self._invalidations = 0
+
+
+def _environment_of(value):
+    if isinstance(value, RemoteEnvironment):
+        return value.reference
+    if isinstance(value, RemoteConnection):
+        return value.environment.reference
+    if isinstance(value, VirtualSource):
+        return value.connection.environment.reference
+    if isinstance(value, StagedSource):
+        return value.staged_connection.environment.reference
+    if isinstance(value, DirectSource):
+        return value.connection.environment.reference
+    return None
+
+
+def _scope_of(scope, values):
+    for value in values:
+        if scope == Scope.SOURCE and isinstance(value, _SOURCE_TYPES):
+            return value.guid
+        if scope == Scope.ENVIRONMENT:
+            reference = _environment_of(value)
+            if reference is not None:
+                return reference
+    return None
+
+
+def _freeze(value):
+    """Converts an argument into a hashable value that compares equal for
+    equal arguments."""
+    if isinstance(value, _SOURCE_TYPES):
+        return value.guid
+    if isinstance(value, RemoteConnection):
+        return (value.environment.reference, value.user.reference)
+    if isinstance(value, (RemoteEnvironment, RemoteHost, RemoteUser)):
+        return value.reference
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if hasattr(value, 'to_dict') and hasattr(value, 'swagger_types'):
+        # A plugin defined object generated from the schemas.
+        return (type(value).__name__, _freeze(value.to_dict()))
+    return value
+
+
+def memoize(scope, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE):
+    """Decorator that caches the results of a function per scope.
+
+    The decorated function gets the attributes cache (its ScopedCache) and
+    invalidate(scope_key=None).
+
+    Args:
+        scope (Scope): Whether results are cached per source or per
+            environment.
+        ttl (float): The number of seconds a result stays valid.
+        max_size (int): The maximum number of results kept.
+    """
+    if not isinstance(scope, Scope):
+        raise ValueError('The cache scope must be one of {} but was'
+                         ' {}.'.format([s.value for s in Scope], scope))
+    scoped_cache = ScopedCache(ttl, max_size)
+
+    def memoize_decorator(func):
+        if not inspect.isfunction(func):
+            name = getattr(func, '__name__', type(func).__name__)
+            raise DecoratorNotFunctionError(name, 'memoize')
+
+        @functools.wraps(func)
+        def memoized(*args, **kwargs):
+            call_args = inspect.getcallargs(func, *args, **kwargs)
+            names = sorted(call_args)
+            scope_key = _scope_of(scope, [call_args[n] for n in names])
+            if scope_key is None:
+                raise CacheScopeNotFoundError(func.__name__, scope.value)
+
+            key = tuple((n, _freeze(call_args[n])) for n in names)
+            found, value = scoped_cache.get(scope_key, key)
+            if not found:
+                value = func(*args, **kwargs)
+                scoped_cache.put(scope_key, key, value)
+            return value
+
+        memoized.cache = scoped_cache
+        memoized.invalidate = scoped_cache.invalidate
+        with _REGISTRY_LOCK:
+            _CACHES.add(scoped_cache)
+        return memoized
+
+    return memoize_decorator
+
+
+def memoize_per_source(ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE):
+    """Decorator that caches the results of a function per source guid."""
+    return memoize(Scope.SOURCE, ttl, max_size)
+
+
+def memoize_per_environment(ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE):
+    """Decorator that caches the results of a function per environment."""
+    return memoize(Scope.ENVIRONMENT, ttl, max_size)
+
+
+def _invalidate(scope_key):
+    with _REGISTRY_LOCK:
+        caches = list(_CACHES)
+    return sum(c.invalidate(scope_key) for c in caches)
+
+
+def invalidate_source(guid):
+    """Drops the results cached for a source from every memoized function.
+
+    Returns:
+        int: The number of results dropped.
+    """
+    return _invalidate(guid)
+
+
+def invalidate_environment(reference):
+    """Drops the results cached for an environment from every memoized
+    function.
+
+    Returns:
+        int: The number of results dropped.
+    """
+    return _invalidate(reference)
+
+
+def add_invalidation_hook(hook):
+    """Registers hook(operation, scope_key) to run when CacheInvalidator
+    invalidates a scope. scope_key is the source guid, or the environment
+    reference after repository discovery."""
+    with _REGISTRY_LOCK:
+        _INVALIDATION_HOOKS.append(hook)
+
+
+def remove_invalidation_hook(hook):
+    """Unregisters a hook added with add_invalidation_hook."""
+    with _REGISTRY_LOCK:
+        _INVALIDATION_HOOKS.remove(hook)
+
+
+class CacheInvalidator(OperationInterceptor):
+    """Interceptor that invalidates the memoized results of a source after
+    the operations that modify it, and those of an environment after it is
+    discovered again.
+
+    The scope is invalidated whether the operation succeeded or not, as a
+    failed operation may have changed the source.
+    """
+    def after(self, invocation):
+        if invocation.operation in MUTATING_OPERATIONS:
+            scope_key = invocation.source_guid
+        elif invocation.operation == Op.DISCOVERY_REPOSITORY:
+            scope_key = (
+                invocation.request.source_connection.environment.reference)
+        else:
+            return
+        if not scope_key:
+            return
+
+        _invalidate(scope_key)
+        with _REGISTRY_LOCK:
+            hooks = list(_INVALIDATION_HOOKS)
+        for hook in hooks:
+            hook(invocation.operation, scope_key)
@@ -259,3 +259,136 @@ class IncorrectPluginCodeError(PluginRuntimeError):
 
     def __init__(self, message):
         super(IncorrectPluginCodeError, self).__init__(message)
+
+
+class CacheScopeNotFoundError(PluginRuntimeError):
+    """CacheScopeNotFoundError gets thrown when a function memoized per source
+    or per environment is called without any argument identifying the source
+    or the environment to cache the result for.
+
+    Args:
+        function_name (str): The name of the memoized function.
+        scope (str): The scope of the memoized function.
+
+    Attributes:
+        message (str): A user-readable message describing the exception.
+    """
+    def __init__(self, function_name, scope):
+        message = ("The function '{}' is memoized per {} but none of its"
+                   " arguments identify the {}.".format(
+                       function_name, scope, scope))
+        super(CacheScopeNotFoundError, self).__init__(message)
+
+
+class JobContextSizeError(PluginRuntimeError):
+    """JobContextSizeError gets thrown when a value stored in a job context is
+    larger than the memory allowed for the whole context.
+
+    Args:
+        key (str): The key the value was stored under.
+        size (int): The estimated size of the value in bytes.
+        max_bytes (int): The memory allowed for a job context in bytes.
+
+    Attributes:
+        message (str): A user-readable message describing the exception.
+    """
+    def __init__(self, key, size, max_bytes):
+        message = ("The value stored for '{}' in the job context takes about"
+                   " {} bytes which is more than the {} bytes allowed for a"
+                   " job context.".format(key, size, max_bytes))
+        super(JobContextSizeError, self).__init__(message)
+
+
+class SnapshotMetadataSizeError(PluginRuntimeError):
+    """SnapshotMetadataSizeError gets thrown when the snapshot returned by a
+    post snapshot operation encodes to more bytes than the limit set for it.
+
+    Args:
+        operation (Operation): The Operation enum of the operation being run.
+        size (int): The size of the encoded snapshot in bytes.
+        max_bytes (int): The largest encoded snapshot allowed in bytes.
+
+    Attributes:
+        message (str): A user-readable message describing the exception.
+    """
+    def __init__(self, operation, size, max_bytes):
+        message = ("The snapshot returned by the {} operation encodes to {}"
+                   " bytes which is more than the {} bytes allowed. Store"
+                   " large data such as file manifests on the staging host and"
+                   " keep a reference to it in the snapshot instead.".format(
+                       operation.value, size, max_bytes))
+        super(SnapshotMetadataSizeError, self).__init__(message)
+
+
+class ObjectMigrationError(PluginRuntimeError):
+    """ObjectMigrationError gets thrown when a migration fails on one of the
+    objects of an upgrade, whether the upgrade runs serially or in parallel.
+
+    Args:
+        object_ref (str): The reference of the object the migration failed on.
+        error_type (str): The name of the type of the exception raised by the
+            migration.
+        error_message (str): The message of the exception raised by the
+            migration.
+
+    Attributes:
+        object_ref (str): The reference of the object the migration failed on.
+        error_type (str): The name of the type of the exception raised.
+        error_message (str): The message of the exception raised.
+        message (str): A user-readable message describing the exception.
+    """
+    def __init__(self, object_ref, error_type, error_message):
+        self.object_ref = object_ref
+        self.error_type = error_type
+        self.error_message = error_message
+        message = ("The migration of the object '{}' failed with {}: {}"
+                   .format(object_ref, error_type, error_message))
+        super(ObjectMigrationError, self).__init__(message)
+
+
+class UpgradeValidationError(PluginRuntimeError):
+    """UpgradeValidationError gets thrown when objects upgraded by an upgrade
+    operation do not match the schema of their type.
+
+    Args:
+        operation (Operation): The Operation enum of the operation being run.
+        failures (list of tuple(str, str)): The reference of every object
+            that does not match the schema and the type and message of the
+            exception raised when validating it, in reference order.
+        objects (int): The number of objects validated.
+        max_reported (int): The number of failures listed in the message.
+
+    Attributes:
+        failures (list of tuple(str, str)): The failures given.
+        message (str): A user-readable message describing the exception.
+    """
+    def __init__(self, operation, failures, objects, max_reported=20):
+        self.failures = failures
+        listed = '; '.join("'{}' failed with {}".format(object_ref, error)
+                           for object_ref, error in failures[:max_reported])
+        if len(failures) > max_reported:
+            listed += '; and {} more'.format(len(failures) - max_reported)
+        message = ('{} of the {} objects upgraded by the {} operation do not'
+                   ' match the schema: {}.'.format(len(failures), objects,
+                                                   operation.value, listed))
+        super(UpgradeValidationError, self).__init__(message)
+
+
+class UnknownOperationError(PlatformError):
+    """UnknownOperationError gets thrown when the Delphix Engine dispatches an
+    operation the plugin runtime cannot run on a request.
+
+    Args:
+        operation (Operation): The operation that was dispatched.
+        direct (bool): Whether the operation of a direct linked source was
+            dispatched.
+
+    Attributes:
+        message (str): A user-readable message describing the exception.
+    """
+    def __init__(self, operation, direct=False):
+        message = ("The operation '{}'{} cannot be dispatched because it is"
+                   " not a dispatchable plugin operation.".format(
+                       getattr(operation, 'value', operation),
+                       ' of a direct linked source' if direct else ''))
+        super(UnknownOperationError, self).__init__(message)
@@ -5,6 +5,11 @@ import inspect
 
 from dlpx.virtualization.platform import exceptions
 
+#
+# The checks are only registered while import_validations is being imported,
+# which the import lock serializes, and are only read afterwards, so the
+# validations can run on several threads.
+#
 _IMPORT_CHECKS = {}
 _POST_IMPORT_CHECKS = {}
 
@@ -6,6 +6,10 @@ import inspect
 from dlpx.virtualization.platform import exceptions
 from dlpx.virtualization.platform.import_util import (import_check,
                                                       post_import_check)
+from dlpx.virtualization.platform.migration_helper import UpgradeMigrations
+
+_OPERATIONS_TYPES = ('DiscoveryOperations', 'LinkedOperations',
+                     'VirtualOperations')
 
 
 @import_check(ordinal=1)
@@ -80,8 +84,13 @@ def validate_named_args(plugin_module):
             if plugin_op_type == 'UpgradeOperations':
                 continue
 
+            # Skip any other state the Plugin object keeps (interceptors).
+            if plugin_op_type not in _OPERATIONS_TYPES:
+                continue
+
             for op_name_key, op_name in plugin_attrib.__dict__.items():
-                if op_name is None:
+                # Only the *_impl attributes hold plugin implementations.
+                if op_name is None or not op_name_key.endswith('_impl'):
                     continue
                 actual_args = inspect.getargspec(op_name)
                 warnings.extend(
@@ -147,6 +156,8 @@ def _check_upgrade_args(upgrade_operations, expected_upgrade_args):
     warnings = []
 
     for migration_helper in vars(upgrade_operations).values():
+        if not isinstance(migration_helper, UpgradeMigrations):
+            continue
         # Next we must loop through each of the attributes (Should be just two)
         for attribute_name, attribute in vars(migration_helper).items():
             if attribute_name not in expected_upgrade_args.keys():
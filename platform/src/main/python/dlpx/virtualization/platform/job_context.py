@@ -0,0 +1,335 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+# -*- coding: utf-8 -*-
+"""Job context shared by consecutive operations on a source
+
+A job on the Delphix Engine often runs several plugin operations on the same
+source one after the other, for example linked.pre_snapshot() followed by
+linked.post_snapshot(). A JobContext lets the later operations reuse what the
+earlier ones computed instead of discovering it again:
+
+  from dlpx.virtualization.platform import Plugin, job_context
+
+  my_db_plugin = Plugin(interceptors=[job_context.JobContextReleaser()])
+
+  @my_db_plugin.linked.pre_snapshot()
+  def linked_pre_snapshot(staged_source, repository, source_config,
+                          optional_snapshot_parameters):
+      context = job_context.get_job_context(staged_source)
+      context['data_files'] = list_data_files(staged_source)
+
+  @my_db_plugin.linked.post_snapshot()
+  def linked_post_snapshot(staged_source, repository, source_config,
+                           optional_snapshot_parameters):
+      context = job_context.get_job_context(staged_source)
+      data_files = context.get('data_files')
+      if data_files is None:
+          data_files = list_data_files(staged_source)
+      ...
+
+Contexts are keyed on the guid of the source. Nothing guarantees that the
+operations of a job run in the same interpreter, so a context is only a
+cache and the plugin must be able to compute any value it reads from it.
+
+A context expires once it has not been used for ttl seconds and the store
+keeps at most max_contexts of them, dropping the least recently used one
+first. The values of a context may take at most max_bytes (as estimated with
+sys.getsizeof) and the oldest values are dropped to make room for new ones.
+The values of all the contexts may take at most max_total_bytes, and the
+least recently used contexts are dropped to make room for new values.
+The JobContextReleaser interceptor drops the context of a source once the
+post snapshot operation that ends a snapshot job has run.
+"""
+import collections
+import sys
+import threading
+import time
+
+import six
+from dlpx.virtualization.platform._interceptors import OperationInterceptor
+from dlpx.virtualization.platform._plugin_classes import (DirectSource,
+                                                          StagedSource,
+                                                          VirtualSource)
+from dlpx.virtualization.platform.exceptions import JobContextSizeError
+from dlpx.virtualization.platform.operation import Operation as Op
+
+__all__ = [
+    'JobContext', 'JobContextStore', 'JobContextReleaser',
+    'RELEASING_OPERATIONS', 'get_job_context_store', 'get_job_context',
+    'discard_job_context'
+]
+
+DEFAULT_TTL = 3600
+DEFAULT_MAX_CONTEXTS = 64
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_MAX_TOTAL_BYTES = 64 * 1024 * 1024
+
+# The operations that end a job and release the context of their source.
+RELEASING_OPERATIONS = frozenset(
+    [Op.LINKED_POST_SNAPSHOT, Op.VIRTUAL_POST_SNAPSHOT])
+
+_clock = time.time
+
+
+def _estimate_size(value, seen=None):
+    """Estimates the memory taken by value and everything it references."""
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(
+            _estimate_size(k, seen) + _estimate_size(v, seen)
+            for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_estimate_size(v, seen) for v in value)
+    elif hasattr(value, '__dict__'):
+        size += _estimate_size(vars(value), seen)
+    return size
+
+
+def _guid_of(source):
+    if isinstance(source, (VirtualSource, StagedSource, DirectSource)):
+        return source.guid
+    if isinstance(source, six.string_types) and source:
+        return source
+    raise ValueError('A job context is keyed on a VirtualSource, StagedSource,'
+                     ' DirectSource or source guid but got {}.'.format(
+                         type(source)))
+
+
+class JobContext(object):
+    """The values shared by the operations of a job on a source.
+
+    A JobContext behaves like a dict of the values stored in it. Values are
+    not copied, so a value read from the context must not be modified unless
+    it is stored again.
+    """
+    def __init__(self, guid, max_bytes, lock, on_grow=None):
+        self._guid = guid
+        self._max_bytes = max_bytes
+        self._lock = lock
+        # Called with the context, under the lock, after a value was stored.
+        self._on_grow = on_grow
+        self._values = collections.OrderedDict()
+        self._sizes = {}
+        self._size = 0
+
+    @property
+    def guid(self):
+        """str: The guid of the source this context belongs to."""
+        return self._guid
+
+    @property
+    def size(self):
+        """int: The estimated memory taken by the values in bytes."""
+        return self._size
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def __getitem__(self, key):
+        with self._lock:
+            return self._values[key]
+
+    def __setitem__(self, key, value):
+        size = _estimate_size(value)
+        if size > self._max_bytes:
+            raise JobContextSizeError(key, size, self._max_bytes)
+
+        with self._lock:
+            self._remove(key)
+            while self._values and self._size + size > self._max_bytes:
+                self._remove(next(iter(self._values)))
+            self._values[key] = value
+            self._sizes[key] = size
+            self._size += size
+            if self._on_grow is not None:
+                self._on_grow(self)
+
+    def __delitem__(self, key):
+        with self._lock:
+            if key not in self._values:
+                raise KeyError(key)
+            self._remove(key)
+
+    def _remove(self, key):
+        if key in self._values:
+            del self._values[key]
+            self._size -= self._sizes.pop(key)
+
+    def get(self, key, default=None):
+        """Returns the value stored for key, or default if there is none."""
+        with self._lock:
+            return self._values.get(key, default)
+
+    def keys(self):
+        """list: The keys of the values stored in this context."""
+        with self._lock:
+            return list(self._values)
+
+    def clear(self):
+        """Drops all the values of this context."""
+        with self._lock:
+            self._values.clear()
+            self._sizes.clear()
+            self._size = 0
+
+
+class JobContextStore(object):
+    """The job contexts of the sources a plugin runs operations on.
+
+    Args:
+        ttl (float): The number of seconds an unused context is kept.
+        max_contexts (int): The maximum number of contexts kept.
+        max_bytes (int): The memory allowed for the values of a context.
+        max_total_bytes (int): The memory allowed for the values of all the
+            contexts. A context may take at most this much memory even if
+            max_bytes is larger.
+    """
+    def __init__(self,
+                 ttl=DEFAULT_TTL,
+                 max_contexts=DEFAULT_MAX_CONTEXTS,
+                 max_bytes=DEFAULT_MAX_BYTES,
+                 max_total_bytes=DEFAULT_MAX_TOTAL_BYTES):
+        if (not isinstance(ttl, (six.integer_types, float))
+                or isinstance(ttl, bool) or ttl <= 0):
+            raise ValueError('The job context ttl must be a positive number'
+                             ' but was {}.'.format(ttl))
+        for name, value in (('max_contexts', max_contexts),
+                            ('max_bytes', max_bytes), ('max_total_bytes',
+                                                       max_total_bytes)):
+            if not isinstance(value, six.integer_types) or value < 1:
+                raise ValueError('The job context {} must be a positive'
+                                 ' integer but was {}.'.format(name, value))
+        self._ttl = ttl
+        self._max_contexts = max_contexts
+        self._max_bytes = min(max_bytes, max_total_bytes)
+        self._max_total_bytes = max_total_bytes
+        # guid -> (last used time, JobContext), least recently used first.
+        self._contexts = collections.OrderedDict()
+        self._lock = threading.RLock()
+        self._expirations = 0
+        self._evictions = 0
+
+    def __len__(self):
+        return len(self._contexts)
+
+    def _expire(self, now):
+        while self._contexts:
+            guid, (last_used, _) = next(iter(self._contexts.items()))
+            if last_used + self._ttl > now:
+                break
+            del self._contexts[guid]
+            self._expirations += 1
+
+    def _evict_for(self, context):
+        """Drops the least recently used contexts other than context until
+        the values of all the contexts fit in max_total_bytes."""
+        entry = self._contexts.get(context.guid)
+        if entry is None or entry[1] is not context:
+            # The context was dropped from the store and only takes memory
+            # for as long as the plugin holds it.
+            return
+        total = sum(c.size for _, c in self._contexts.values())
+        for guid in list(self._contexts):
+            if total <= self._max_total_bytes:
+                break
+            other = self._contexts[guid][1]
+            if other is context:
+                continue
+            del self._contexts[guid]
+            total -= other.size
+            self._evictions += 1
+
+    def context(self, source):
+        """Returns the context of a source, creating it if needed.
+
+        Args:
+            source (VirtualSource, StagedSource, DirectSource or str): The
+                source or its guid.
+
+        Returns:
+            JobContext: The context of the source.
+        """
+        guid = _guid_of(source)
+        with self._lock:
+            now = _clock()
+            self._expire(now)
+            entry = self._contexts.pop(guid, None)
+            if entry is None:
+                context = JobContext(guid, self._max_bytes, self._lock,
+                                     self._evict_for)
+            else:
+                context = entry[1]
+            self._contexts[guid] = (now, context)
+            while len(self._contexts) > self._max_contexts:
+                self._contexts.popitem(last=False)
+                self._evictions += 1
+            return context
+
+    def discard(self, source):
+        """Drops the context of a source.
+
+        Returns:
+            bool: Whether the source had a context.
+        """
+        guid = _guid_of(source)
+        with self._lock:
+            return self._contexts.pop(guid, None) is not None
+
+    def stats(self):
+        """dict: A snapshot of the store counters."""
+        with self._lock:
+            self._expire(_clock())
+            return {
+                'contexts': len(self._contexts),
+                'bytes': sum(c.size for _, c in self._contexts.values()),
+                'expirations': self._expirations,
+                'evictions': self._evictions
+            }
+
+    def clear(self):
+        """Drops all the contexts and resets the counters."""
+        with self._lock:
+            self._contexts.clear()
+            self._expirations = 0
+            self._evictions = 0
+
+
+_JOB_CONTEXT_STORE = JobContextStore()
+
+
+def get_job_context_store():
+    """Returns the JobContextStore shared by the plugin operations."""
+    return _JOB_CONTEXT_STORE
+
+
+def get_job_context(source):
+    """Returns the context of a source from the shared JobContextStore."""
+    return _JOB_CONTEXT_STORE.context(source)
+
+
+def discard_job_context(source):
+    """Drops the context of a source from the shared JobContextStore."""
+    return _JOB_CONTEXT_STORE.discard(source)
+
+
+class JobContextReleaser(OperationInterceptor):
+    """Interceptor that drops the context of a source from the shared
+    JobContextStore once an operation in RELEASING_OPERATIONS has run on it.
+    """
+    def after(self, invocation):
+        if invocation.operation not in RELEASING_OPERATIONS:
+            return
+        guid = invocation.source_guid
+        if guid:
+            _JOB_CONTEXT_STORE.discard(guid)
@@ -1,7 +1,8 @@
 #
-# Copyright (c) 2019 by Delphix. All rights reserved.
+# Copyright (c) 2019, 2020 by Delphix. All rights reserved.
 #
 
+import bisect
 import re
 
 from dlpx.virtualization.platform import validation_util as v
@@ -11,6 +12,69 @@ from dlpx.virtualization.platform.exceptions import (
 from dlpx.virtualization.platform.operation import Operation as Op
 
 
+def parse_version(version):
+    """Returns the tuple of integers of a dotted version string, e.g. (1, 10)
+    for '1.10', so that versions compare numerically part by part."""
+    return tuple(int(part) for part in version.split('.'))
+
+
+def format_version(version):
+    """Returns the dotted string of a version tuple."""
+    return '.'.join(str(part) for part in version)
+
+
+class MigrationIndex(object):
+    """Migrations kept in the order of their parsed versions.
+
+    Versions are tuples of integers as returned by parse_version(). Looking a
+    version up and finding the migrations from a version on use bisection on
+    the sorted versions, so that they take O(log n) and never re-sort.
+    """
+    def __init__(self):
+        self._versions = []
+        self._migrations = []
+
+    def __len__(self):
+        return len(self._versions)
+
+    def __contains__(self, version):
+        index = bisect.bisect_left(self._versions, version)
+        return (index < len(self._versions)
+                and self._versions[index] == version)
+
+    def add(self, version, migration):
+        """Adds the migration of a version.
+
+        Returns:
+            bool: False if the version already had a migration, which is then
+            left unchanged.
+        """
+        index = bisect.bisect_left(self._versions, version)
+        if (index < len(self._versions)
+                and self._versions[index] == version):
+            return False
+        self._versions.insert(index, version)
+        self._migrations.insert(index, migration)
+        return True
+
+    def get(self, version, default=None):
+        """Returns the migration of a version, or default if it has none."""
+        index = bisect.bisect_left(self._versions, version)
+        if (index < len(self._versions)
+                and self._versions[index] == version):
+            return self._migrations[index]
+        return default
+
+    def versions(self):
+        """list: The versions, in ascending order."""
+        return list(self._versions)
+
+    def migrations_from(self, version):
+        """Returns the migrations of the versions greater than or equal to
+        version, in ascending order of version."""
+        return self._migrations[bisect.bisect_left(self._versions, version):]
+
+
 class UpgradeMigrations(object):
     def __init__(self):
         self._repository_id_to_impl = {}
@@ -81,12 +145,14 @@ class PlatformUpgradeMigrations(UpgradeMigrations):
 
     def __init__(self):
         """
-        The list of migration ids will store migrations as an array of ids
-        where the id is represented by the standardized array of positive
+        The index of migration ids will store migrations as tuples of ids
+        where the id is represented by the standardized tuple of positive
         integers. For example if there were these ids: 1.0.0, 1.2.03, and
-        2.0.1.0, __migration_ids would be [ [1], [1, 2, 3], [2, 0, 1]]
+        2.0.1.0, __migration_ids would hold (1,), (1, 2, 3) and (2, 0, 1)
+        mapped to the names of their implementations.
         """
-        self.__migration_ids = []
+        self.__migration_ids = MigrationIndex()
+        self.__sorted_ids = None
         super(PlatformUpgradeMigrations, self).__init__()
 
     def add_repository(self, migration_id, repository_impl):
@@ -126,15 +192,16 @@ class PlatformUpgradeMigrations(UpgradeMigrations):
         # Then we must standardize the migration_id.
         std_migration_id = self.__standardize_migration_id_to_array(
             migration_id, impl_name)
-        std_string = '.'.join(str(i) for i in std_migration_id)
+        std_string = format_version(std_migration_id)
 
-        # Then we should check if this migration_id has already been used
-        if std_migration_id in self.__migration_ids:
+        #
+        # Lastly we should add this new id into the internal migration index,
+        # which fails if this migration_id has already been used.
+        #
+        if not self.__migration_ids.add(tuple(std_migration_id), impl_name):
             raise MigrationIdAlreadyUsedError.fromMigrationId(
                 migration_id, std_string, impl_name)
-
-        # Lastly we should add this new array into the internal migration list.
-        self.__migration_ids.append(std_migration_id)
+        self.__sorted_ids = None
 
         # Return back the standardized format of the migration id
         return std_string
@@ -178,14 +245,19 @@ class PlatformUpgradeMigrations(UpgradeMigrations):
         return array
 
     def get_sorted_ids(self):
-        # First sort the migration ids
-        self.__migration_ids.sort()
-
-        # Then convert all these arrays to the usual string format.
-        return [
-            '.'.join(str(i) for i in migration_id)
-            for migration_id in self.__migration_ids
-        ]
+        #
+        # The index keeps the ids sorted as they are added. Their string form
+        # is computed once after the last migration was added since every
+        # upgrade operation asks for them.
+        #
+        sorted_ids = self.__sorted_ids
+        if sorted_ids is None:
+            sorted_ids = [
+                format_version(migration_id)
+                for migration_id in self.__migration_ids.versions()
+            ]
+            self.__sorted_ids = sorted_ids
+        return list(sorted_ids)
 
     def get_repository_impls_to_exec(self, migration_id_list):
         return self.__get_impls(migration_id_list, self.get_repository_dict())
@@ -220,88 +292,97 @@ class LuaUpgradeMigrations(UpgradeMigrations):
 
     def __init__(self):
         super(LuaUpgradeMigrations, self).__init__()
+        self.__repository_index = MigrationIndex()
+        self.__source_config_index = MigrationIndex()
+        self.__linked_source_index = MigrationIndex()
+        self.__virtual_source_index = MigrationIndex()
+        self.__snapshot_index = MigrationIndex()
 
     def add_repository(self, migration_id, repository_impl):
-        std_mig_id = self.__validate_lua_major_minor_version(
-            migration_id, repository_impl.__name__,
-            Op.UPGRADE_REPOSITORY.value, self.get_repository_dict)
+        std_mig_id = self.__add(migration_id, repository_impl,
+                                Op.UPGRADE_REPOSITORY,
+                                self.__repository_index)
         super(LuaUpgradeMigrations,
               self).add_repository(std_mig_id, repository_impl)
 
     def add_source_config(self, migration_id, source_config_impl):
-        std_mig_id = self.__validate_lua_major_minor_version(
-            migration_id, source_config_impl.__name__,
-            Op.UPGRADE_SOURCE_CONFIG.value, self.get_source_config_dict)
+        std_mig_id = self.__add(migration_id, source_config_impl,
+                                Op.UPGRADE_SOURCE_CONFIG,
+                                self.__source_config_index)
         super(LuaUpgradeMigrations,
               self).add_source_config(std_mig_id, source_config_impl)
 
     def add_linked_source(self, migration_id, linked_source_impl):
-        std_mig_id = self.__validate_lua_major_minor_version(
-            migration_id, linked_source_impl.__name__,
-            Op.UPGRADE_LINKED_SOURCE.value, self.get_linked_source_dict)
+        std_mig_id = self.__add(migration_id, linked_source_impl,
+                                Op.UPGRADE_LINKED_SOURCE,
+                                self.__linked_source_index)
         super(LuaUpgradeMigrations,
               self).add_linked_source(std_mig_id, linked_source_impl)
 
     def add_virtual_source(self, migration_id, virtual_source_impl):
-        std_mig_id = self.__validate_lua_major_minor_version(
-            migration_id, virtual_source_impl.__name__,
-            Op.UPGRADE_VIRTUAL_SOURCE.value, self.get_virtual_source_dict)
+        std_mig_id = self.__add(migration_id, virtual_source_impl,
+                                Op.UPGRADE_VIRTUAL_SOURCE,
+                                self.__virtual_source_index)
         super(LuaUpgradeMigrations,
               self).add_virtual_source(std_mig_id, virtual_source_impl)
 
     def add_snapshot(self, migration_id, snapshot_impl):
-        std_mig_id = self.__validate_lua_major_minor_version(
-            migration_id, snapshot_impl.__name__, Op.UPGRADE_SNAPSHOT.value,
-            self.get_snapshot_dict)
+        std_mig_id = self.__add(migration_id, snapshot_impl,
+                                Op.UPGRADE_SNAPSHOT,
+                                self.__snapshot_index)
         super(LuaUpgradeMigrations, self).add_snapshot(std_mig_id,
                                                        snapshot_impl)
 
     @staticmethod
-    def __validate_lua_major_minor_version(migration_id, impl_name,
-                                           decorator_name, impl_getter):
+    def __add(migration_id, impl, operation, index):
+        """
+        Validates the lua major minor version, adds impl to the index of its
+        object type and returns the canonical format of the version.
+        """
+        impl_name = impl.__name__
+
         # First validate that the major minor version is a string
         if not isinstance(migration_id, basestring):
             raise MigrationIdIncorrectTypeError(migration_id, impl_name)
 
-        # Next check if the id already exists in this particular dictionary
-        if migration_id in impl_getter():
-            raise MigrationIdAlreadyUsedError.fromLuaVersion(
-                migration_id, impl_name, decorator_name)
-
-        # Lastly check if the id is the right format for a lua version
+        # Next check if the id is the right format for a lua version
         if not LuaUpgradeMigrations.LUA_VERSION_REGEX.match(migration_id):
             raise MigrationIdIncorrectFormatError.from_fields(
                 migration_id, impl_name,
                 LuaUpgradeMigrations.LUA_VERSION_REGEX.pattern)
 
         #
-        # Now we want to decompose the version string to get rid of any
-        # leading zeros (such as 1.01 -> 1.1)
+        # Lastly add the version to the index, which fails if the version has
+        # already been used. The version is compared once decomposed into
+        # integers, so 1.01 is the same version as 1.1 but 1.10 is not.
         #
-        return '.'.join(
-            str(i) for i in [int(i) for i in migration_id.split('.')])
+        version = parse_version(migration_id)
+        if not index.add(version, v.check_function(impl, operation)):
+            raise MigrationIdAlreadyUsedError.fromLuaVersion(
+                migration_id, impl_name, operation.value)
+
+        return format_version(version)
 
     def get_repository_impls_to_exec(self, migration_id):
-        return self.__get_sorted_impls(migration_id,
-                                       self.get_repository_dict())
+        return self.__get_sorted_impls(migration_id, self.__repository_index)
 
     def get_source_config_impls_to_exec(self, migration_id):
         return self.__get_sorted_impls(migration_id,
-                                       self.get_source_config_dict())
+                                       self.__source_config_index)
 
     def get_linked_source_impls_to_exec(self, migration_id):
         return self.__get_sorted_impls(migration_id,
-                                       self.get_linked_source_dict())
+                                       self.__linked_source_index)
 
     def get_virtual_source_impls_to_exec(self, migration_id):
         return self.__get_sorted_impls(migration_id,
-                                       self.get_virtual_source_dict())
+                                       self.__virtual_source_index)
 
     def get_snapshot_impls_to_exec(self, migration_id):
-        return self.__get_sorted_impls(migration_id, self.get_snapshot_dict())
+        return self.__get_sorted_impls(migration_id, self.__snapshot_index)
 
     @staticmethod
-    def __get_sorted_impls(migration_id, impl_dict):
+    def __get_sorted_impls(migration_id, index):
         #
         # If there is no migration id, this means no lua version was provided
         # so just return an empty list.
@@ -309,19 +390,7 @@ class LuaUpgradeMigrations(UpgradeMigrations):
         if not migration_id:
             return []
         #
-        # First filter out all ids less than the migration id. We need to do
-        # this because even after sorting, we wouldn't know where in the list
-        # to start iterating over.
-        #
-        def filter_lower(current):
-            return (sorted([current, migration_id],
-                           key=float)[0] == migration_id)
-
-        # Filter and sort the list.
-        id_list = sorted(filter(filter_lower, impl_dict.keys()), key=float)
-
-        #
-        # Loop through ids after filtering out lower ids and sorting to add
-        # the impl to the resulting list in the correct order.
+        # The index is sorted by version, so the migrations to run are all
+        # the ones from the first version not lower than the migration id.
         #
-        return [impl_dict[found_id] for found_id in id_list]
+        return index.migrations_from(parse_version(migration_id))
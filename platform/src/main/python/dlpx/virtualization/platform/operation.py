@@ -34,3 +34,5 @@ class Operation(Enum):
     UPGRADE_LINKED_SOURCE = 'upgrade.linked_source()'
     UPGRADE_VIRTUAL_SOURCE = 'upgrade.virtual_source()'
     UPGRADE_SNAPSHOT = 'upgrade.snapshot()'
+
+    RUNTIME_INIT = 'runtime_init()'
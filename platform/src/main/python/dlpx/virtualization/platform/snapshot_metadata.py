@@ -0,0 +1,141 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+# -*- coding: utf-8 -*-
+"""Size accounting for the snapshot metadata returned by plugins
+
+The snapshot returned by a post snapshot operation is stored by the Delphix
+Engine with every snapshot of the source, so its size adds up. The post
+snapshot wrappers encode snapshots without any whitespace and account for the
+size of every encoded snapshot in a SnapshotSizeLimits. A snapshot larger
+than warning_bytes is logged, and one larger than max_bytes fails the
+operation with a SnapshotMetadataSizeError:
+
+  from dlpx.virtualization.platform import Plugin, snapshot_metadata
+
+  my_db_plugin = Plugin()
+
+  @my_db_plugin.linked.post_snapshot(
+      size_limits=snapshot_metadata.SnapshotSizeLimits(
+          warning_bytes=16 * 1024, max_bytes=256 * 1024))
+  def linked_post_snapshot(staged_source, repository, source_config,
+                           optional_snapshot_parameters):
+      ...
+
+Bulky data such as file manifests can be kept on the staging host with
+dlpx.virtualization.libs.manifest_store, the snapshot only keeping the
+reference to it.
+"""
+import logging
+import threading
+
+import six
+
+from dlpx.virtualization.platform import _json_util
+from dlpx.virtualization.platform._operation_context import \
+    get_operation_context
+from dlpx.virtualization.platform.exceptions import SnapshotMetadataSizeError
+
+__all__ = ['SnapshotSizeLimits']
+
+logger = logging.getLogger(__name__)
+
+# The size of an encoded snapshot above which a warning is logged by default.
+DEFAULT_WARNING_BYTES = 64 * 1024
+
+
+class SnapshotSizeLimits(object):
+    """The size limits of the snapshots returned by a post snapshot operation
+    and the sizes of the snapshots encoded so far.
+
+    Args:
+        warning_bytes (int): The size of an encoded snapshot above which a
+            warning is logged, or None for no warning.
+        max_bytes (int): The largest encoded snapshot allowed, or None for no
+            limit.
+    """
+    def __init__(self, warning_bytes=DEFAULT_WARNING_BYTES, max_bytes=None):
+        for name, value in (('warning_bytes', warning_bytes), ('max_bytes',
+                                                               max_bytes)):
+            if value is not None and (not isinstance(value, six.integer_types)
+                                      or isinstance(value, bool) or value < 1):
+                raise ValueError('The snapshot {} must be a positive integer'
+                                 ' but was {}.'.format(name, value))
+        self._warning_bytes = warning_bytes
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._snapshots = 0
+        self._total_bytes = 0
+        self._largest_bytes = 0
+        self._last_bytes = None
+        self._warnings = 0
+        self._rejections = 0
+
+    @property
+    def warning_bytes(self):
+        """int: The size above which a warning is logged, or None."""
+        return self._warning_bytes
+
+    @property
+    def max_bytes(self):
+        """int: The largest encoded snapshot allowed, or None."""
+        return self._max_bytes
+
+    def encode(self, operation, snapshot):
+        """Encodes a snapshot as compact JSON and accounts for its size.
+
+        Args:
+            operation (Operation): The post snapshot operation being run.
+            snapshot (SnapshotDefinition): The snapshot it returned.
+
+        Returns:
+            str: The encoded snapshot.
+
+        Raises:
+            SnapshotMetadataSizeError: If the encoded snapshot is larger than
+                max_bytes.
+        """
+        encoded = _json_util.dumps(snapshot.to_dict(), compact=True)
+        # json.dumps escapes non ASCII characters, so a character is a byte.
+        size = len(encoded)
+        too_large = self._max_bytes is not None and size > self._max_bytes
+        warn = (not too_large and self._warning_bytes is not None
+                and size > self._warning_bytes)
+
+        with self._lock:
+            self._snapshots += 1
+            self._total_bytes += size
+            self._largest_bytes = max(self._largest_bytes, size)
+            self._last_bytes = size
+            if too_large:
+                self._rejections += 1
+            elif warn:
+                self._warnings += 1
+
+        context = get_operation_context()
+        guid = None if context is None else context.guid
+        logger.debug('The snapshot returned by the {} operation on {} encodes'
+                     ' to {} bytes.'.format(operation.value, guid, size))
+        if too_large:
+            raise SnapshotMetadataSizeError(operation, size, self._max_bytes)
+        if warn:
+            logger.warning('The snapshot returned by the {} operation on {}'
+                           ' encodes to {} bytes, more than the {} bytes'
+                           ' expected. Consider storing large data on the'
+                           ' staging host instead.'.format(
+                               operation.value, guid, size,
+                               self._warning_bytes))
+        return encoded
+
+    def stats(self):
+        """dict: A snapshot of the size counters."""
+        with self._lock:
+            return {
+                'snapshots': self._snapshots,
+                'total_bytes': self._total_bytes,
+                'largest_bytes': self._largest_bytes,
+                'last_bytes': self._last_bytes,
+                'warnings': self._warnings,
+                'rejections': self._rejections
+            }
@@ -0,0 +1,173 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+# -*- coding: utf-8 -*-
+"""Checkpoints of the objects migrated by upgrade operations
+
+When a data migration fails on one of the objects of a large upgrade, the
+engine sends the whole request again once the plugin is fixed. With a
+checkpoint store, the upgrade operations record every object they migrate,
+and a request sent again only runs the migrations on the objects that were
+not migrated yet:
+
+  from dlpx.virtualization.platform import Plugin, upgrade_checkpoint
+
+  my_db_plugin = Plugin()
+  my_db_plugin.upgrade.checkpoint(
+      upgrade_checkpoint.DirectoryCheckpointStore('/var/tmp/my_db_upgrade'))
+
+An object is recorded under the hash of the chain of migrations run on it,
+which is derived from the object type, the Lua version and migration ids of
+the request and the names of the migration functions, along with the hash of
+its metadata before the upgrade. A recorded object is only skipped when both
+match. The implementation of a migration is not part of the hash, so the
+checkpoints must be cleared when a migration that already succeeded on some
+objects is changed.
+
+Objects are recorded in batches of CheckpointStore.batch_size objects and
+when a migration fails. A store can be implemented by subclassing
+CheckpointStore and implementing its abstract methods.
+"""
+import abc
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+import six
+
+__all__ = ['CheckpointStore', 'DirectoryCheckpointStore']
+
+logger = logging.getLogger(__name__)
+
+# The number of migrated objects recorded at once by default.
+DEFAULT_BATCH_SIZE = 1000
+
+_CHAIN_HASH_FORMAT = re.compile(r'^[0-9a-f]{64}$')
+
+
+def metadata_hash(metadata):
+    """Returns the hash under which the metadata of an object before the
+    upgrade is recorded."""
+    return hashlib.sha256(metadata.encode('utf-8')).hexdigest()
+
+
+@six.add_metaclass(abc.ABCMeta)
+class CheckpointStore(object):
+    """The abstract base class of the stores of upgrade checkpoints.
+
+    Args:
+        batch_size (int): The number of migrated objects recorded at once.
+    """
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        if (not isinstance(batch_size, six.integer_types)
+                or isinstance(batch_size, bool) or batch_size < 1):
+            raise ValueError('The checkpoint batch_size must be a positive'
+                             ' integer but was {}.'.format(batch_size))
+        self.batch_size = batch_size
+
+    @abc.abstractmethod
+    def load(self, chain_hash):
+        """Returns the objects recorded under a chain hash.
+
+        Args:
+            chain_hash (str): The hash of the chain of migrations.
+
+        Returns:
+            dict: The object reference to the (metadata hash, upgraded JSON
+            metadata) of every object recorded.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def save(self, chain_hash, records):
+        """Records migrated objects under a chain hash.
+
+        Args:
+            chain_hash (str): The hash of the chain of migrations.
+            records (list): The (object reference, metadata hash, upgraded
+                JSON metadata) of the migrated objects.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clear(self):
+        """Removes all the recorded objects."""
+        raise NotImplementedError
+
+
+class DirectoryCheckpointStore(CheckpointStore):
+    """Records the migrated objects in files of a local directory, one file
+    per chain hash. Records are appended to the files as lines of JSON, and
+    a line left incomplete by a failure is ignored.
+
+    Args:
+        directory (str): The directory of the files, created if missing.
+        batch_size (int): The number of migrated objects recorded at once.
+    """
+    def __init__(self, directory, batch_size=DEFAULT_BATCH_SIZE):
+        super(DirectoryCheckpointStore, self).__init__(batch_size)
+        if not isinstance(directory, six.string_types):
+            raise ValueError('The checkpoint directory must be a string but'
+                             ' was {}.'.format(directory))
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _path(self, chain_hash):
+        if not _CHAIN_HASH_FORMAT.match(chain_hash):
+            raise ValueError(
+                "'{}' is not a chain hash.".format(chain_hash))
+        return os.path.join(self.directory, chain_hash + '.jsonl')
+
+    def load(self, chain_hash):
+        path = self._path(chain_hash)
+        recorded = {}
+        if not os.path.exists(path):
+            return recorded
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    object_ref, digest, upgraded = json.loads(
+                        line.decode('utf-8'))
+                except ValueError:
+                    logger.debug('Ignoring an incomplete checkpoint record'
+                                 ' in {}'.format(path))
+                    continue
+                recorded[object_ref] = (digest, upgraded)
+        return recorded
+
+    def save(self, chain_hash, records):
+        path = self._path(chain_hash)
+        lines = ''.join(
+            json.dumps(record, separators=(',', ':')) + '\n'
+            for record in records)
+        with self._lock:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            with open(path, 'ab') as f:
+                #
+                # A record interrupted in a previous run leaves an incomplete
+                # last line, which must not swallow the first new record.
+                #
+                if f.tell() and not self._ends_with_newline(path):
+                    f.write(b'\n')
+                f.write(lines.encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+
+    @staticmethod
+    def _ends_with_newline(path):
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def clear(self):
+        with self._lock:
+            if not os.path.isdir(self.directory):
+                return
+            for name in os.listdir(self.directory):
+                if name.endswith('.jsonl'):
+                    os.remove(os.path.join(self.directory, name))
@@ -1,12 +1,79 @@
 #
-# Copyright (c) 2019 by Delphix. All rights reserved.
+# Copyright (c) 2019, 2020 by Delphix. All rights reserved.
 #
 import inspect
+import itertools
 
 from dlpx.virtualization.platform.exceptions import DecoratorNotFunctionError
 
+# The number of items of an incorrect type reported in type errors for lists.
+MAX_REPORTED_ITEMS = 5
+
 
 def check_function(impl, operation):
     if not inspect.isfunction(impl) and not inspect.ismethod(impl):
         raise DecoratorNotFunctionError(impl.__name__, operation.value)
     return impl
+
+
+class InvalidItems(object):
+    """The items of a list or generator that are of an incorrect type.
+
+    Passed as the actual type of IncorrectTypeError and
+    IncorrectReturnTypeError, which describe it with str().
+
+    Args:
+        container (str): Description of what held the items, e.g.
+            'a list of 3 items'.
+        offenders (list of tuple(int, Type)): The index and type of the items
+            of an incorrect type.
+        truncated (bool): Whether there may be more such items than reported.
+    """
+    def __init__(self, container, offenders, truncated=False):
+        self.container = container
+        self.offenders = offenders
+        self.truncated = truncated
+
+    def __str__(self):
+        items = ', '.join('item {} was {}'.format(index, item_type)
+                          for index, item_type in self.offenders)
+        if self.truncated:
+            items += ', ...'
+        return '{} where {}'.format(self.container, items)
+
+
+def find_invalid_items(items,
+                       item_type,
+                       start=0,
+                       max_reported=MAX_REPORTED_ITEMS):
+    """Checks the type of the items of a list in a single pass.
+
+    The pass stops once max_reported items of an incorrect type were found,
+    so that the cost of the check and the size of the error do not grow with
+    the length of the list.
+
+    Args:
+        items (list): The list to check.
+        item_type (Type): The type every item must be of.
+        start (int): The index of the first item to check.
+        max_reported (int): The number of items of an incorrect type to
+            report.
+
+    Returns:
+        InvalidItems: The items of an incorrect type, or None if there are
+        none.
+    """
+    offenders = []
+    truncated = False
+    for index, item in enumerate(itertools.islice(items, start, None),
+                                 start):
+        if not isinstance(item, item_type):
+            if len(offenders) == max_reported:
+                truncated = True
+                break
+            offenders.append((index, type(item)))
+    if not offenders:
+        return None
+    container = 'a list of {} item{}'.format(len(items),
+                                             '' if len(items) == 1 else 's')
+    return InvalidItems(container, offenders, truncated)
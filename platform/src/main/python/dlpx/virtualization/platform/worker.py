@@ -0,0 +1,344 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+# -*- coding: utf-8 -*-
+"""Adaptive scheduling of the staged linked source worker
+
+The Delphix Engine calls linked.worker() periodically on every staged source,
+whether or not the source has any work for it. A WorkerScheduler lets the
+worker tell the platform when it should run again: the worker returns a hint
+and the ticks it asks to skip are answered without decoding the request or
+calling the worker at all:
+
+  from dlpx.virtualization.platform import Plugin, worker
+
+  my_db_plugin = Plugin()
+
+  @my_db_plugin.linked.worker(
+      scheduler=worker.WorkerScheduler(time_budget=60, max_backoff=32))
+  def staged_worker(staged_source, repository, source_config):
+      if not has_new_logs(staged_source):
+          return worker.IDLE
+      while has_new_logs(staged_source) and not worker.budget_exceeded():
+          apply_next_log(staged_source)
+      return worker.CONTINUE
+
+The hints are:
+
+  CONTINUE (or None): run the worker again on the next tick.
+  IDLE: there was no work. The worker backs off, skipping 1, 2, 4, ... ticks
+      after consecutive idle runs, up to max_backoff ticks.
+  skip(ticks): skip the given number of ticks.
+
+The time budget is cooperative: a running worker is never interrupted, but
+time_remaining() and budget_exceeded() tell it when to stop, and a run that
+went over the budget skips as many ticks as it overran by so that a slow
+source does not take a worker thread on every tick.
+
+The scheduler keeps WorkerStats for every source it has seen, at most
+max_sources of them, dropping the least recently run one first. Nothing
+guarantees that the ticks of a source are answered by the same interpreter,
+so a hint is only a hint and a worker must not rely on being skipped.
+"""
+import collections
+import copy
+import logging
+import threading
+import time
+
+import six
+
+from dlpx.virtualization.platform.exceptions import IncorrectReturnTypeError
+from dlpx.virtualization.platform.operation import Operation as Op
+
+__all__ = [
+    'CONTINUE', 'IDLE', 'Hint', 'Skip', 'skip', 'WorkerStats',
+    'WorkerScheduler', 'time_remaining', 'budget_exceeded'
+]
+
+logger = logging.getLogger(__name__)
+
+# The number of ticks a worker that keeps being idle skips at most by default.
+DEFAULT_MAX_BACKOFF = 16
+
+# The number of sources the statistics are kept for by default.
+DEFAULT_MAX_SOURCES = 10000
+
+_clock = time.time
+
+_LOCAL = threading.local()
+
+
+class Hint(object):
+    """The base class of the hints a worker returns."""
+
+
+class Skip(Hint):
+    """A hint asking the platform to skip the next ticks of the worker.
+
+    Args:
+        ticks (int): The number of ticks to skip. 0 runs the worker again on
+            the next tick.
+    """
+    def __init__(self, ticks):
+        if (not isinstance(ticks, six.integer_types)
+                or isinstance(ticks, bool) or ticks < 0):
+            raise ValueError('The number of ticks to skip must be a'
+                             ' non-negative integer but was {}.'.format(ticks))
+        self._ticks = ticks
+
+    @property
+    def ticks(self):
+        """int: The number of ticks to skip."""
+        return self._ticks
+
+    def __eq__(self, other):
+        return isinstance(other, Skip) and self._ticks == other._ticks
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Skip({})'.format(self._ticks)
+
+
+class _Idle(Hint):
+    def __repr__(self):
+        return 'IDLE'
+
+
+CONTINUE = Skip(0)
+IDLE = _Idle()
+
+
+def skip(ticks):
+    """Returns a hint asking the platform to skip the next ticks ticks."""
+    return Skip(ticks)
+
+
+class WorkerStats(object):
+    """The statistics of the worker runs on a source.
+
+    Attributes:
+        runs (int): The number of times the worker ran.
+        skipped (int): The number of ticks answered without running it.
+        idle_runs (int): The number of runs that returned IDLE.
+        failures (int): The number of runs that raised an exception.
+        overruns (int): The number of runs that went over the time budget.
+        total_seconds (float): The time spent in the worker.
+        max_seconds (float): The time taken by the longest run.
+        last_seconds (float): The time taken by the last run.
+        last_run (float): When the last run started, as a time.time() value.
+        last_hint: The hint returned by the last run.
+        pending_skips (int): The number of ticks still to skip.
+    """
+    def __init__(self):
+        self.runs = 0
+        self.skipped = 0
+        self.idle_runs = 0
+        self.failures = 0
+        self.overruns = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds = 0.0
+        self.last_run = None
+        self.last_hint = None
+        self.pending_skips = 0
+        self._consecutive_idle = 0
+
+    @property
+    def average_seconds(self):
+        """float: The average time taken by a run."""
+        return self.total_seconds / self.runs if self.runs else 0.0
+
+    def to_dict(self):
+        """dict: The statistics as a dict, e.g. to be logged."""
+        return {
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'idle_runs': self.idle_runs,
+            'failures': self.failures,
+            'overruns': self.overruns,
+            'total_seconds': self.total_seconds,
+            'max_seconds': self.max_seconds,
+            'last_seconds': self.last_seconds,
+            'average_seconds': self.average_seconds,
+            'last_run': self.last_run,
+            'pending_skips': self.pending_skips
+        }
+
+
+class WorkerScheduler(object):
+    """Decides which ticks of the worker run and keeps per source statistics.
+
+    Args:
+        time_budget (float): The number of seconds a run should take at most,
+            or None for no budget.
+        max_backoff (int): The number of ticks a worker that keeps being idle
+            skips at most.
+        max_sources (int): The maximum number of sources statistics are kept
+            for.
+    """
+    def __init__(self,
+                 time_budget=None,
+                 max_backoff=DEFAULT_MAX_BACKOFF,
+                 max_sources=DEFAULT_MAX_SOURCES):
+        if time_budget is not None and (
+                not isinstance(time_budget, (six.integer_types, float))
+                or isinstance(time_budget, bool) or time_budget <= 0):
+            raise ValueError('The worker time budget must be a positive number'
+                             ' but was {}.'.format(time_budget))
+        if (not isinstance(max_backoff, six.integer_types)
+                or isinstance(max_backoff, bool) or max_backoff < 0):
+            raise ValueError('The worker max_backoff must be a non-negative'
+                             ' integer but was {}.'.format(max_backoff))
+        if (not isinstance(max_sources, six.integer_types)
+                or isinstance(max_sources, bool) or max_sources < 1):
+            raise ValueError('The worker max_sources must be a positive'
+                             ' integer but was {}.'.format(max_sources))
+        self._time_budget = time_budget
+        self._max_backoff = max_backoff
+        self._max_sources = max_sources
+        # guid -> WorkerStats, least recently used first.
+        self._sources = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def time_budget(self):
+        """float: The number of seconds a run should take at most, or None."""
+        return self._time_budget
+
+    def __len__(self):
+        return len(self._sources)
+
+    def _stats_for(self, guid):
+        stats = self._sources.pop(guid, None)
+        if stats is None:
+            stats = WorkerStats()
+        self._sources[guid] = stats
+        while len(self._sources) > self._max_sources:
+            self._sources.popitem(last=False)
+        return stats
+
+    def should_skip(self, guid):
+        """Returns whether the current tick of the worker on a source is to be
+        skipped, counting it as skipped if it is.
+
+        Args:
+            guid (str): The guid of the staged source.
+        """
+        with self._lock:
+            stats = self._sources.get(guid)
+            if stats is None or stats.pending_skips == 0:
+                return False
+            stats.pending_skips -= 1
+            stats.skipped += 1
+            return True
+
+    def run(self, guid, worker):
+        """Runs the worker on a source and records the hint it returned.
+
+        Args:
+            guid (str): The guid of the staged source.
+            worker (function): Runs the worker and returns its hint.
+
+        Returns:
+            The hint returned by the worker.
+        """
+        start = _clock()
+        previous = getattr(_LOCAL, 'deadline', None)
+        _LOCAL.deadline = (None if self._time_budget is None else start +
+                           self._time_budget)
+        try:
+            hint = worker()
+        except Exception:
+            self._record(guid, start, None, failed=True)
+            raise
+        finally:
+            _LOCAL.deadline = previous
+
+        if hint is None:
+            hint = CONTINUE
+        elif not isinstance(hint, Hint):
+            self._record(guid, start, None, failed=True)
+            raise IncorrectReturnTypeError(Op.LINKED_WORKER, type(hint),
+                                           [Hint, type(None)])
+        self._record(guid, start, hint)
+        return hint
+
+    def _record(self, guid, start, hint, failed=False):
+        elapsed = max(_clock() - start, 0.0)
+        with self._lock:
+            stats = self._stats_for(guid)
+            stats.runs += 1
+            stats.total_seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+            stats.last_seconds = elapsed
+            stats.last_run = start
+            stats.last_hint = hint
+            if failed:
+                # A failing worker runs again on the next tick.
+                stats.failures += 1
+                stats.pending_skips = 0
+                stats._consecutive_idle = 0
+                return
+
+            if hint is IDLE:
+                stats.idle_runs += 1
+                stats._consecutive_idle += 1
+                skips = min(2**(stats._consecutive_idle - 1),
+                            self._max_backoff)
+            else:
+                stats._consecutive_idle = 0
+                skips = hint.ticks
+
+            if self._time_budget is not None and elapsed > self._time_budget:
+                stats.overruns += 1
+                overrun = int(elapsed // self._time_budget) - 1
+                if overrun > skips:
+                    logger.warning(
+                        'The worker on {} took {:.1f} seconds, more than its'
+                        ' budget of {} seconds. Skipping {} ticks.'.format(
+                            guid, elapsed, self._time_budget, overrun))
+                    skips = overrun
+            stats.pending_skips = skips
+
+    def stats(self, guid):
+        """Returns a copy of the WorkerStats of a source, or None if the worker
+        has not run on it."""
+        with self._lock:
+            stats = self._sources.get(guid)
+            return None if stats is None else copy.copy(stats)
+
+    def all_stats(self):
+        """dict: A copy of the WorkerStats of every source, keyed on guid."""
+        with self._lock:
+            return dict(
+                (guid, copy.copy(stats))
+                for guid, stats in self._sources.items())
+
+    def reset(self, guid=None):
+        """Forgets the statistics and pending skips of a source, or of every
+        source if guid is None, so that the worker runs on the next tick."""
+        with self._lock:
+            if guid is None:
+                self._sources.clear()
+            else:
+                self._sources.pop(guid, None)
+
+
+def time_remaining():
+    """Returns the number of seconds left in the time budget of the worker
+    running on the current thread, or None if it has no budget."""
+    deadline = getattr(_LOCAL, 'deadline', None)
+    if deadline is None:
+        return None
+    return max(deadline - _clock(), 0.0)
+
+
+def budget_exceeded():
+    """Returns whether the worker running on the current thread has used up
+    its time budget."""
+    remaining = time_remaining()
+    return remaining is not None and remaining == 0.0
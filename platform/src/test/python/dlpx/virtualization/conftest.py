@@ -3,6 +3,10 @@
 #
 
 import pytest
+from dlpx.virtualization.common import (RemoteConnection, RemoteEnvironment,
+                                        RemoteHost, RemoteUser)
+from dlpx.virtualization.platform import StagedSource, VirtualSource
+from mock import patch
 
 #
 # conftest.py is used to share fixtures among multiple tests files. pytest will
@@ -18,6 +22,34 @@ OBJECT_TYPES = [
     'snapshot'
 ]
 
+TEST_GUID = '8e1442c2-64ce-48cf-848c-ce4deacca579'
+TEST_OTHER_GUID = '0a5b1c1a-4a4e-4b9e-9e0f-1d1f1f1f1f1f'
+TEST_ENVIRONMENT_REFERENCE = 'UNIX_HOST_ENVIRONMENT-1'
+
+
+def make_connection(reference=TEST_ENVIRONMENT_REFERENCE):
+    host = RemoteHost('host', 'UNIX_HOST-1', '/binary', '/scratch')
+    environment = RemoteEnvironment('environment', reference, host)
+    return RemoteConnection(environment, RemoteUser('user', 'HOST_USER-1'))
+
+
+def make_virtual_source(guid=TEST_GUID):
+    return VirtualSource(guid, make_connection(), None, [])
+
+
+def make_staged_source(guid=TEST_GUID):
+    connection = make_connection()
+    return StagedSource(guid, connection, None, None, connection)
+
+
+class Clock(object):
+    """A clock that only moves when its time is set."""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
 
 @pytest.fixture
 def method_name(object_op):
@@ -27,3 +59,12 @@ def method_name(object_op):
 @pytest.fixture
 def get_impls_to_exec(object_op):
     return 'get_{}_impls_to_exec'.format(object_op)
+
+
+@pytest.fixture
+def clock(clocked_module):
+    """A Clock patched in as the _clock of clocked_module, a fixture each
+    test module using it defines."""
+    clock = Clock()
+    with patch.object(clocked_module, '_clock', clock):
+        yield clock
@@ -0,0 +1,274 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+import threading
+
+import pytest
+from dlpx.virtualization.api import platform_pb2
+from dlpx.virtualization.platform import InterceptorChain, cache
+from dlpx.virtualization.platform.exceptions import (CacheScopeNotFoundError,
+                                                     DecoratorNotFunctionError)
+from dlpx.virtualization.platform.operation import Operation as Op
+
+from conftest import (TEST_ENVIRONMENT_REFERENCE, TEST_GUID, TEST_OTHER_GUID,
+                      make_connection, make_virtual_source)
+
+
+@pytest.fixture
+def clocked_module():
+    return cache
+
+
+class TestScopedCache:
+    @staticmethod
+    def test_get_put(clock):
+        scoped_cache = cache.ScopedCache(ttl=10, max_size=4)
+
+        assert scoped_cache.get(TEST_GUID, 'key') == (False, None)
+        scoped_cache.put(TEST_GUID, 'key', 'value')
+
+        assert scoped_cache.get(TEST_GUID, 'key') == (True, 'value')
+        assert scoped_cache.get(TEST_OTHER_GUID, 'key') == (False, None)
+        stats = scoped_cache.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 2
+        assert stats['size'] == 1
+
+    @staticmethod
+    def test_ttl_expiry(clock):
+        scoped_cache = cache.ScopedCache(ttl=10)
+        scoped_cache.put(TEST_GUID, 'key', 'value')
+
+        clock.now += 9.5
+        assert scoped_cache.get(TEST_GUID, 'key') == (True, 'value')
+        clock.now += 1
+        assert scoped_cache.get(TEST_GUID, 'key') == (False, None)
+        assert scoped_cache.stats()['expirations'] == 1
+        assert len(scoped_cache) == 0
+
+    @staticmethod
+    def test_lru_eviction(clock):
+        scoped_cache = cache.ScopedCache(max_size=2)
+        scoped_cache.put(TEST_GUID, 'a', 1)
+        scoped_cache.put(TEST_GUID, 'b', 2)
+        scoped_cache.get(TEST_GUID, 'a')
+        scoped_cache.put(TEST_GUID, 'c', 3)
+
+        assert scoped_cache.get(TEST_GUID, 'b') == (False, None)
+        assert scoped_cache.get(TEST_GUID, 'a') == (True, 1)
+        assert scoped_cache.stats()['evictions'] == 1
+
+    @staticmethod
+    def test_invalidate_scope(clock):
+        scoped_cache = cache.ScopedCache()
+        scoped_cache.put(TEST_GUID, 'a', 1)
+        scoped_cache.put(TEST_GUID, 'b', 2)
+        scoped_cache.put(TEST_OTHER_GUID, 'a', 3)
+
+        assert scoped_cache.invalidate(TEST_GUID) == 2
+        assert scoped_cache.get(TEST_OTHER_GUID, 'a') == (True, 3)
+        assert scoped_cache.invalidate() == 1
+        assert len(scoped_cache) == 0
+
+    @staticmethod
+    @pytest.mark.parametrize('ttl', [0, -1, 'a', True])
+    def test_bad_ttl(ttl):
+        with pytest.raises(ValueError):
+            cache.ScopedCache(ttl=ttl)
+
+    @staticmethod
+    @pytest.mark.parametrize('max_size', [0, 1.5, None, True])
+    def test_bad_max_size(max_size):
+        with pytest.raises(ValueError):
+            cache.ScopedCache(max_size=max_size)
+
+    @staticmethod
+    def test_thread_safety():
+        scoped_cache = cache.ScopedCache(max_size=50)
+
+        def worker(index):
+            for i in range(500):
+                scoped_cache.put(index, i % 60, i)
+                scoped_cache.get(index, (i + 1) % 60)
+
+        threads = [
+            threading.Thread(target=worker, args=(i, )) for i in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = scoped_cache.stats()
+        assert stats['size'] == 50
+        assert stats['hits'] + stats['misses'] == 8 * 500
+
+
+class TestMemoize:
+    @staticmethod
+    def test_memoize_per_source():
+        calls = []
+
+        @cache.memoize_per_source(ttl=60)
+        def read_pid(virtual_source, path):
+            calls.append((virtual_source.guid, path))
+            return len(calls)
+
+        source = make_virtual_source()
+        assert read_pid(source, '/pid') == 1
+        assert read_pid(make_virtual_source(), path='/pid') == 1
+        assert read_pid(source, '/other') == 2
+        assert read_pid(make_virtual_source(TEST_OTHER_GUID), '/pid') == 3
+        assert read_pid.cache.stats()['hits'] == 1
+
+        assert read_pid.invalidate(TEST_GUID) == 2
+        assert read_pid(source, '/pid') == 4
+
+    @staticmethod
+    def test_memoize_per_environment():
+        calls = []
+
+        @cache.memoize_per_environment()
+        def versions(source_connection):
+            calls.append(source_connection)
+            return ['1.0']
+
+        assert versions(make_connection()) == ['1.0']
+        assert versions(make_connection()) == ['1.0']
+        assert versions(make_connection('UNIX_HOST_ENVIRONMENT-2')) == ['1.0']
+        assert len(calls) == 2
+
+    @staticmethod
+    def test_memoize_environment_from_source():
+        @cache.memoize_per_environment()
+        def hostname(virtual_source):
+            return 'host'
+
+        hostname(make_virtual_source())
+        hostname(make_virtual_source(TEST_OTHER_GUID))
+
+        assert hostname.cache.stats()['hits'] == 0
+        assert hostname.invalidate(TEST_ENVIRONMENT_REFERENCE) == 2
+
+    @staticmethod
+    def test_memoize_without_scope():
+        @cache.memoize_per_source()
+        def no_source(path):
+            return path
+
+        with pytest.raises(CacheScopeNotFoundError) as err_info:
+            no_source('/path')
+
+        assert err_info.value.message == (
+            "The function 'no_source' is memoized per source but none of its"
+            " arguments identify the source.")
+
+    @staticmethod
+    @pytest.mark.parametrize('func,name', [('not a function', 'str'),
+                                           (len, 'len')])
+    def test_memoize_not_function(func, name):
+        with pytest.raises(DecoratorNotFunctionError) as err_info:
+            cache.memoize_per_source()(func)
+
+        assert err_info.value.message == (
+            "The object '{}' decorated by 'memoize' is not a"
+            " function.".format(name))
+
+    @staticmethod
+    def test_memoize_bad_scope():
+        with pytest.raises(ValueError):
+            cache.memoize('source')
+
+    @staticmethod
+    def test_invalidate_source_all_caches():
+        @cache.memoize_per_source()
+        def first(virtual_source):
+            return 1
+
+        @cache.memoize_per_source()
+        def second(virtual_source):
+            return 2
+
+        first(make_virtual_source())
+        second(make_virtual_source())
+        second(make_virtual_source(TEST_OTHER_GUID))
+
+        assert cache.invalidate_source(TEST_GUID) == 2
+        assert len(second.cache) == 1
+
+
+class TestCacheInvalidator:
+    @staticmethod
+    @pytest.fixture
+    def status():
+        @cache.memoize_per_source()
+        def status(virtual_source):
+            return 'ACTIVE'
+
+        status(make_virtual_source())
+        return status
+
+    @staticmethod
+    @pytest.fixture
+    def hook_calls():
+        calls = []
+
+        def hook(operation, scope_key):
+            calls.append((operation, scope_key))
+
+        cache.add_invalidation_hook(hook)
+        yield calls
+        cache.remove_invalidation_hook(hook)
+
+    @staticmethod
+    def invoke(operation, request):
+        chain = InterceptorChain([cache.CacheInvalidator()])
+        return chain.invoke(operation, lambda r: None, request)
+
+    @staticmethod
+    @pytest.mark.parametrize('operation', [Op.VIRTUAL_START, Op.VIRTUAL_STOP])
+    def test_mutating_operation_invalidates(status, hook_calls, operation):
+        request = platform_pb2.StartRequest()
+        request.virtual_source.guid = TEST_GUID
+
+        TestCacheInvalidator.invoke(operation, request)
+
+        assert len(status.cache) == 0
+        assert hook_calls == [(operation, TEST_GUID)]
+
+    @staticmethod
+    def test_staged_operation_invalidates(hook_calls):
+        request = platform_pb2.StartStagingRequest()
+        request.staged_source.linked_source.guid = TEST_GUID
+
+        TestCacheInvalidator.invoke(Op.LINKED_START_STAGING, request)
+
+        assert hook_calls == [(Op.LINKED_START_STAGING, TEST_GUID)]
+
+    @staticmethod
+    def test_status_does_not_invalidate(status, hook_calls):
+        request = platform_pb2.VirtualStatusRequest()
+        request.virtual_source.guid = TEST_GUID
+
+        TestCacheInvalidator.invoke(Op.VIRTUAL_STATUS, request)
+
+        assert len(status.cache) == 1
+        assert hook_calls == []
+
+    @staticmethod
+    def test_repository_discovery_invalidates_environment(hook_calls):
+        @cache.memoize_per_environment()
+        def versions(source_connection):
+            return ['1.0']
+
+        versions(make_connection())
+        request = platform_pb2.RepositoryDiscoveryRequest()
+        request.source_connection.environment.reference = (
+            TEST_ENVIRONMENT_REFERENCE)
+
+        TestCacheInvalidator.invoke(Op.DISCOVERY_REPOSITORY, request)
+
+        assert len(versions.cache) == 0
+        assert hook_calls == [(Op.DISCOVERY_REPOSITORY,
+                               TEST_ENVIRONMENT_REFERENCE)]
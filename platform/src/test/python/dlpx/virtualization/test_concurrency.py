@@ -0,0 +1,185 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+import logging
+import threading
+import time
+
+import pytest
+from dlpx.virtualization.api import platform_pb2
+from dlpx.virtualization.platform import (OperationContextFilter,
+                                          OperationInterceptor,
+                                          get_operation_context)
+from dlpx.virtualization.platform.operation import Operation as Op
+from mock import MagicMock, patch
+
+import fake_generated_definitions
+
+THREAD_COUNT = 300
+
+
+class CountingInterceptor(OperationInterceptor):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def after(self, invocation):
+        with self.lock:
+            self.count += 1
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super(RecordingHandler, self).__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def status_request(guid):
+    request = platform_pb2.VirtualStatusRequest()
+    request.virtual_source.guid = guid
+    request.virtual_source.parameters.json = '{"name": "vdb"}'
+    request.repository.parameters.json = '{"name": "repository"}'
+    request.source_config.parameters.json = '{"name": "config"}'
+    return request.SerializeToString()
+
+
+def run_threads(target, count=THREAD_COUNT):
+    errors = []
+    start = threading.Event()
+
+    def run(index):
+        start.wait()
+        try:
+            target(index)
+        except Exception as err:
+            errors.append(err)
+
+    threads = [
+        threading.Thread(target=run, args=(i, )) for i in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    start.set()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+class TestConcurrency:
+    @staticmethod
+    @pytest.fixture
+    def interceptor():
+        return CountingInterceptor()
+
+    @staticmethod
+    @pytest.fixture
+    def my_plugin(interceptor):
+        mock_module = MagicMock()
+        mock_module.generated.definitions = fake_generated_definitions
+
+        modules = {
+            'generated': mock_module,
+            'generated.definitions': mock_module.generated.definitions
+        }
+        with patch.dict('sys.modules', modules):
+            from dlpx.virtualization.platform import Plugin
+            yield Plugin(interceptors=[interceptor])
+
+    @staticmethod
+    @pytest.fixture
+    def logger():
+        logger = logging.getLogger('test_concurrency')
+        handler = RecordingHandler()
+        handler.addFilter(OperationContextFilter())
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        yield logger
+        logger.removeHandler(handler)
+
+    @staticmethod
+    def test_no_operation_context():
+        assert get_operation_context() is None
+
+    @staticmethod
+    def test_concurrent_status(my_plugin, interceptor, logger):
+        from dlpx.virtualization.platform import Status
+
+        @my_plugin.virtual.status()
+        def virtual_status_impl(virtual_source, repository, source_config):
+            context = get_operation_context()
+            assert context.operation == Op.VIRTUAL_STATUS
+            assert context.guid == virtual_source.guid
+            # Give the other threads a chance to run inside the operation.
+            time.sleep(0.001)
+            assert get_operation_context().guid == virtual_source.guid
+            logger.info('status')
+            index = int(virtual_source.guid.split('-')[1])
+            return Status.ACTIVE if index % 2 else Status.INACTIVE
+
+        results = {}
+
+        def call_status(index):
+            response = platform_pb2.VirtualStatusResponse.FromString(
+                my_plugin.dispatch(Op.VIRTUAL_STATUS,
+                                   status_request('guid-{}'.format(index))))
+            results[index] = response.return_value.status
+            assert get_operation_context() is None
+
+        errors = run_threads(call_status)
+
+        assert errors == []
+        assert interceptor.count == THREAD_COUNT
+        for index, status in results.items():
+            assert status == (platform_pb2.VirtualStatusResult.ACTIVE
+                              if index % 2 else
+                              platform_pb2.VirtualStatusResult.INACTIVE)
+        assert len(results) == THREAD_COUNT
+
+        records = logger.handlers[0].records
+        assert len(records) == THREAD_COUNT
+        assert all(r.operation == Op.VIRTUAL_STATUS.value for r in records)
+        assert (sorted(r.guid for r in records) == sorted(
+            'guid-{}'.format(i) for i in range(THREAD_COUNT)))
+
+    @staticmethod
+    def test_nested_operation_context(my_plugin):
+        from dlpx.virtualization.platform import Status
+        seen = []
+
+        @my_plugin.virtual.status()
+        def virtual_status_impl(virtual_source, repository, source_config):
+            seen.append(get_operation_context().operation)
+            return Status.ACTIVE
+
+        @my_plugin.virtual.start()
+        def start_impl(virtual_source, repository, source_config):
+            my_plugin.dispatch(Op.VIRTUAL_STATUS, status_request('inner'))
+            seen.append(get_operation_context().guid)
+
+        request = platform_pb2.StartRequest()
+        request.virtual_source.guid = 'outer'
+        request.virtual_source.parameters.json = '{"name": "vdb"}'
+        request.repository.parameters.json = '{"name": "repository"}'
+        request.source_config.parameters.json = '{"name": "config"}'
+        my_plugin.dispatch(Op.VIRTUAL_START, request.SerializeToString())
+
+        assert seen == [Op.VIRTUAL_STATUS, 'outer']
+        assert get_operation_context() is None
+
+    @staticmethod
+    def test_concurrent_warm_up(my_plugin):
+        calls = []
+
+        @my_plugin.runtime_init()
+        def runtime_init_impl():
+            calls.append(None)
+            time.sleep(0.01)
+
+        errors = run_threads(lambda index: my_plugin.warm_up(), count=50)
+
+        assert errors == []
+        assert len(calls) == 1
@@ -0,0 +1,197 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+import pytest
+from dlpx.virtualization.api import platform_pb2
+from dlpx.virtualization.common.exceptions import (IncorrectTypeError,
+                                                   PlatformError)
+from dlpx.virtualization.platform import _dispatch
+from dlpx.virtualization.platform.exceptions import UnknownOperationError
+from dlpx.virtualization.platform.operation import Operation as Op
+from google.protobuf.message import DecodeError
+from mock import MagicMock, patch
+
+import fake_generated_definitions
+from conftest import TEST_GUID
+from fake_generated_definitions import RepositoryDefinition
+
+
+class TestDispatch:
+    @staticmethod
+    @pytest.fixture
+    def my_plugin():
+        mock_module = MagicMock()
+        mock_module.generated.definitions = fake_generated_definitions
+
+        modules = {
+            'generated': mock_module,
+            'generated.definitions': mock_module.generated.definitions
+        }
+        with patch.dict('sys.modules', modules):
+            from dlpx.virtualization.platform import Plugin
+            yield Plugin()
+
+    @staticmethod
+    @pytest.fixture
+    def status_request():
+        request = platform_pb2.VirtualStatusRequest()
+        request.virtual_source.guid = TEST_GUID
+        request.virtual_source.parameters.json = '{"name": "vdb"}'
+        request.repository.parameters.json = '{"name": "repository"}'
+        request.source_config.parameters.json = '{"name": "config"}'
+        return request.SerializeToString()
+
+    @staticmethod
+    def operations_by_type(my_plugin):
+        return {
+            'discovery': my_plugin.discovery,
+            'linked': my_plugin.linked,
+            'virtual': my_plugin.virtual,
+            'upgrade': my_plugin.upgrade
+        }
+
+    @staticmethod
+    def test_dispatch_table_covers_all_wrappers(my_plugin):
+        table = _dispatch.build_dispatch_table(
+            TestDispatch.operations_by_type(my_plugin))
+
+        wrappers = set()
+        for operations in (my_plugin.discovery, my_plugin.linked,
+                           my_plugin.virtual, my_plugin.upgrade):
+            wrappers.update(
+                (type(operations), name) for name in dir(operations)
+                if name.startswith('_internal_'))
+        dispatched = set((type(entry.internal_method.__self__),
+                          entry.internal_method.__name__)
+                         for entry in table.values())
+        assert dispatched == wrappers
+        assert set(operation for operation, _ in table) == (
+            set(Op) - set([Op.RUNTIME_INIT]))
+
+    @staticmethod
+    def test_dispatch_table_missing_operation(my_plugin):
+        operations = tuple(entry for entry in _dispatch.DISPATCH_OPERATIONS
+                           if entry[0] != Op.VIRTUAL_STATUS)
+
+        with patch.object(_dispatch, 'DISPATCH_OPERATIONS', operations):
+            with pytest.raises(PlatformError) as err_info:
+                _dispatch.build_dispatch_table(
+                    TestDispatch.operations_by_type(my_plugin))
+
+        assert err_info.value.message == (
+            'The operations virtual.status() have no dispatch entry.')
+
+    @staticmethod
+    @pytest.mark.parametrize('operation,direct',
+                             [('virtual.status', False),
+                              (Op.RUNTIME_INIT, False),
+                              (Op.VIRTUAL_STATUS, True)])
+    def test_dispatch_table_bad_operation(my_plugin, operation, direct):
+        operations = _dispatch.DISPATCH_OPERATIONS + (
+            (operation, direct, platform_pb2.VirtualStatusRequest), )
+
+        with patch.object(_dispatch, 'DISPATCH_OPERATIONS', operations):
+            with pytest.raises(UnknownOperationError):
+                _dispatch.build_dispatch_table(
+                    TestDispatch.operations_by_type(my_plugin))
+
+    @staticmethod
+    def test_dispatch_virtual_status(my_plugin, status_request):
+        from dlpx.virtualization.platform import Status
+
+        @my_plugin.virtual.status()
+        def virtual_status_impl(virtual_source, repository, source_config):
+            assert virtual_source.guid == TEST_GUID
+            assert repository.name == 'repository'
+            return Status.INACTIVE
+
+        response_bytes = my_plugin.dispatch(Op.VIRTUAL_STATUS, status_request)
+
+        response = platform_pb2.VirtualStatusResponse.FromString(
+            response_bytes)
+        assert response.return_value.status == (
+            platform_pb2.VirtualStatusResult.INACTIVE)
+
+    @staticmethod
+    def test_dispatch_discovery_repository(my_plugin):
+        @my_plugin.discovery.repository()
+        def repository_discovery_impl(source_connection):
+            return [RepositoryDefinition('a'), RepositoryDefinition('b')]
+
+        response = platform_pb2.RepositoryDiscoveryResponse.FromString(
+            my_plugin.dispatch(
+                Op.DISCOVERY_REPOSITORY,
+                platform_pb2.RepositoryDiscoveryRequest().SerializeToString()))
+
+        assert [r.parameters.json for r in response.return_value.repositories
+                ] == ['{"name": "a"}', '{"name": "b"}']
+
+    @staticmethod
+    def test_dispatch_warms_up_once(my_plugin, status_request):
+        from dlpx.virtualization.platform import Status
+        calls = []
+
+        @my_plugin.runtime_init()
+        def runtime_init_impl():
+            calls.append(None)
+
+        @my_plugin.virtual.status()
+        def virtual_status_impl(virtual_source, repository, source_config):
+            return Status.ACTIVE
+
+        my_plugin.dispatch(Op.VIRTUAL_STATUS, status_request)
+        my_plugin.dispatch(Op.VIRTUAL_STATUS, status_request)
+
+        assert len(calls) == 1
+
+    @staticmethod
+    def test_dispatch_direct_pre_snapshot(my_plugin):
+        calls = []
+
+        @my_plugin.linked.pre_snapshot()
+        def pre_snapshot_impl(direct_source, repository, source_config,
+                              optional_snapshot_parameters):
+            calls.append(direct_source.guid)
+
+        request = platform_pb2.DirectPreSnapshotRequest()
+        request.direct_source.linked_source.guid = TEST_GUID
+        request.direct_source.linked_source.parameters.json = (
+            '{"name": "direct"}')
+        request.repository.parameters.json = '{"name": "repository"}'
+        request.source_config.parameters.json = '{"name": "config"}'
+        request.snapshot_parameters.parameters.json = 'null'
+
+        response = platform_pb2.DirectPreSnapshotResponse.FromString(
+            my_plugin.dispatch(Op.LINKED_PRE_SNAPSHOT,
+                               request.SerializeToString(),
+                               direct=True))
+
+        assert response.WhichOneof('result') == 'return_value'
+        assert calls == [TEST_GUID]
+
+    @staticmethod
+    @pytest.mark.parametrize('operation,direct,name', [
+        (Op.RUNTIME_INIT, False, "'runtime_init()'"),
+        (Op.VIRTUAL_STATUS, True,
+         "'virtual.status()' of a direct linked source"),
+    ])
+    def test_dispatch_unknown_operation(my_plugin, operation, direct, name):
+        with pytest.raises(UnknownOperationError) as err_info:
+            my_plugin.dispatch(operation, b'', direct=direct)
+
+        assert err_info.value.message == (
+            'The operation {} cannot be dispatched because it is not a'
+            ' dispatchable plugin operation.'.format(name))
+
+    @staticmethod
+    @pytest.mark.parametrize('operation',
+                             ['virtual.status', 'VIRTUAL_STATUS', None])
+    def test_dispatch_operation_not_an_operation(my_plugin, operation):
+        with pytest.raises(IncorrectTypeError):
+            my_plugin.dispatch(operation, b'')
+
+    @staticmethod
+    def test_dispatch_malformed_request(my_plugin):
+        with pytest.raises(DecodeError):
+            my_plugin.dispatch(Op.VIRTUAL_STATUS, b'\x0a\x05ab')
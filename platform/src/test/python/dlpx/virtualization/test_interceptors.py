@@ -0,0 +1,172 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+import pytest
+from dlpx.virtualization.api import common_pb2, platform_pb2
+from dlpx.virtualization.common.exceptions import IncorrectTypeError
+from dlpx.virtualization.platform import (InterceptorChain,
+                                          OperationInterceptor)
+from dlpx.virtualization.platform.exceptions import OperationNotDefinedError
+from dlpx.virtualization.platform.operation import Operation as Op
+from mock import MagicMock, patch
+
+import fake_generated_definitions
+from fake_generated_definitions import RepositoryDefinition
+
+
+class RecordingInterceptor(OperationInterceptor):
+    def __init__(self, name, events):
+        self.name = name
+        self.events = events
+        self.invocations = []
+
+    def before(self, invocation):
+        self.events.append((self.name, 'before'))
+
+    def after(self, invocation):
+        self.events.append((self.name, 'after'))
+        self.invocations.append(invocation)
+
+
+class TestInterceptors:
+    @staticmethod
+    @pytest.fixture
+    def events():
+        return []
+
+    @staticmethod
+    @pytest.fixture
+    def interceptors(events):
+        return [
+            RecordingInterceptor('outer', events),
+            RecordingInterceptor('inner', events)
+        ]
+
+    @staticmethod
+    @pytest.fixture
+    def my_plugin(interceptors):
+        mock_module = MagicMock()
+        mock_module.generated.definitions = fake_generated_definitions
+
+        modules = {
+            'generated': mock_module,
+            'generated.definitions': mock_module.generated.definitions
+        }
+        with patch.dict('sys.modules', modules):
+            from dlpx.virtualization.platform import Plugin
+            yield Plugin(interceptors=interceptors)
+
+    @staticmethod
+    @pytest.fixture
+    def repository_request():
+        request = platform_pb2.RepositoryDiscoveryRequest()
+        request.source_connection.CopyFrom(common_pb2.RemoteConnection())
+        return request
+
+    @staticmethod
+    def test_chain_runs_interceptors_in_order(interceptors, events):
+        chain = InterceptorChain(interceptors)
+
+        def internal_method(request):
+            events.append(('operation', request))
+            return 'response'
+
+        response = chain.invoke(Op.VIRTUAL_STATUS, internal_method,
+                                'request')
+
+        assert response == 'response'
+        assert events == [('outer', 'before'), ('inner', 'before'),
+                          ('operation', 'request'), ('inner', 'after'),
+                          ('outer', 'after')]
+
+    @staticmethod
+    def test_chain_records_invocation(interceptors, repository_request):
+        chain = InterceptorChain(interceptors)
+
+        chain.invoke(Op.DISCOVERY_REPOSITORY, lambda request: 'response',
+                     repository_request)
+
+        invocation = interceptors[0].invocations[0]
+        assert invocation is interceptors[1].invocations[0]
+        assert invocation.operation == Op.DISCOVERY_REPOSITORY
+        assert invocation.request is repository_request
+        assert invocation.request_size == repository_request.ByteSize()
+        assert invocation.response == 'response'
+        assert invocation.exception is None
+        assert invocation.latency >= 0
+
+    @staticmethod
+    def test_chain_records_exception(interceptors, events):
+        chain = InterceptorChain(interceptors)
+        error = RuntimeError('failed')
+
+        def internal_method(request):
+            raise error
+
+        with pytest.raises(RuntimeError):
+            chain.invoke(Op.VIRTUAL_STATUS, internal_method, 'request')
+
+        invocation = interceptors[0].invocations[0]
+        assert invocation.exception is error
+        assert invocation.response is None
+        assert invocation.latency >= 0
+        assert events[-1] == ('outer', 'after')
+
+    @staticmethod
+    def test_chain_interceptor_can_replace_response():
+        class Replacing(OperationInterceptor):
+            def intercept(self, invocation, proceed):
+                return '{}!'.format(proceed())
+
+        chain = InterceptorChain([Replacing()])
+
+        assert chain.invoke(Op.VIRTUAL_STATUS, lambda r: r, 'a') == 'a!'
+
+    @staticmethod
+    def test_empty_chain():
+        chain = InterceptorChain()
+
+        assert chain.interceptors == ()
+        assert chain.invoke(Op.VIRTUAL_STATUS, lambda r: r, 'a') == 'a'
+
+    @staticmethod
+    def test_chain_bad_interceptor():
+        with pytest.raises(IncorrectTypeError) as err_info:
+            InterceptorChain([object()])
+
+        message = err_info.value.message
+        assert "parameter 'interceptors'" in message
+        assert 'OperationInterceptor' in message
+
+    @staticmethod
+    def test_plugin_interceptors(my_plugin, interceptors):
+        assert my_plugin.interceptors == tuple(interceptors)
+
+    @staticmethod
+    def test_plugin_operation_intercepted(my_plugin, interceptors, events,
+                                          repository_request):
+        @my_plugin.discovery.repository()
+        def repository_discovery_impl(source_connection):
+            events.append(('operation', None))
+            return [RepositoryDefinition('repository')]
+
+        response = my_plugin.discovery._internal_repository(
+            repository_request)
+
+        assert len(response.return_value.repositories) == 1
+        assert events == [('outer', 'before'), ('inner', 'before'),
+                          ('operation', None), ('inner', 'after'),
+                          ('outer', 'after')]
+        invocation = interceptors[0].invocations[0]
+        assert invocation.operation == Op.DISCOVERY_REPOSITORY
+        assert invocation.response is response
+
+    @staticmethod
+    def test_plugin_operation_error_intercepted(my_plugin, interceptors,
+                                                repository_request):
+        with pytest.raises(OperationNotDefinedError):
+            my_plugin.discovery._internal_repository(repository_request)
+
+        invocation = interceptors[0].invocations[0]
+        assert isinstance(invocation.exception, OperationNotDefinedError)
@@ -0,0 +1,167 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+import pytest
+from dlpx.virtualization.api import platform_pb2
+from dlpx.virtualization.platform import InterceptorChain, job_context
+from dlpx.virtualization.platform.exceptions import JobContextSizeError
+from dlpx.virtualization.platform.operation import Operation as Op
+
+from conftest import TEST_GUID, TEST_OTHER_GUID, make_staged_source
+
+
+@pytest.fixture
+def clocked_module():
+    return job_context
+
+
+class TestJobContext:
+    @staticmethod
+    @pytest.fixture
+    def store(clock):
+        return job_context.JobContextStore(ttl=60, max_contexts=2)
+
+    @staticmethod
+    def test_context_shared_between_operations(store):
+        store.context(make_staged_source())['files'] = ['/a', '/b']
+
+        context = store.context(make_staged_source())
+        assert context.guid == TEST_GUID
+        assert context['files'] == ['/a', '/b']
+        assert context.get('missing') is None
+        assert store.context(TEST_OTHER_GUID).get('files') is None
+
+    @staticmethod
+    def test_context_by_guid(store):
+        assert store.context(TEST_GUID) is store.context(make_staged_source())
+
+    @staticmethod
+    @pytest.mark.parametrize('source', [None, '', 1])
+    def test_context_bad_source(store, source):
+        with pytest.raises(ValueError):
+            store.context(source)
+
+    @staticmethod
+    def test_context_expiry(store, clock):
+        store.context(TEST_GUID)['version'] = '1.0'
+
+        clock.now += 59
+        assert store.context(TEST_GUID)['version'] == '1.0'
+        clock.now += 59
+        assert store.context(TEST_GUID)['version'] == '1.0'
+        clock.now += 61
+
+        assert 'version' not in store.context(TEST_GUID)
+        assert store.stats()['expirations'] == 1
+
+    @staticmethod
+    def test_context_eviction(store):
+        first = store.context('guid-1')
+        store.context('guid-2')
+        store.context('guid-1')
+        store.context('guid-3')
+
+        assert len(store) == 2
+        assert store.context('guid-1') is first
+        assert store.stats()['evictions'] == 1
+
+    @staticmethod
+    def test_context_memory_bound(clock):
+        store = job_context.JobContextStore(max_bytes=4096)
+        context = store.context(TEST_GUID)
+        context['a'] = 'a' * 1500
+        context['b'] = 'b' * 1500
+        context['c'] = 'c' * 1500
+
+        assert context.keys() == ['b', 'c']
+        assert context.size <= 4096
+        assert store.stats()['bytes'] == context.size
+
+        with pytest.raises(JobContextSizeError):
+            context['d'] = 'd' * 5000
+
+    @staticmethod
+    def test_context_total_memory_bound(clock):
+        store = job_context.JobContextStore(max_bytes=4096,
+                                            max_total_bytes=8192)
+        first = store.context('guid-1')
+        first['a'] = 'a' * 3000
+        store.context('guid-2')['b'] = 'b' * 3000
+        clock.now += 1
+        store.context('guid-1')
+        clock.now += 1
+        store.context('guid-3')['c'] = 'c' * 3000
+
+        # guid-2 was the least recently used context.
+        assert store.stats()['bytes'] <= 8192
+        assert store.stats()['evictions'] == 1
+        assert store.stats()['contexts'] == 2
+        assert store.context('guid-1') is first
+        assert 'b' not in store.context('guid-2')
+
+    @staticmethod
+    def test_context_capped_by_total_bytes(clock):
+        store = job_context.JobContextStore(max_bytes=8192,
+                                            max_total_bytes=4096)
+
+        with pytest.raises(JobContextSizeError):
+            store.context(TEST_GUID)['a'] = 'a' * 5000
+
+    @staticmethod
+    def test_discarded_context_does_not_evict(clock):
+        store = job_context.JobContextStore(max_bytes=4096,
+                                            max_total_bytes=4096)
+        discarded = store.context('guid-1')
+        store.discard('guid-1')
+        store.context('guid-2')['b'] = 'b' * 3000
+        discarded['a'] = 'a' * 3000
+
+        assert 'b' in store.context('guid-2')
+        assert store.stats()['evictions'] == 0
+
+    @staticmethod
+    def test_context_replace_and_delete(store):
+        context = store.context(TEST_GUID)
+        context['a'] = 'x' * 100
+        size = context.size
+        context['a'] = 'x' * 100
+
+        assert context.size == size
+        del context['a']
+        assert context.size == 0
+        with pytest.raises(KeyError):
+            del context['a']
+
+    @staticmethod
+    def test_discard(store):
+        store.context(TEST_GUID)['a'] = 1
+
+        assert store.discard(make_staged_source())
+        assert not store.discard(TEST_GUID)
+        assert 'a' not in store.context(TEST_GUID)
+
+    @staticmethod
+    def test_store_bad_arguments():
+        with pytest.raises(ValueError):
+            job_context.JobContextStore(ttl=0)
+        with pytest.raises(ValueError):
+            job_context.JobContextStore(max_contexts=0)
+        with pytest.raises(ValueError):
+            job_context.JobContextStore(max_bytes=None)
+        with pytest.raises(ValueError):
+            job_context.JobContextStore(max_total_bytes=0)
+
+    @staticmethod
+    @pytest.mark.parametrize('operation,released',
+                             [(Op.LINKED_PRE_SNAPSHOT, False),
+                              (Op.LINKED_POST_SNAPSHOT, True)])
+    def test_releaser(operation, released):
+        job_context.get_job_context(TEST_GUID)['a'] = 1
+        request = platform_pb2.StagedPostSnapshotRequest()
+        request.staged_source.linked_source.guid = TEST_GUID
+        chain = InterceptorChain([job_context.JobContextReleaser()])
+
+        chain.invoke(operation, lambda r: None, request)
+
+        assert job_context.discard_job_context(TEST_GUID) != released
@@ -0,0 +1,83 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+import json
+import math
+
+import pytest
+import six
+from dlpx.virtualization.platform import _json_util
+from mock import patch
+
+TEST_OBJECT = {
+    'name': u'caf\xe9',
+    'files': ['/a', '/b'],
+    'size': 10,
+    'nested': {
+        'ratio': 0.1,
+        'flag': True,
+        'nothing': None
+    }
+}
+
+
+class TestJsonUtil:
+    @staticmethod
+    def test_dumps_matches_stdlib():
+        assert _json_util.dumps(TEST_OBJECT) == json.dumps(TEST_OBJECT)
+
+    @staticmethod
+    def test_dumps_compact():
+        compact = _json_util.dumps(TEST_OBJECT, compact=True)
+
+        assert ', ' not in compact
+        assert ': ' not in compact
+        assert len(compact) < len(_json_util.dumps(TEST_OBJECT))
+        assert json.loads(compact) == TEST_OBJECT
+
+    @staticmethod
+    def test_loads_round_trip():
+        assert _json_util.loads(json.dumps(TEST_OBJECT)) == TEST_OBJECT
+
+    @staticmethod
+    def test_loads_uses_fast_backend():
+        def fast_loads(json_string):
+            return {'fast': True}
+
+        with patch.object(_json_util, '_FAST_LOADS', fast_loads):
+            assert _json_util.loads('{}') == {'fast': True}
+
+    @staticmethod
+    @pytest.mark.parametrize('error', [ValueError, OverflowError])
+    def test_loads_falls_back_to_stdlib(error):
+        def fast_loads(json_string):
+            raise error('unsupported')
+
+        with patch.object(_json_util, '_FAST_LOADS', fast_loads):
+            assert math.isnan(_json_util.loads('{"value": NaN}')['value'])
+
+    @staticmethod
+    @pytest.mark.parametrize('document', [
+        '[0.1, 1e-7, 2.2250738585072014e-308, 1.7976931348623157e308]',
+        '[0.30000000000000004, 123456789.123456789, -0.0]',
+        '[9223372036854775807, -9223372036854775808]',
+        '[18446744073709551616, -99999999999999999999999]',
+        '{"value": Infinity, "other": -Infinity}',
+    ])
+    def test_loads_matches_stdlib(document):
+        assert repr(_json_util.loads(document)) == repr(json.loads(document))
+
+    @staticmethod
+    def test_loads_invalid_document_raises_stdlib_error():
+        with pytest.raises(ValueError):
+            _json_util.loads('{"name": ')
+
+    @staticmethod
+    def test_backend_name():
+        assert _json_util.backend_name() in ('orjson', 'json')
+
+    @staticmethod
+    @pytest.mark.skipif(not six.PY2, reason='orjson supports Python 3')
+    def test_backend_name_python2():
+        assert _json_util.backend_name() == 'json'
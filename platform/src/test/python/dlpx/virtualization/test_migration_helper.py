@@ -1,5 +1,5 @@
 #
-# Copyright (c) 2019 by Delphix. All rights reserved.
+# Copyright (c) 2019, 2020 by Delphix. All rights reserved.
 #
 
 import pytest
@@ -136,6 +136,18 @@ class TestPlatformUpgradeMigrations:
             '20190.10.6'
         ]
 
+    @staticmethod
+    def test_get_sorted_ids_after_add(platform_migrations):
+        def function():
+            pass
+
+        platform_migrations.add_repository('2.0', function)
+        sorted_ids = platform_migrations.get_sorted_ids()
+        sorted_ids.append('3')
+        platform_migrations.add_snapshot('1.5', function)
+
+        assert platform_migrations.get_sorted_ids() == ['1.5', '2']
+
 
 class TestLuaUpgradeMigrations:
     @staticmethod
@@ -324,3 +336,93 @@ class TestLuaUpgradeMigrations:
         ordered_impl_list = getattr(lua_migrations, get_impls_to_exec)('2.9')
 
         assert ordered_impl_list == [f_three, f_four]
+
+    @staticmethod
+    @pytest.mark.parametrize('object_op', conftest.OBJECT_TYPES)
+    def test_get_correct_impls_two_digit_minor(lua_migrations, method_name,
+                                               get_impls_to_exec):
+        def f_nine():
+            pass
+
+        def f_ten():
+            pass
+
+        def f_eleven():
+            pass
+
+        getattr(lua_migrations, method_name)('1.10', f_ten)
+        getattr(lua_migrations, method_name)('1.9', f_nine)
+        getattr(lua_migrations, method_name)('1.11', f_eleven)
+
+        get_impls = getattr(lua_migrations, get_impls_to_exec)
+        assert get_impls('1.9') == [f_nine, f_ten, f_eleven]
+        assert get_impls('1.10') == [f_ten, f_eleven]
+        assert get_impls('1.2') == [f_nine, f_ten, f_eleven]
+
+    @staticmethod
+    @pytest.mark.parametrize('object_op', conftest.OBJECT_TYPES)
+    @pytest.mark.parametrize('first,second', [('1.1', '01.01'),
+                                              ('1.1', '1.01'),
+                                              ('1.01', '1.1')])
+    def test_same_version_other_form(lua_migrations, object_op, first,
+                                     second):
+        def f_first():
+            pass
+
+        def f_second():
+            pass
+
+        getattr(lua_migrations, 'add_{}'.format(object_op))(first, f_first)
+
+        #
+        # Versions are compared once decomposed into integers, whatever the
+        # order they are added in, so the first migration is kept.
+        #
+        with pytest.raises(MigrationIdAlreadyUsedError):
+            getattr(lua_migrations, 'add_{}'.format(object_op))(second,
+                                                                f_second)
+        get_impls = getattr(lua_migrations,
+                            'get_{}_impls_to_exec'.format(object_op))
+        assert get_impls('1.1') == [f_first]
+
+
+class TestMigrationIndex:
+    @staticmethod
+    @pytest.fixture
+    def index():
+        index = m.MigrationIndex()
+        for version in ['1.10', '1.9', '2.0', '1.2']:
+            assert index.add(m.parse_version(version), version)
+        return index
+
+    @staticmethod
+    def test_sorted(index):
+        assert index.versions() == [(1, 2), (1, 9), (1, 10), (2, 0)]
+        assert len(index) == 4
+
+    @staticmethod
+    def test_add_duplicate(index):
+        assert not index.add((1, 9), 'other')
+        assert index.get((1, 9)) == '1.9'
+        assert len(index) == 4
+
+    @staticmethod
+    def test_contains_and_get(index):
+        assert (1, 10) in index
+        assert (1, 1) not in index
+        assert (3, 0) not in index
+        assert index.get((1, 1)) is None
+        assert index.get((1, 1), 'default') == 'default'
+
+    @staticmethod
+    @pytest.mark.parametrize('version,expected',
+                             [((0, 0), ['1.2', '1.9', '1.10', '2.0']),
+                              ((1, 9), ['1.9', '1.10', '2.0']),
+                              ((1, 11), ['2.0']), ((2, 1), [])])
+    def test_migrations_from(index, version, expected):
+        assert index.migrations_from(version) == expected
+
+    @staticmethod
+    def test_parse_and_format_version():
+        assert m.parse_version('2019.10.04') == (2019, 10, 4)
+        assert m.format_version((2019, 10, 4)) == '2019.10.4'
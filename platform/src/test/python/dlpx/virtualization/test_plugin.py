@@ -3,14 +3,18 @@
 #
 
 import json
+import logging
 
 import pytest
 from dlpx.virtualization.api import common_pb2, platform_pb2
 from dlpx.virtualization.common import (RemoteConnection, RemoteEnvironment,
                                         RemoteHost, RemoteUser)
+from dlpx.virtualization.common.exceptions import IncorrectTypeError
+from dlpx.virtualization.platform import _json_util
 from dlpx.virtualization.platform.exceptions import (
     IncorrectReturnTypeError, IncorrectUpgradeObjectTypeError,
-    OperationAlreadyDefinedError, PluginRuntimeError)
+    ObjectMigrationError, OperationAlreadyDefinedError, PluginRuntimeError,
+    SnapshotMetadataSizeError)
 from mock import MagicMock, patch
 
 import fake_generated_definitions
@@ -43,6 +47,8 @@ SIMPLE_JSON = '{{"name": "{0}"}}'
 
 TEST_REPOSITORY_JSON = SIMPLE_JSON.format(TEST_REPOSITORY)
 TEST_SNAPSHOT_JSON = SIMPLE_JSON.format(TEST_SNAPSHOT)
+# Snapshots returned by plugins are encoded without whitespace.
+TEST_SNAPSHOT_COMPACT_JSON = '{{"name":"{0}"}}'.format(TEST_SNAPSHOT)
 TEST_SOURCE_CONFIG_JSON = SIMPLE_JSON.format(TEST_SOURCE_CONFIG)
 TEST_DIRECT_SOURCE_JSON = SIMPLE_JSON.format(TEST_DIRECT_SOURCE)
 TEST_STAGED_SOURCE_JSON = SIMPLE_JSON.format(TEST_STAGED_SOURCE)
@@ -652,7 +658,7 @@ class TestPlugin:
         virtual_post_snapshot_response = (
             my_plugin.virtual._internal_post_snapshot(
                 virtual_post_snapshot_request))
-        expected_snapshot = TEST_SNAPSHOT_JSON
+        expected_snapshot = TEST_SNAPSHOT_COMPACT_JSON
 
         assert (virtual_post_snapshot_response.return_value.snapshot.
                 parameters.json == expected_snapshot)
@@ -727,6 +733,63 @@ class TestPlugin:
             " type 'NoneType' but should be of class 'dlpx.virtualization."
             "fake_generated_definitions.SourceConfigDefinition'.")
 
+    @staticmethod
+    def test_virtual_mount_spec_many_mounts(my_plugin, virtual_source,
+                                            repository):
+        from dlpx.virtualization.platform import MountSpecification
+
+        @my_plugin.virtual.mount_specification()
+        def virtual_mount_spec_impl(virtual_source, repository):
+            assert len(virtual_source.mounts) == 1
+            return MountSpecification.from_tuples(
+                [(TEST_ENVIRONMENT_REFERENCE if i % 2 else
+                  'UNIX_HOST_ENVIRONMENT-2', '/mnt/{}'.format(i),
+                  'shard{}'.format(i)) for i in range(300)])
+
+        virtual_mount_spec_request = platform_pb2.VirtualMountSpecRequest()
+        TestPlugin.setup_request(request=virtual_mount_spec_request,
+                                 virtual_source=virtual_source,
+                                 repository=repository)
+
+        virtual_mount_spec_response = (
+            my_plugin.virtual._internal_mount_specification(
+                virtual_mount_spec_request))
+
+        mounts = virtual_mount_spec_response.return_value.mounts
+        assert len(mounts) == 300
+        assert [m.remote_environment.reference for m in mounts[:2]
+                ] == ['UNIX_HOST_ENVIRONMENT-2', TEST_ENVIRONMENT_REFERENCE]
+        assert mounts[299].mount_path == '/mnt/299'
+        assert mounts[299].shared_path == 'shard299'
+        assert mounts[0].remote_environment.host.reference == (
+            'dummy reference')
+        assert not virtual_mount_spec_response.return_value.HasField(
+            'ownership_spec')
+
+    @staticmethod
+    def test_virtual_subset_mounts_shared_environments(mount):
+        from dlpx.virtualization.platform._virtual import VirtualOperations
+
+        subset_mounts = []
+        for i in range(4):
+            subset_mount = common_pb2.SingleSubsetMount()
+            subset_mount.CopyFrom(mount)
+            subset_mount.mount_path = '/mnt/{}'.format(i)
+            if i == 3:
+                subset_mount.remote_environment.host.name = 'other host'
+            subset_mounts.append(subset_mount)
+
+        mounts = VirtualOperations._from_protobuf_subset_mounts(subset_mounts)
+
+        assert [m.mount_path for m in mounts] == [
+            '/mnt/0', '/mnt/1', '/mnt/2', '/mnt/3'
+        ]
+        assert mounts[0].remote_environment is mounts[2].remote_environment
+        assert mounts[3].remote_environment is not (
+            mounts[0].remote_environment)
+        assert mounts[3].remote_environment.host.name == 'other host'
+        assert mounts[0].remote_environment.host.name != 'other host'
+
     @staticmethod
     def test_virtual_mount_spec(my_plugin, virtual_source, repository):
 
@@ -804,11 +867,37 @@ class TestPlugin:
         message = err_info.value.message
         assert message == (
             "The returned object for the discovery.repository() operation was"
-            " a list of [type 'str', class 'dlpx.virtualization"
-            ".fake_generated_definitions.RepositoryDefinition'] but should"
+            " a list of 2 items where item 0 was type 'str' but should"
             " be of type 'list of dlpx.virtualization"
             ".fake_generated_definitions.RepositoryDefinition'.")
 
+    @staticmethod
+    def test_repository_discovery_bad_return_type_large_list(
+            my_plugin, connection):
+        @my_plugin.discovery.repository()
+        def repository_discovery_impl(source_connection):
+            repositories = [RepositoryDefinition(TEST_REPOSITORY)] * 10000
+            for index in range(3, 10000, 1000):
+                repositories[index] = index
+            return repositories
+
+        repository_discovery_request = (
+            platform_pb2.RepositoryDiscoveryRequest())
+        repository_discovery_request.source_connection.CopyFrom(connection)
+
+        with pytest.raises(IncorrectReturnTypeError) as err_info:
+            my_plugin.discovery._internal_repository(
+                repository_discovery_request)
+
+        message = err_info.value.message
+        assert message == (
+            "The returned object for the discovery.repository() operation was"
+            " a list of 10000 items where item 3 was type 'int', item 1003"
+            " was type 'int', item 2003 was type 'int', item 3003 was type"
+            " 'int', item 4003 was type 'int', ... but should be of type"
+            " 'list of dlpx.virtualization"
+            ".fake_generated_definitions.RepositoryDefinition'.")
+
     @staticmethod
     def test_source_config_discovery(my_plugin, connection, repository):
         @my_plugin.discovery.source_config()
@@ -833,6 +922,193 @@ class TestPlugin:
         for source_config in configs:
             assert source_config.parameters.json == TEST_REPOSITORY_JSON
 
+    @staticmethod
+    def test_repository_discovery_generator(my_plugin, connection):
+        yielded = []
+
+        @my_plugin.discovery.repository()
+        def repository_discovery_impl(source_connection):
+            TestPlugin.assert_connection(source_connection)
+            for _ in range(3):
+                yielded.append(None)
+                yield RepositoryDefinition(TEST_REPOSITORY)
+
+        repository_discovery_request = (
+            platform_pb2.RepositoryDiscoveryRequest())
+        repository_discovery_request.source_connection.CopyFrom(connection)
+
+        repository_discovery_response = (
+            my_plugin.discovery._internal_repository(
+                repository_discovery_request))
+
+        repositories = repository_discovery_response.return_value.repositories
+        assert len(yielded) == 3
+        assert [r.parameters.json for r in repositories
+                ] == [TEST_REPOSITORY_JSON] * 3
+
+    @staticmethod
+    def test_repository_discovery_generator_bad_item(my_plugin, connection):
+        consumed = []
+
+        @my_plugin.discovery.repository()
+        def repository_discovery_impl(source_connection):
+            yield RepositoryDefinition(TEST_REPOSITORY)
+            yield 'string'
+            consumed.append(None)
+            yield RepositoryDefinition(TEST_REPOSITORY)
+
+        repository_discovery_request = (
+            platform_pb2.RepositoryDiscoveryRequest())
+        repository_discovery_request.source_connection.CopyFrom(connection)
+
+        with pytest.raises(IncorrectReturnTypeError) as err_info:
+            my_plugin.discovery._internal_repository(
+                repository_discovery_request)
+
+        assert consumed == []
+        message = err_info.value.message
+        assert message == (
+            "The returned object for the discovery.repository() operation was"
+            " a generator where item 1 was type 'str' but should be of type"
+            " 'list of dlpx.virtualization"
+            ".fake_generated_definitions.RepositoryDefinition'.")
+
+    @staticmethod
+    def test_repository_discovery_not_list_or_generator(
+            my_plugin, connection):
+        @my_plugin.discovery.repository()
+        def repository_discovery_impl(source_connection):
+            return (RepositoryDefinition(TEST_REPOSITORY), )
+
+        repository_discovery_request = (
+            platform_pb2.RepositoryDiscoveryRequest())
+        repository_discovery_request.source_connection.CopyFrom(connection)
+
+        with pytest.raises(IncorrectReturnTypeError) as err_info:
+            my_plugin.discovery._internal_repository(
+                repository_discovery_request)
+
+        message = err_info.value.message
+        assert message == (
+            "The returned object for the discovery.repository() operation was"
+            " type 'tuple' but should be of type 'list of dlpx.virtualization"
+            ".fake_generated_definitions.RepositoryDefinition'.")
+
+    @staticmethod
+    def test_source_config_discovery_generator(my_plugin, connection,
+                                               repository):
+        @my_plugin.discovery.source_config()
+        def source_config_discovery_impl(source_connection, repository):
+            TestPlugin.assert_repository(repository)
+            for _ in range(2):
+                yield SourceConfigDefinition(TEST_REPOSITORY)
+
+        source_config_discovery_request = (
+            platform_pb2.SourceConfigDiscoveryRequest())
+        source_config_discovery_request.source_connection.CopyFrom(connection)
+        source_config_discovery_request.repository.CopyFrom(repository)
+
+        source_config_discovery_response = (
+            my_plugin.discovery._internal_source_config(
+                source_config_discovery_request))
+
+        configs = source_config_discovery_response.return_value.source_configs
+        assert [c.parameters.json for c in configs
+                ] == [TEST_REPOSITORY_JSON] * 2
+
+    @staticmethod
+    def test_repository_discovery_deduplicate(my_plugin, connection,
+                                              monkeypatch, caplog):
+        class InstalledRepository(RepositoryDefinition):
+            def __init__(self, name, path):
+                super(InstalledRepository, self).__init__(name)
+                self.path = path
+
+            def to_dict(self):
+                return {'name': self.name, 'path': self.path}
+
+        monkeypatch.setattr(RepositoryDefinition,
+                            'identity_fields', ['name'],
+                            raising=False)
+
+        @my_plugin.discovery.repository(deduplicate=True)
+        def repository_discovery_impl(source_connection):
+            return [
+                InstalledRepository('a', '/opt/a'),
+                InstalledRepository('b', '/opt/b'),
+                InstalledRepository('a', '/usr/local/a'),
+                InstalledRepository('a', '/opt/a')
+            ]
+
+        repository_discovery_request = (
+            platform_pb2.RepositoryDiscoveryRequest())
+        repository_discovery_request.source_connection.CopyFrom(connection)
+
+        caplog.set_level(logging.INFO)
+        repository_discovery_response = (
+            my_plugin.discovery._internal_repository(
+                repository_discovery_request))
+
+        repositories = repository_discovery_response.return_value.repositories
+        assert [json.loads(r.parameters.json) for r in repositories] == [{
+            'name': 'a',
+            'path': '/opt/a'
+        }, {
+            'name': 'b',
+            'path': '/opt/b'
+        }]
+        assert ('Dropped 2 duplicate definitions returned by the'
+                ' discovery.repository() operation.') in caplog.text
+
+    @staticmethod
+    def test_repository_discovery_no_deduplicate(my_plugin, connection):
+        @my_plugin.discovery.repository()
+        def repository_discovery_impl(source_connection):
+            return [RepositoryDefinition(TEST_REPOSITORY)] * 2
+
+        repository_discovery_request = (
+            platform_pb2.RepositoryDiscoveryRequest())
+        repository_discovery_request.source_connection.CopyFrom(connection)
+
+        repository_discovery_response = (
+            my_plugin.discovery._internal_repository(
+                repository_discovery_request))
+
+        assert len(
+            repository_discovery_response.return_value.repositories) == 2
+
+    @staticmethod
+    @pytest.mark.parametrize('operation', ['repository', 'source_config'])
+    def test_discovery_bad_deduplicate(my_plugin, operation):
+        with pytest.raises(IncorrectTypeError) as err_info:
+            getattr(my_plugin.discovery, operation)(deduplicate='yes')
+
+        assert err_info.value.message == (
+            "DiscoveryOperations's parameter 'deduplicate' was type 'str' but"
+            " should be of type 'bool' if defined.")
+
+    @staticmethod
+    def test_source_config_discovery_deduplicate_without_identity_fields(
+            my_plugin, connection, repository):
+        @my_plugin.discovery.source_config(deduplicate=True)
+        def source_config_discovery_impl(source_connection, repository):
+            yield SourceConfigDefinition('a')
+            yield SourceConfigDefinition('b')
+            yield SourceConfigDefinition('a')
+
+        source_config_discovery_request = (
+            platform_pb2.SourceConfigDiscoveryRequest())
+        source_config_discovery_request.source_connection.CopyFrom(connection)
+        source_config_discovery_request.repository.CopyFrom(repository)
+
+        source_config_discovery_response = (
+            my_plugin.discovery._internal_source_config(
+                source_config_discovery_request))
+
+        configs = source_config_discovery_response.return_value.source_configs
+        assert [c.parameters.json for c in configs
+                ] == ['{"name": "a"}', '{"name": "b"}']
+
     @staticmethod
     def test_direct_pre_snapshot(my_plugin, direct_source, repository,
                                  source_config, snapshot_parameters):
@@ -919,7 +1195,7 @@ class TestPlugin:
         direct_post_snapshot_response = (
             my_plugin.linked._internal_direct_post_snapshot(
                 direct_post_snapshot_request))
-        expected_snapshot = TEST_SNAPSHOT_JSON
+        expected_snapshot = TEST_SNAPSHOT_COMPACT_JSON
         snapshot = direct_post_snapshot_response.return_value.snapshot
         assert snapshot.parameters.json == expected_snapshot
 
@@ -949,7 +1225,7 @@ class TestPlugin:
         direct_post_snapshot_response = (
             my_plugin.linked._internal_direct_post_snapshot(
                 direct_post_snapshot_request))
-        expected_snapshot = TEST_SNAPSHOT_JSON
+        expected_snapshot = TEST_SNAPSHOT_COMPACT_JSON
         snapshot = direct_post_snapshot_response.return_value.snapshot
         assert snapshot.parameters.json == expected_snapshot
 
@@ -1036,7 +1312,7 @@ class TestPlugin:
 
         response = my_plugin.linked._internal_staged_post_snapshot(
             staged_post_snapshot_request)
-        expected = TEST_SNAPSHOT_JSON
+        expected = TEST_SNAPSHOT_COMPACT_JSON
 
         assert response.return_value.snapshot.parameters.json == expected
 
@@ -1065,10 +1341,60 @@ class TestPlugin:
 
         response = my_plugin.linked._internal_staged_post_snapshot(
             staged_post_snapshot_request)
-        expected = TEST_SNAPSHOT_JSON
+        expected = TEST_SNAPSHOT_COMPACT_JSON
 
         assert response.return_value.snapshot.parameters.json == expected
 
+    @staticmethod
+    def test_staged_post_snapshot_size_limits(my_plugin, staged_source,
+                                              repository, source_config,
+                                              snapshot_parameters):
+        from dlpx.virtualization.platform import snapshot_metadata
+
+        size_limits = snapshot_metadata.SnapshotSizeLimits(max_bytes=100)
+        names = [TEST_SNAPSHOT, 'x' * 100]
+
+        @my_plugin.linked.post_snapshot(size_limits=size_limits)
+        def staged_post_snapshot_impl(staged_source, repository, source_config,
+                                      optional_snapshot_parameters):
+            return SnapshotDefinition(names.pop(0))
+
+        staged_post_snapshot_request = platform_pb2.StagedPostSnapshotRequest()
+        TestPlugin.setup_request(
+            request=staged_post_snapshot_request,
+            staged_source=staged_source,
+            repository=repository,
+            source_config=source_config,
+            snapshot_parameters=snapshot_parameters)
+
+        my_plugin.linked._internal_staged_post_snapshot(
+            staged_post_snapshot_request)
+        with pytest.raises(SnapshotMetadataSizeError) as err_info:
+            my_plugin.linked._internal_staged_post_snapshot(
+                staged_post_snapshot_request)
+
+        assert err_info.value.message.startswith(
+            'The snapshot returned by the linked.post_snapshot() operation'
+            ' encodes to 111 bytes which is more than the 100 bytes allowed.')
+        assert size_limits.stats() == {
+            'snapshots': 2,
+            'total_bytes': len(TEST_SNAPSHOT_COMPACT_JSON) + 111,
+            'largest_bytes': 111,
+            'last_bytes': 111,
+            'warnings': 0,
+            'rejections': 1
+        }
+
+    @staticmethod
+    def test_post_snapshot_bad_size_limits(my_plugin):
+        with pytest.raises(IncorrectTypeError) as err_info:
+            my_plugin.virtual.post_snapshot(size_limits=100)
+
+        assert err_info.value.message == (
+            "VirtualOperations's parameter 'size_limits' was type 'int' but"
+            " should be of class 'dlpx.virtualization.platform."
+            "snapshot_metadata.SnapshotSizeLimits' if defined.")
+
     @staticmethod
     def test_start_staging(my_plugin, staged_source, repository,
                            source_config):
@@ -1165,6 +1491,54 @@ class TestPlugin:
         assert staged_worker_response.WhichOneof('result') == 'return_value'
         assert staged_worker_response.return_value == expected_result
 
+    @staticmethod
+    def test_staged_worker_scheduler(my_plugin, staged_source, repository,
+                                     source_config):
+        from dlpx.virtualization.platform import worker
+
+        scheduler = worker.WorkerScheduler()
+        runs = []
+
+        @my_plugin.linked.worker(scheduler=scheduler)
+        def staged_worker_impl(staged_source, repository, source_config):
+            runs.append(staged_source.guid)
+            return worker.skip(2)
+
+        staged_worker_request = platform_pb2.StagedWorkerRequest()
+        TestPlugin.setup_request(request=staged_worker_request,
+                                 staged_source=staged_source,
+                                 repository=repository,
+                                 source_config=source_config)
+
+        expected_result = platform_pb2.StagedWorkerResult()
+        decodes = []
+        loads_path = 'dlpx.virtualization.platform._json_util.loads'
+        with patch(loads_path, wraps=_json_util.loads) as loads:
+            for _ in range(4):
+                staged_worker_response = my_plugin.linked._internal_worker(
+                    staged_worker_request)
+                assert staged_worker_response.return_value == expected_result
+                decodes.append(loads.call_count)
+
+        assert runs == [TEST_GUID, TEST_GUID]
+        # The skipped ticks do not decode the request.
+        assert decodes[0] > 0
+        assert decodes[1] == decodes[2] == decodes[0]
+        assert decodes[3] == 2 * decodes[0]
+        stats = scheduler.stats(TEST_GUID)
+        assert stats.runs == 2
+        assert stats.skipped == 2
+
+    @staticmethod
+    def test_staged_worker_bad_scheduler(my_plugin):
+        with pytest.raises(IncorrectTypeError) as err_info:
+            my_plugin.linked.worker(scheduler=5)
+
+        assert err_info.value.message == (
+            "LinkedOperations's parameter 'scheduler' was type 'int' but"
+            " should be of class 'dlpx.virtualization.platform.worker."
+            "WorkerScheduler' if defined.")
+
     @staticmethod
     def test_staged_mount_spec(my_plugin, staged_source, repository):
 
@@ -1424,5 +1798,9 @@ class TestPlugin:
         upgrade_request.type = upgrade_request.SNAPSHOT
         upgrade_request.migration_ids.extend(MIGRATION_IDS)
 
-        with pytest.raises(RuntimeError):
+        with pytest.raises(ObjectMigrationError) as err_info:
             my_plugin.upgrade._internal_snapshot(upgrade_request)
+
+        assert err_info.value.error_type == 'RuntimeError'
+        assert err_info.value.error_message == (
+            'RuntimeError in snapshot migration')
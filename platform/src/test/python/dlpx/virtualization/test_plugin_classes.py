@@ -128,9 +128,9 @@ class TestPluginClasses:
         with pytest.raises(IncorrectTypeError) as err_info:
             MountSpecification(['string'], OwnershipSpecification(10, 10))
         assert err_info.value.message == (
-            "MountSpecification's parameter 'mounts' was a list of"
-            " [type 'str'] but should be of type 'list of dlpx.virtualization"
-            ".platform._plugin_classes.Mount'.")
+            "MountSpecification's parameter 'mounts' was a list of 1 item"
+            " where item 0 was type 'str' but should be of type 'list of"
+            " dlpx.virtualization.platform._plugin_classes.Mount'.")
 
     @staticmethod
     def test_init_mount_spec_bad_owner_spec(remote_environment):
@@ -143,3 +143,46 @@ class TestPluginClasses:
             " type 'str' but should be of class 'dlpx.virtualization"
             ".platform._plugin_classes.OwnershipSpecification'"
             " if defined.")
+
+    @staticmethod
+    def test_init_mount_reference_string_shares_environment():
+        first = Mount('UNIX_HOST_ENVIRONMENT-3', 'mount_path')
+        second = Mount('UNIX_HOST_ENVIRONMENT-3', 'other_path')
+        other = Mount('UNIX_HOST_ENVIRONMENT-4', 'mount_path')
+
+        assert first.remote_environment is second.remote_environment
+        assert other.remote_environment.reference == 'UNIX_HOST_ENVIRONMENT-4'
+        assert (first.remote_environment.host is
+                other.remote_environment.host)
+
+    @staticmethod
+    def test_mount_spec_from_tuples(remote_environment):
+        mount_spec = MountSpecification.from_tuples(
+            [('UNIX_HOST_ENVIRONMENT-{}'.format(i % 2), '/mnt/{}'.format(i),
+              'shard{}'.format(i)) for i in range(500)] +
+            [(remote_environment, '/mnt/data')],
+            OwnershipSpecification(10, 10))
+
+        mounts = mount_spec.mounts
+        assert len(mounts) == 501
+        assert mounts[7].remote_environment.reference == (
+            'UNIX_HOST_ENVIRONMENT-1')
+        assert mounts[7].mount_path == '/mnt/7'
+        assert mounts[7].shared_path == 'shard7'
+        assert mounts[500].remote_environment is remote_environment
+        assert mounts[500].shared_path is None
+        assert mount_spec.ownership_specification.uid == 10
+
+    @staticmethod
+    def test_mount_spec_from_tuples_bad_mount():
+        with pytest.raises(IncorrectReferenceFormatError):
+            MountSpecification.from_tuples([
+                ('UNIX_HOST_ENVIRONMENT-1', '/mnt/a'),
+                ('HOST-1', '/mnt/b'),
+            ])
+
+    @staticmethod
+    def test_mount_spec_from_tuples_bad_owner_spec():
+        with pytest.raises(IncorrectTypeError):
+            MountSpecification.from_tuples(
+                [('UNIX_HOST_ENVIRONMENT-1', '/mnt/a')], 'string')
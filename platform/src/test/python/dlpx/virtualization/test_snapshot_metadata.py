@@ -0,0 +1,81 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+import logging
+
+import pytest
+from dlpx.virtualization.platform import snapshot_metadata
+from dlpx.virtualization.platform.exceptions import SnapshotMetadataSizeError
+from dlpx.virtualization.platform.operation import Operation as Op
+
+
+class Snapshot(object):
+    def __init__(self, **values):
+        self.values = values
+
+    def to_dict(self):
+        return self.values
+
+
+class TestSnapshotMetadata:
+    @staticmethod
+    def test_encode_compact():
+        limits = snapshot_metadata.SnapshotSizeLimits()
+        encoded = limits.encode(Op.VIRTUAL_POST_SNAPSHOT,
+                                Snapshot(files=['a', 'b'], size=2))
+
+        assert ': ' not in encoded and ', ' not in encoded
+        assert limits.stats()['last_bytes'] == len(encoded)
+
+    @staticmethod
+    def test_encode_warning(caplog):
+        limits = snapshot_metadata.SnapshotSizeLimits(warning_bytes=20)
+
+        with caplog.at_level(logging.WARNING):
+            limits.encode(Op.LINKED_POST_SNAPSHOT, Snapshot(name='a'))
+            assert not caplog.records
+            limits.encode(Op.LINKED_POST_SNAPSHOT, Snapshot(name='a' * 20))
+
+        assert len(caplog.records) == 1
+        assert 'encodes to 31 bytes' in caplog.records[0].getMessage()
+        assert limits.stats()['warnings'] == 1
+
+    @staticmethod
+    def test_encode_max_bytes():
+        limits = snapshot_metadata.SnapshotSizeLimits(warning_bytes=None,
+                                                      max_bytes=20)
+
+        with pytest.raises(SnapshotMetadataSizeError):
+            limits.encode(Op.LINKED_POST_SNAPSHOT, Snapshot(name='a' * 20))
+
+        assert limits.stats() == {
+            'snapshots': 1,
+            'total_bytes': 31,
+            'largest_bytes': 31,
+            'last_bytes': 31,
+            'warnings': 0,
+            'rejections': 1
+        }
+
+    @staticmethod
+    def test_size_is_in_bytes():
+        limits = snapshot_metadata.SnapshotSizeLimits()
+        encoded = limits.encode(Op.LINKED_POST_SNAPSHOT,
+                                Snapshot(name=u'\u00e9t\u00e9'))
+
+        assert limits.stats()['last_bytes'] == len(encoded.encode('utf-8'))
+
+    @staticmethod
+    @pytest.mark.parametrize('kwargs', [{
+        'warning_bytes': 0
+    }, {
+        'max_bytes': -1
+    }, {
+        'max_bytes': 1.5
+    }, {
+        'warning_bytes': True
+    }])
+    def test_bad_limits(kwargs):
+        with pytest.raises(ValueError):
+            snapshot_metadata.SnapshotSizeLimits(**kwargs)
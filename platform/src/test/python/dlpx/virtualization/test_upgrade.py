@@ -1,17 +1,28 @@
 #
-# Copyright (c) 2019 by Delphix. All rights reserved.
+# Copyright (c) 2019, 2020 by Delphix. All rights reserved.
 #
 
 import copy
 import json
 import logging
+import multiprocessing
+import os
 
 import pytest
 from dlpx.virtualization.api import platform_pb2
-from dlpx.virtualization.platform import MigrationType
+from dlpx.virtualization.common.exceptions import IncorrectTypeError
+from dlpx.virtualization.platform import (MigrationType, _json_util,
+                                          _upgrade, upgrade_checkpoint)
 from dlpx.virtualization.platform.exceptions import (
-    DecoratorNotFunctionError, MigrationIdAlreadyUsedError)
+    DecoratorNotFunctionError, MigrationIdAlreadyUsedError,
+    ObjectMigrationError, UpgradeValidationError, UserError)
 from dlpx.virtualization.platform.operation import Operation as Op
+from mock import MagicMock, patch
+
+import fake_generated_definitions
+
+requires_fork = pytest.mark.skipif(not hasattr(os, 'fork'),
+                                   reason='Parallel upgrades fork processes.')
 
 
 class TestUpgrade:
@@ -338,3 +349,792 @@ class TestUpgrade:
         assert (upgrade_response.return_value.post_upgrade_parameters ==
                 fake_map_param)
         assert (caplog.records[0].message == expected_logs)
+
+    @staticmethod
+    def repository_request(lua_version='1.1', migration_ids=('2020.1', )):
+        return platform_pb2.UpgradeRequest(
+            pre_upgrade_parameters={
+                'APPDATA_REPOSITORY-1': '{"migrations": []}',
+                'APPDATA_REPOSITORY-2': '{"migrations": ["old"]}'
+            },
+            type=platform_pb2.UpgradeRequest.REPOSITORY,
+            lua_upgrade_version=lua_version,
+            migration_ids=migration_ids)
+
+    @staticmethod
+    def add_repository_migrations(my_upgrade):
+        @my_upgrade.repository('1.1', MigrationType.LUA)
+        def lua_upgrade(input_dict):
+            return dict(input_dict,
+                        migrations=input_dict['migrations'] + ['lua 1.1'])
+
+        @my_upgrade.repository('2020.1')
+        def platform_upgrade(input_dict):
+            return dict(input_dict,
+                        migrations=input_dict['migrations'] + ['2020.1'])
+
+    @staticmethod
+    def test_migration_chain_cached(my_upgrade):
+        TestUpgrade.add_repository_migrations(my_upgrade)
+        request = TestUpgrade.repository_request()
+
+        with patch.object(my_upgrade.lua_migrations,
+                          'get_repository_impls_to_exec',
+                          wraps=my_upgrade.lua_migrations.
+                          get_repository_impls_to_exec) as lua_getter:
+            responses = [
+                my_upgrade._internal_repository(request) for _ in range(3)
+            ]
+
+        assert lua_getter.call_count == 1
+        for response in responses:
+            parameters = response.return_value.post_upgrade_parameters
+            assert json.loads(parameters['APPDATA_REPOSITORY-1']) == {
+                'migrations': ['lua 1.1', '2020.1']
+            }
+            assert json.loads(parameters['APPDATA_REPOSITORY-2']) == {
+                'migrations': ['old', 'lua 1.1', '2020.1']
+            }
+
+    @staticmethod
+    def test_migration_chain_warm_request(my_upgrade):
+        TestUpgrade.add_repository_migrations(my_upgrade)
+        request = TestUpgrade.repository_request()
+        getters = (my_upgrade.lua_migrations.get_repository_impls_to_exec,
+                   my_upgrade.platform_migrations.get_repository_impls_to_exec)
+        chain = my_upgrade._migration_chain(request, *getters)
+
+        # The same request skips the key, an equal one finds it cached.
+        my_upgrade._chains.clear()
+        assert my_upgrade._migration_chain(request, *getters) is chain
+        assert not my_upgrade._chains
+        other = my_upgrade._migration_chain(TestUpgrade.repository_request(),
+                                            *getters)
+        assert other is not chain
+        assert my_upgrade._migration_chain(TestUpgrade.repository_request(),
+                                           *getters) is other
+
+    @staticmethod
+    def test_migration_chain_warm_request_changed(my_upgrade):
+        TestUpgrade.add_repository_migrations(my_upgrade)
+        request = TestUpgrade.repository_request()
+        my_upgrade._internal_repository(request)
+
+        del request.migration_ids[:]
+        response = my_upgrade._internal_repository(request)
+        assert json.loads(response.return_value.post_upgrade_parameters[
+            'APPDATA_REPOSITORY-1']) == {'migrations': ['lua 1.1']}
+
+    @staticmethod
+    def test_migration_chain_per_key(my_upgrade):
+        TestUpgrade.add_repository_migrations(my_upgrade)
+
+        response = my_upgrade._internal_repository(
+            TestUpgrade.repository_request(lua_version='', migration_ids=[]))
+        assert json.loads(response.return_value.post_upgrade_parameters[
+            'APPDATA_REPOSITORY-1']) == {'migrations': []}
+
+        response = my_upgrade._internal_repository(
+            TestUpgrade.repository_request(lua_version=''))
+        assert json.loads(response.return_value.post_upgrade_parameters[
+            'APPDATA_REPOSITORY-1']) == {'migrations': ['2020.1']}
+        assert len(my_upgrade._chains) == 2
+
+    @staticmethod
+    def test_migration_chain_reset_on_new_migration(my_upgrade):
+        TestUpgrade.add_repository_migrations(my_upgrade)
+        request = TestUpgrade.repository_request(
+            migration_ids=['2020.1', '2020.2'])
+        my_upgrade._internal_repository(request)
+
+        @my_upgrade.repository('2020.2')
+        def platform_upgrade_two(input_dict):
+            return dict(input_dict,
+                        migrations=input_dict['migrations'] + ['2020.2'])
+
+        response = my_upgrade._internal_repository(request)
+        assert json.loads(response.return_value.post_upgrade_parameters[
+            'APPDATA_REPOSITORY-1']) == {
+                'migrations': ['lua 1.1', '2020.1', '2020.2']
+            }
+
+    @staticmethod
+    def test_migration_chain_cache_bounded(my_upgrade):
+        for i in range(_upgrade.MAX_CACHED_CHAINS + 1):
+            my_upgrade._internal_repository(
+                TestUpgrade.repository_request(
+                    migration_ids=['2020.{}'.format(i + 1)]))
+
+        assert len(my_upgrade._chains) <= _upgrade.MAX_CACHED_CHAINS
+
+    @staticmethod
+    def snapshot_request(objects):
+        return platform_pb2.UpgradeRequest(
+            pre_upgrade_parameters=dict(
+                ('APPDATA_SNAPSHOT-{}'.format(i), json.dumps({'index': i}))
+                for i in range(objects)),
+            type=platform_pb2.UpgradeRequest.SNAPSHOT,
+            migration_ids=['2020.1'])
+
+    @staticmethod
+    def add_snapshot_migration(my_upgrade, fail_on=None):
+        @my_upgrade.snapshot('2020.1')
+        def snapshot_upgrade(input_dict):
+            if input_dict['index'] == fail_on:
+                raise ValueError('bad index')
+            return dict(input_dict, double=input_dict['index'] * 2)
+
+    @staticmethod
+    @requires_fork
+    def test_parallel_upgrade_same_result(my_upgrade):
+        TestUpgrade.add_snapshot_migration(my_upgrade)
+        request = TestUpgrade.snapshot_request(101)
+        serial = my_upgrade._internal_snapshot(request)
+
+        my_upgrade.parallel(processes=3, min_objects=10)
+        with patch('multiprocessing.Pool',
+                   wraps=multiprocessing.Pool) as pool:
+            parallel = my_upgrade._internal_snapshot(request)
+
+        assert pool.call_count == 1
+        assert parallel == serial
+        assert json.loads(parallel.return_value.post_upgrade_parameters[
+            'APPDATA_SNAPSHOT-100']) == {'index': 100, 'double': 200}
+
+    @staticmethod
+    @requires_fork
+    def test_parallel_upgrade_small_request(my_upgrade):
+        TestUpgrade.add_snapshot_migration(my_upgrade)
+        my_upgrade.parallel(processes=3, min_objects=10)
+
+        with patch('multiprocessing.Pool') as pool:
+            response = my_upgrade._internal_snapshot(
+                TestUpgrade.snapshot_request(9))
+
+        assert not pool.called
+        assert len(response.return_value.post_upgrade_parameters) == 9
+
+    @staticmethod
+    @pytest.mark.parametrize('processes', [
+        None, pytest.param(2, marks=requires_fork)
+    ])
+    def test_upgrade_failure(my_upgrade, processes):
+        TestUpgrade.add_snapshot_migration(my_upgrade, fail_on=42)
+        if processes:
+            my_upgrade.parallel(processes=processes, min_objects=1)
+
+        with pytest.raises(ObjectMigrationError) as err_info:
+            my_upgrade._internal_snapshot(TestUpgrade.snapshot_request(50))
+
+        assert err_info.value.object_ref == 'APPDATA_SNAPSHOT-42'
+        assert err_info.value.error_type == 'ValueError'
+        assert err_info.value.error_message == 'bad index'
+        assert err_info.value.message == (
+            "The migration of the object 'APPDATA_SNAPSHOT-42' failed with"
+            " ValueError: bad index")
+
+    @staticmethod
+    @pytest.mark.parametrize('processes', [
+        None, pytest.param(2, marks=requires_fork)
+    ])
+    def test_upgrade_user_error(my_upgrade, processes):
+        @my_upgrade.snapshot('2020.1')
+        def snapshot_upgrade(input_dict):
+            raise UserError('bad snapshot', 'fix it', 'output')
+
+        if processes:
+            my_upgrade.parallel(processes=processes, min_objects=1)
+
+        with pytest.raises(UserError) as err_info:
+            my_upgrade._internal_snapshot(TestUpgrade.snapshot_request(5))
+
+        assert err_info.value.args == ('bad snapshot', 'fix it', 'output')
+
+    @staticmethod
+    def test_parallel_upgrade_without_fork(my_upgrade):
+        TestUpgrade.add_snapshot_migration(my_upgrade)
+        my_upgrade.parallel(processes=2, min_objects=1)
+
+        with patch.object(_upgrade, '_CAN_FORK', False):
+            with patch('multiprocessing.Pool') as pool:
+                response = my_upgrade._internal_snapshot(
+                    TestUpgrade.snapshot_request(10))
+
+        assert not pool.called
+        assert json.loads(response.return_value.post_upgrade_parameters[
+            'APPDATA_SNAPSHOT-9']) == {'index': 9, 'double': 18}
+
+    @staticmethod
+    @pytest.mark.parametrize('kwargs', [{
+        'processes': 0
+    }, {
+        'min_objects': -1
+    }, {
+        'processes': 1.5
+    }])
+    def test_parallel_bad_arguments(my_upgrade, kwargs):
+        with pytest.raises(ValueError):
+            my_upgrade.parallel(**kwargs)
+
+    @staticmethod
+    def test_upgrade_streams_objects(my_upgrade):
+        class Metadata(dict):
+            live = 0
+            most_live = 0
+
+            def __init__(self, *args, **kwargs):
+                super(Metadata, self).__init__(*args, **kwargs)
+                Metadata.live += 1
+                Metadata.most_live = max(Metadata.most_live, Metadata.live)
+
+            def __del__(self):
+                Metadata.live -= 1
+
+        @my_upgrade.snapshot('2020.1')
+        def snapshot_upgrade(input_dict):
+            return Metadata(input_dict, upgraded=True)
+
+        events = []
+
+        class Target(object):
+            def __init__(self, parameters):
+                self.parameters = parameters
+
+            def __setitem__(self, object_ref, upgraded):
+                events.append('write')
+                self.parameters[object_ref] = upgraded
+
+        def recorded(items):
+            for item in items:
+                events.append('read')
+                yield item
+
+        migrate_items = _upgrade.UpgradeOperations._migrate_items
+
+        def recording_migrate_items(items, chain, post_upgrade_parameters,
+                                    stats=None):
+            # The objects must reach the migrations straight from the map of
+            # the request, not from a list built beforehand.
+            assert not isinstance(items, (list, tuple))
+            migrate_items(recorded(items), chain,
+                          Target(post_upgrade_parameters), stats)
+
+        objects = 1000
+        request = TestUpgrade.snapshot_request(objects)
+        with patch.object(_upgrade.UpgradeOperations, '_migrate_items',
+                          staticmethod(recording_migrate_items)):
+            response = my_upgrade._internal_snapshot(request)
+
+        parameters = response.return_value.post_upgrade_parameters
+        assert len(parameters) == objects
+        assert json.loads(parameters['APPDATA_SNAPSHOT-999']) == {
+            'index': 999,
+            'upgraded': True
+        }
+        # Each object is written to the response before the next is read.
+        assert events == ['read', 'write'] * objects
+        # Each upgraded object is released once it is written to the response.
+        assert Metadata.most_live == 1
+        assert Metadata.live == 0
+
+    @staticmethod
+    def test_upgrade_streams_many_objects(my_upgrade):
+        class Decoded(dict):
+            live = 0
+            most_live = 0
+
+            def __init__(self, *args, **kwargs):
+                super(Decoded, self).__init__(*args, **kwargs)
+                Decoded.live += 1
+                Decoded.most_live = max(Decoded.most_live, Decoded.live)
+
+            def __del__(self):
+                Decoded.live -= 1
+
+        @my_upgrade.snapshot('2020.1')
+        def snapshot_upgrade(input_dict):
+            return Decoded(input_dict, upgraded=True)
+
+        loads = _json_util.loads
+        objects = 100000
+        request = TestUpgrade.snapshot_request(objects)
+        with patch.object(_json_util, 'loads',
+                          lambda json_string: Decoded(loads(json_string))):
+            response = my_upgrade._internal_snapshot(request)
+
+        parameters = response.return_value.post_upgrade_parameters
+        assert len(parameters) == objects
+        assert json.loads(parameters['APPDATA_SNAPSHOT-99999']) == {
+            'index': 99999,
+            'upgraded': True
+        }
+        #
+        # However many objects there are, at most two decoded objects are
+        # alive at once: the object being migrated and either its upgraded
+        # copy or the object migrated before it.
+        #
+        assert Decoded.most_live <= 2
+        assert Decoded.live == 0
+
+    @staticmethod
+    def duplicate_snapshot_request():
+        return platform_pb2.UpgradeRequest(
+            pre_upgrade_parameters=dict(
+                ('APPDATA_SNAPSHOT-{}'.format(i),
+                 json.dumps({'index': i % 3})) for i in range(30)),
+            type=platform_pb2.UpgradeRequest.SNAPSHOT,
+            migration_ids=['2020.1'])
+
+    @staticmethod
+    @pytest.mark.parametrize('pure,expected_calls', [(True, 3), (False, 30)])
+    def test_upgrade_deduplicated(my_upgrade, caplog, pure, expected_calls):
+        calls = []
+
+        @my_upgrade.snapshot('2020.1', pure=pure)
+        def snapshot_upgrade(input_dict):
+            calls.append(input_dict['index'])
+            return dict(input_dict, double=input_dict['index'] * 2)
+
+        response = my_upgrade._internal_snapshot(
+            TestUpgrade.duplicate_snapshot_request())
+
+        assert len(calls) == expected_calls
+        parameters = response.return_value.post_upgrade_parameters
+        assert len(parameters) == 30
+        for i in range(30):
+            assert json.loads(parameters['APPDATA_SNAPSHOT-{}'.format(i)]) == {
+                'index': i % 3,
+                'double': i % 3 * 2
+            }
+        messages = [record.getMessage() for record in caplog.records]
+        assert (('Deduplicated 30 objects to 3 distinct payloads, a ratio of'
+                 ' 10.0' in messages) == pure)
+
+    @staticmethod
+    def test_upgrade_deduplicated_needs_all_pure(my_upgrade):
+        calls = []
+
+        @my_upgrade.snapshot('1.1', MigrationType.LUA, pure=True)
+        def lua_upgrade(input_dict):
+            calls.append('lua')
+            return input_dict
+
+        @my_upgrade.snapshot('2020.1')
+        def snapshot_upgrade(input_dict):
+            calls.append('platform')
+            return input_dict
+
+        request = TestUpgrade.duplicate_snapshot_request()
+        request.lua_upgrade_version = '1.1'
+        my_upgrade._internal_snapshot(request)
+
+        assert calls.count('lua') == 30
+
+    @staticmethod
+    @requires_fork
+    def test_parallel_upgrade_deduplicated(my_upgrade):
+        from dlpx.virtualization.platform import Plugin
+        serial_upgrade = Plugin().upgrade
+        TestUpgrade.add_snapshot_migration(serial_upgrade)
+        request = TestUpgrade.duplicate_snapshot_request()
+        serial = serial_upgrade._internal_snapshot(request)
+
+        @my_upgrade.snapshot('2020.1', pure=True)
+        def snapshot_upgrade(input_dict):
+            return dict(input_dict, double=input_dict['index'] * 2)
+
+        my_upgrade.parallel(processes=2, min_objects=2)
+        with patch('multiprocessing.Pool',
+                   wraps=multiprocessing.Pool) as pool:
+            parallel = my_upgrade._internal_snapshot(request)
+
+        assert pool.call_count == 1
+        assert parallel == serial
+
+    @staticmethod
+    def test_upgrade_bad_pure(my_upgrade):
+        with pytest.raises(IncorrectTypeError) as err_info:
+            my_upgrade.snapshot('2020.1', pure='yes')
+
+        assert err_info.value.message == (
+            "UpgradeOperations's parameter 'pure' was type 'str' but should"
+            " be of type 'bool' if defined.")
+
+    @staticmethod
+    @pytest.mark.parametrize('processes', [
+        None, pytest.param(2, marks=requires_fork)
+    ])
+    def test_upgrade_resumed_from_checkpoint(my_upgrade, tmpdir, processes):
+        calls = []
+        fail = [True]
+
+        @my_upgrade.snapshot('2020.1')
+        def snapshot_upgrade(input_dict):
+            calls.append(input_dict['index'])
+            if fail[0] and input_dict['index'] == 42:
+                raise ValueError('bad index')
+            return dict(input_dict, double=input_dict['index'] * 2)
+
+        my_upgrade.checkpoint(
+            upgrade_checkpoint.DirectoryCheckpointStore(tmpdir.strpath,
+                                                        batch_size=10))
+        if processes:
+            my_upgrade.parallel(processes=processes, min_objects=1)
+        request = TestUpgrade.snapshot_request(50)
+
+        with pytest.raises(ObjectMigrationError):
+            my_upgrade._internal_snapshot(request)
+        recorded = len(calls) - 1
+        assert len(tmpdir.listdir()) == 1
+
+        fail[0] = False
+        del calls[:]
+        response = my_upgrade._internal_snapshot(request)
+
+        # The migrations run in other processes when in parallel.
+        if not processes:
+            assert len(calls) == 50 - recorded
+            assert 42 in calls
+        parameters = response.return_value.post_upgrade_parameters
+        assert len(parameters) == 50
+        for i in range(50):
+            assert json.loads(parameters['APPDATA_SNAPSHOT-{}'.format(i)]) == {
+                'index': i,
+                'double': i * 2
+            }
+
+        del calls[:]
+        my_upgrade._internal_snapshot(request)
+        assert not calls
+
+    @staticmethod
+    def test_checkpoint_changed_metadata_migrated_again(my_upgrade, tmpdir):
+        TestUpgrade.add_snapshot_migration(my_upgrade)
+        my_upgrade.checkpoint(
+            upgrade_checkpoint.DirectoryCheckpointStore(tmpdir.strpath))
+        my_upgrade._internal_snapshot(TestUpgrade.snapshot_request(3))
+
+        request = TestUpgrade.snapshot_request(3)
+        request.pre_upgrade_parameters['APPDATA_SNAPSHOT-1'] = json.dumps(
+            {'index': 10})
+        response = my_upgrade._internal_snapshot(request)
+
+        assert json.loads(response.return_value.post_upgrade_parameters[
+            'APPDATA_SNAPSHOT-1']) == {'index': 10, 'double': 20}
+
+    @staticmethod
+    def test_checkpoint_per_chain(my_upgrade, tmpdir):
+        TestUpgrade.add_repository_migrations(my_upgrade)
+        my_upgrade.checkpoint(
+            upgrade_checkpoint.DirectoryCheckpointStore(tmpdir.strpath))
+
+        my_upgrade._internal_repository(TestUpgrade.repository_request())
+        response = my_upgrade._internal_repository(
+            TestUpgrade.repository_request(lua_version=''))
+
+        assert len(tmpdir.listdir()) == 2
+        assert json.loads(response.return_value.post_upgrade_parameters[
+            'APPDATA_REPOSITORY-1']) == {'migrations': ['2020.1']}
+
+    @staticmethod
+    def test_checkpoint_bad_store(my_upgrade, tmpdir):
+        with pytest.raises(IncorrectTypeError):
+            my_upgrade.checkpoint(tmpdir.strpath)
+
+    @staticmethod
+    def upgrade_summaries(caplog):
+        prefix = 'Upgrade summary '
+        return [
+            json.loads(record.getMessage()[len(prefix):])
+            for record in caplog.records
+            if record.getMessage().startswith(prefix)
+        ]
+
+    @staticmethod
+    def test_upgrade_summary(my_upgrade, caplog):
+        TestUpgrade.add_repository_migrations(my_upgrade)
+        request = TestUpgrade.repository_request()
+
+        with patch.object(_upgrade, '_clock', side_effect=range(100)):
+            response = my_upgrade._internal_repository(request)
+
+        summaries = TestUpgrade.upgrade_summaries(caplog)
+        assert len(summaries) == 1
+        summary = summaries[0]
+        parameters = response.return_value.post_upgrade_parameters
+        assert summary == {
+            'operation': Op.UPGRADE_REPOSITORY.value,
+            'objects': 2,
+            'distinct': None,
+            'restored': 0,
+            'migrated': 2,
+            'unchanged': 0,
+            'failed': False,
+            'seconds': 9,
+            'input_bytes': sum(
+                len(metadata)
+                for metadata in request.pre_upgrade_parameters.values()),
+            'output_bytes': sum(
+                len(metadata) for metadata in parameters.values()),
+            'migrations': [{
+                'name': 'lua_upgrade',
+                'objects': 2,
+                'seconds': 2
+            }, {
+                'name': 'platform_upgrade',
+                'objects': 2,
+                'seconds': 2
+            }]
+        }
+
+    @staticmethod
+    @pytest.mark.parametrize('processes', [
+        None, pytest.param(2, marks=requires_fork)
+    ])
+    def test_upgrade_not_measured_without_summary(my_upgrade, caplog,
+                                                  processes):
+        caplog.set_level(logging.WARNING)
+        TestUpgrade.add_snapshot_migration(my_upgrade)
+        if processes:
+            my_upgrade.parallel(processes=processes, min_objects=1)
+
+        with patch.object(_upgrade, '_UpgradeStats') as stats:
+            with patch.object(_upgrade._MigrationChain,
+                              'run_timed') as run_timed:
+                response = my_upgrade._internal_snapshot(
+                    TestUpgrade.snapshot_request(5))
+
+        assert not stats.called
+        assert not run_timed.called
+        assert json.loads(response.return_value.post_upgrade_parameters[
+            'APPDATA_SNAPSHOT-4']) == {'index': 4, 'double': 8}
+        assert not TestUpgrade.upgrade_summaries(caplog)
+
+    @staticmethod
+    def test_upgrade_summary_failure(my_upgrade, caplog):
+        TestUpgrade.add_snapshot_migration(my_upgrade, fail_on=3)
+
+        with pytest.raises(ObjectMigrationError):
+            my_upgrade._internal_snapshot(TestUpgrade.snapshot_request(5))
+
+        summary, = TestUpgrade.upgrade_summaries(caplog)
+        assert summary['failed']
+        assert summary['objects'] == 5
+        assert summary['migrated'] < 5
+        assert summary['migrations'][0]['objects'] == summary['migrated']
+
+    @staticmethod
+    @requires_fork
+    def test_parallel_upgrade_summary(my_upgrade, caplog):
+        TestUpgrade.add_snapshot_migration(my_upgrade)
+        my_upgrade.parallel(processes=2, min_objects=1)
+
+        my_upgrade._internal_snapshot(TestUpgrade.snapshot_request(20))
+
+        summary, = TestUpgrade.upgrade_summaries(caplog)
+        assert summary['migrated'] == 20
+        assert summary['migrations'][0]['name'] == 'snapshot_upgrade'
+        assert summary['migrations'][0]['objects'] == 20
+        assert summary['output_bytes'] > summary['input_bytes'] > 0
+
+    @staticmethod
+    def test_upgrade_summary_deduplicated_and_restored(my_upgrade, caplog,
+                                                       tmpdir):
+        @my_upgrade.snapshot('2020.1', pure=True)
+        def snapshot_upgrade(input_dict):
+            return dict(input_dict, double=input_dict['index'] * 2)
+
+        my_upgrade.checkpoint(
+            upgrade_checkpoint.DirectoryCheckpointStore(tmpdir.strpath))
+        request = TestUpgrade.duplicate_snapshot_request()
+        my_upgrade._internal_snapshot(request)
+        my_upgrade._internal_snapshot(request)
+
+        first, second = TestUpgrade.upgrade_summaries(caplog)
+        assert (first['objects'], first['distinct'], first['restored'],
+                first['migrated']) == (30, 3, 0, 3)
+        assert (second['objects'], second['distinct'], second['restored'],
+                second['migrated']) == (30, 3, 3, 0)
+
+    @staticmethod
+    @pytest.fixture
+    def generated_modules():
+        mock_module = MagicMock()
+        mock_module.generated.definitions = fake_generated_definitions
+
+        modules = {
+            'generated': mock_module,
+            'generated.definitions': mock_module.generated.definitions
+        }
+        with patch.dict('sys.modules', modules):
+            yield
+
+    @staticmethod
+    def add_named_snapshot_migration(my_upgrade, unnamed=()):
+        @my_upgrade.snapshot('2020.1')
+        def snapshot_upgrade(input_dict):
+            if input_dict['index'] in unnamed:
+                return input_dict
+            return dict(input_dict, name='snapshot')
+
+    @staticmethod
+    def test_upgrade_validated(my_upgrade, generated_modules):
+        TestUpgrade.add_named_snapshot_migration(my_upgrade)
+        my_upgrade.validate()
+
+        with patch.object(fake_generated_definitions.SnapshotDefinition,
+                          'from_dict',
+                          wraps=fake_generated_definitions.SnapshotDefinition.
+                          from_dict) as from_dict:
+            response = my_upgrade._internal_snapshot(
+                TestUpgrade.snapshot_request(5))
+
+        assert from_dict.call_count == 5
+        assert json.loads(response.return_value.post_upgrade_parameters[
+            'APPDATA_SNAPSHOT-4']) == {'index': 4, 'name': 'snapshot'}
+
+    @staticmethod
+    def test_upgrade_validation_reports_all_failures(my_upgrade,
+                                                     generated_modules):
+        TestUpgrade.add_named_snapshot_migration(my_upgrade, unnamed=(1, 3))
+        my_upgrade.validate()
+
+        with pytest.raises(UpgradeValidationError) as err_info:
+            my_upgrade._internal_snapshot(TestUpgrade.snapshot_request(5))
+
+        assert err_info.value.failures == [
+            ('APPDATA_SNAPSHOT-1', "KeyError: 'name'"),
+            ('APPDATA_SNAPSHOT-3', "KeyError: 'name'"),
+        ]
+        assert err_info.value.message == (
+            "2 of the 5 objects upgraded by the upgrade.snapshot() operation"
+            " do not match the schema: 'APPDATA_SNAPSHOT-1' failed with"
+            " KeyError: 'name'; 'APPDATA_SNAPSHOT-3' failed with KeyError:"
+            " 'name'.")
+
+    @staticmethod
+    def test_upgrade_validation_truncates_failures():
+        failures = [('APPDATA_SNAPSHOT-{}'.format(i), 'KeyError: name')
+                    for i in range(3)]
+
+        err = UpgradeValidationError(Op.UPGRADE_SNAPSHOT, failures, 3,
+                                     max_reported=1)
+
+        assert err.message == (
+            '3 of the 3 objects upgraded by the upgrade.snapshot() operation'
+            " do not match the schema: 'APPDATA_SNAPSHOT-0' failed with"
+            ' KeyError: name; and 2 more.')
+
+    @staticmethod
+    def test_upgrade_validated_once_per_distinct_object(
+            my_upgrade, generated_modules):
+        @my_upgrade.snapshot('2020.1')
+        def snapshot_upgrade(input_dict):
+            return dict(input_dict, name='snapshot')
+
+        my_upgrade.validate()
+
+        with patch.object(fake_generated_definitions.SnapshotDefinition,
+                          'from_dict',
+                          wraps=fake_generated_definitions.SnapshotDefinition.
+                          from_dict) as from_dict:
+            my_upgrade._internal_snapshot(
+                TestUpgrade.duplicate_snapshot_request())
+
+        assert from_dict.call_count == 3
+
+    @staticmethod
+    def test_upgrade_validation_failure_summary(my_upgrade, caplog,
+                                                generated_modules):
+        TestUpgrade.add_named_snapshot_migration(my_upgrade, unnamed=(0, ))
+        my_upgrade.validate()
+
+        with pytest.raises(UpgradeValidationError):
+            my_upgrade._internal_snapshot(TestUpgrade.snapshot_request(2))
+
+        summary, = TestUpgrade.upgrade_summaries(caplog)
+        assert summary['failed']
+        assert summary['migrated'] == 2
+
+    @staticmethod
+    def test_upgrade_not_validated_by_default(my_upgrade, generated_modules):
+        TestUpgrade.add_named_snapshot_migration(my_upgrade, unnamed=(0, ))
+
+        response = my_upgrade._internal_snapshot(
+            TestUpgrade.snapshot_request(2))
+
+        assert len(response.return_value.post_upgrade_parameters) == 2
+
+    @staticmethod
+    def test_upgrade_validation_disabled(my_upgrade, generated_modules):
+        TestUpgrade.add_named_snapshot_migration(my_upgrade, unnamed=(0, ))
+        my_upgrade.validate()
+        my_upgrade.validate(False)
+
+        response = my_upgrade._internal_snapshot(
+            TestUpgrade.snapshot_request(2))
+
+        assert len(response.return_value.post_upgrade_parameters) == 2
+
+    @staticmethod
+    def test_upgrade_validation_without_generated_definitions(
+            my_upgrade, caplog):
+        TestUpgrade.add_named_snapshot_migration(my_upgrade, unnamed=(0, ))
+        my_upgrade.validate()
+
+        with patch.dict('sys.modules', {'generated.definitions': None}):
+            response = my_upgrade._internal_snapshot(
+                TestUpgrade.snapshot_request(2))
+
+        assert len(response.return_value.post_upgrade_parameters) == 2
+        assert ('The upgraded objects cannot be validated as the generated'
+                ' definitions were not found.') in caplog.text
+
+    @staticmethod
+    def test_upgrade_validate_bad_type(my_upgrade):
+        with pytest.raises(IncorrectTypeError) as err_info:
+            my_upgrade.validate('yes')
+
+        assert err_info.value.message == (
+            "UpgradeOperations's parameter 'enabled' was type 'str' but"
+            " should be of type 'bool' if defined.")
+
+    @staticmethod
+    def test_upgrade_no_migrations_passes_objects_through(my_upgrade, caplog):
+        TestUpgrade.add_repository_migrations(my_upgrade)
+        metadata = {
+            'APPDATA_SNAPSHOT-1': '{ "index" : 1,  "name": "s\\u00e9" }',
+            'APPDATA_SNAPSHOT-2': '{"b": 2, "a": 1}'
+        }
+        request = platform_pb2.UpgradeRequest(
+            pre_upgrade_parameters=metadata,
+            type=platform_pb2.UpgradeRequest.SNAPSHOT,
+            migration_ids=['2020.1'])
+
+        with patch.object(_upgrade._json_util, 'loads') as loads, \
+                patch.object(_upgrade._json_util, 'dumps',
+                             wraps=_upgrade._json_util.dumps) as dumps:
+            response = my_upgrade._internal_snapshot(request)
+
+        assert dict(response.return_value.post_upgrade_parameters) == metadata
+        assert not loads.called
+        # Only the summary is encoded.
+        assert dumps.call_count == 1
+        summary, = TestUpgrade.upgrade_summaries(caplog)
+        assert summary['migrated'] == 0
+        assert summary['unchanged'] == 2
+        assert summary['migrations'] == []
+        assert summary['input_bytes'] == summary['output_bytes'] == 0
+
+    @staticmethod
+    @requires_fork
+    def test_upgrade_no_migrations_parallel(my_upgrade):
+        my_upgrade.parallel(processes=2, min_objects=1)
+        request = TestUpgrade.snapshot_request(10)
+
+        with patch('multiprocessing.Pool') as pool:
+            response = my_upgrade._internal_snapshot(request)
+
+        assert not pool.called
+        assert (response.return_value.post_upgrade_parameters ==
+                request.pre_upgrade_parameters)
@@ -0,0 +1,109 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+import pytest
+from dlpx.virtualization.platform import upgrade_checkpoint
+
+CHAIN_HASH = 'a' * 64
+
+
+class TestDirectoryCheckpointStore:
+    @staticmethod
+    @pytest.fixture
+    def store(tmpdir):
+        return upgrade_checkpoint.DirectoryCheckpointStore(
+            tmpdir.join('checkpoints').strpath)
+
+    @staticmethod
+    def test_save_and_load(store):
+        assert store.load(CHAIN_HASH) == {}
+
+        store.save(CHAIN_HASH, [('REF-1', 'hash1', '{"a": 1}')])
+        store.save(CHAIN_HASH, [('REF-2', 'hash2', '{"a": 2}'),
+                                ('REF-1', 'hash3', '{"a": 3}')])
+
+        assert store.load(CHAIN_HASH) == {
+            'REF-1': ('hash3', '{"a": 3}'),
+            'REF-2': ('hash2', '{"a": 2}')
+        }
+        assert store.load('b' * 64) == {}
+
+    @staticmethod
+    def test_incomplete_record_ignored(store, tmpdir):
+        store.save(CHAIN_HASH, [('REF-1', 'hash1', '{}')])
+        path = tmpdir.join('checkpoints', CHAIN_HASH + '.jsonl')
+        path.write('["REF-2", "hash2", "{', mode='a')
+
+        assert list(store.load(CHAIN_HASH)) == ['REF-1']
+
+        store.save(CHAIN_HASH, [('REF-3', 'hash3', '{}')])
+        assert sorted(store.load(CHAIN_HASH)) == ['REF-1', 'REF-3']
+
+    @staticmethod
+    def test_clear(store):
+        store.clear()
+        store.save(CHAIN_HASH, [('REF-1', 'hash1', '{}')])
+
+        store.clear()
+
+        assert store.load(CHAIN_HASH) == {}
+
+    @staticmethod
+    def test_bad_chain_hash(store):
+        with pytest.raises(ValueError):
+            store.load('../outside')
+
+    @staticmethod
+    @pytest.mark.parametrize('batch_size', [0, -1, 1.5, True])
+    def test_bad_batch_size(tmpdir, batch_size):
+        with pytest.raises(ValueError):
+            upgrade_checkpoint.DirectoryCheckpointStore(
+                tmpdir.strpath, batch_size=batch_size)
+
+    @staticmethod
+    def test_metadata_hash():
+        assert (upgrade_checkpoint.metadata_hash(u'{"name": "\u00e9"}') ==
+                upgrade_checkpoint.metadata_hash('{"name": "\xc3\xa9"}'
+                                                 .decode('utf-8')))
+        assert (upgrade_checkpoint.metadata_hash('{}') !=
+                upgrade_checkpoint.metadata_hash('{ }'))
+
+
+class TestCheckpointStore:
+    @staticmethod
+    def test_abstract():
+        with pytest.raises(TypeError):
+            upgrade_checkpoint.CheckpointStore()
+
+    @staticmethod
+    def test_incomplete_subclass():
+        class LoadOnlyStore(upgrade_checkpoint.CheckpointStore):
+            def load(self, chain_hash):
+                return {}
+
+        with pytest.raises(TypeError):
+            LoadOnlyStore()
+
+    @staticmethod
+    def test_subclass():
+        class MemoryStore(upgrade_checkpoint.CheckpointStore):
+            def __init__(self):
+                super(MemoryStore, self).__init__(batch_size=10)
+                self.records = {}
+
+            def load(self, chain_hash):
+                return dict(self.records.get(chain_hash, {}))
+
+            def save(self, chain_hash, records):
+                self.records.setdefault(chain_hash, {}).update(
+                    (ref, (h, upgraded)) for ref, h, upgraded in records)
+
+            def clear(self):
+                self.records.clear()
+
+        store = MemoryStore()
+        store.save(CHAIN_HASH, [('ref', 'hash', '{}')])
+
+        assert store.batch_size == 10
+        assert store.load(CHAIN_HASH) == {'ref': ('hash', '{}')}
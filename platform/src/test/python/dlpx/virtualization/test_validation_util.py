@@ -0,0 +1,47 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+from dlpx.virtualization.platform import validation_util as v
+
+
+class TestValidationUtil:
+    @staticmethod
+    def test_find_invalid_items_none():
+        assert v.find_invalid_items(['a', u'b', 'c'], basestring) is None
+        assert v.find_invalid_items([], basestring) is None
+
+    @staticmethod
+    def test_find_invalid_items_reports_indices():
+        invalid_items = v.find_invalid_items(['a', 1, 'b', 2.0], basestring)
+
+        assert invalid_items.offenders == [(1, int), (3, float)]
+        assert not invalid_items.truncated
+        assert str(invalid_items) == (
+            "a list of 4 items where item 1 was <type 'int'>, item 3 was"
+            " <type 'float'>")
+
+    @staticmethod
+    def test_find_invalid_items_stops_after_max_reported():
+        consumed = []
+
+        class Items(list):
+            def __iter__(self):
+                for item in list.__iter__(self):
+                    consumed.append(item)
+                    yield item
+
+        invalid_items = v.find_invalid_items(Items(range(100)),
+                                             basestring,
+                                             max_reported=3)
+
+        assert invalid_items.offenders == [(0, int), (1, int), (2, int)]
+        assert invalid_items.truncated
+        assert str(invalid_items).endswith(', ...')
+        assert len(consumed) == 4
+
+    @staticmethod
+    def test_find_invalid_items_start():
+        invalid_items = v.find_invalid_items([1, 'a', 2], basestring, start=1)
+
+        assert invalid_items.offenders == [(2, int)]
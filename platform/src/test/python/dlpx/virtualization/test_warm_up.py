@@ -0,0 +1,129 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+import logging
+
+import pytest
+from dlpx.virtualization.platform import _warm_up
+from dlpx.virtualization.platform.exceptions import (
+    DecoratorNotFunctionError, OperationAlreadyDefinedError)
+from mock import MagicMock, patch
+
+import fake_generated_definitions
+
+
+class TestWarmUp:
+    @staticmethod
+    @pytest.fixture
+    def generated_modules():
+        mock_module = MagicMock()
+        mock_module.generated.definitions = fake_generated_definitions
+
+        modules = {
+            'generated': mock_module,
+            'generated.definitions': mock_module.generated.definitions
+        }
+        with patch.dict('sys.modules', modules):
+            yield
+
+    @staticmethod
+    @pytest.fixture
+    def my_plugin(generated_modules):
+        from dlpx.virtualization.platform import Plugin
+        yield Plugin()
+
+    @staticmethod
+    def test_runtime_init_runs_once(my_plugin):
+        calls = []
+
+        @my_plugin.runtime_init()
+        def runtime_init_impl():
+            calls.append(None)
+
+        seconds = my_plugin.warm_up()
+
+        assert seconds >= 0
+        assert my_plugin.warm_up() == seconds
+        assert len(calls) == 1
+
+    @staticmethod
+    def test_runtime_init_retried_after_failure(my_plugin):
+        calls = []
+
+        @my_plugin.runtime_init()
+        def runtime_init_impl():
+            calls.append(None)
+            if len(calls) == 1:
+                raise RuntimeError('not ready')
+
+        with pytest.raises(RuntimeError):
+            my_plugin.warm_up()
+        my_plugin.warm_up()
+
+        assert len(calls) == 2
+
+    @staticmethod
+    def test_runtime_init_already_defined(my_plugin):
+        @my_plugin.runtime_init()
+        def runtime_init_impl():
+            pass
+
+        with pytest.raises(OperationAlreadyDefinedError):
+
+            @my_plugin.runtime_init()
+            def runtime_init_impl_2():
+                pass
+
+    @staticmethod
+    def test_runtime_init_not_function(my_plugin):
+        class NotFunction(object):
+            pass
+
+        with pytest.raises(DecoratorNotFunctionError):
+            my_plugin.runtime_init()(NotFunction)
+
+    @staticmethod
+    def test_warm_up_without_runtime_init(my_plugin):
+        assert my_plugin.warm_up() >= 0
+
+    @staticmethod
+    def test_warm_up_logs_cold_start(my_plugin, caplog):
+        caplog.set_level(logging.INFO)
+
+        my_plugin.warm_up()
+
+        assert 'Plugin runtime initialized in' in caplog.text
+
+    @staticmethod
+    def test_warm_up_builds_migration_index(my_plugin):
+        @my_plugin.upgrade.repository('2.0')
+        def repo_upgrade(old_repository):
+            return old_repository
+
+        with patch.object(my_plugin.upgrade.platform_migrations,
+                          'get_sorted_ids',
+                          return_value=['2']) as get_sorted_ids:
+            my_plugin.warm_up()
+
+        get_sorted_ids.assert_called_once_with()
+
+    @staticmethod
+    def test_import_definitions(generated_modules):
+        definitions = _warm_up.import_definitions()
+
+        assert definitions is fake_generated_definitions
+
+    @staticmethod
+    def test_import_definitions_not_generated():
+        with patch.dict('sys.modules', {'generated': None}):
+            assert _warm_up.import_definitions() is None
+
+    @staticmethod
+    def test_import_definitions_import_error():
+        def import_module(name):
+            raise ImportError('No module named psycopg2')
+
+        with patch('importlib.import_module', import_module):
+            with pytest.raises(ImportError):
+                _warm_up.import_definitions()
@@ -0,0 +1,210 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+import pytest
+from dlpx.virtualization.platform import worker
+from dlpx.virtualization.platform.exceptions import IncorrectReturnTypeError
+
+from conftest import TEST_GUID, TEST_OTHER_GUID
+
+
+@pytest.fixture
+def clocked_module():
+    return worker
+
+
+def run_ticks(scheduler, guid, hint, ticks):
+    """Runs ticks ticks of a worker returning hint and returns the number of
+    ticks the worker ran on."""
+    runs = []
+
+    def run():
+        runs.append(None)
+        return hint
+
+    for _ in range(ticks):
+        if not scheduler.should_skip(guid):
+            scheduler.run(guid, run)
+    return len(runs)
+
+
+class TestWorker:
+    @staticmethod
+    @pytest.fixture
+    def scheduler(clock):
+        return worker.WorkerScheduler(time_budget=10, max_backoff=8)
+
+    @staticmethod
+    @pytest.mark.parametrize('hint', [None, worker.CONTINUE])
+    def test_continue_runs_every_tick(scheduler, hint):
+        assert run_ticks(scheduler, TEST_GUID, hint, 10) == 10
+
+        stats = scheduler.stats(TEST_GUID)
+        assert stats.runs == 10
+        assert stats.skipped == 0
+        assert stats.last_hint == worker.CONTINUE
+
+    @staticmethod
+    def test_idle_backs_off(scheduler):
+        # Runs on ticks 1, 3, 6, 11, 20 and 29 once the back off is capped at
+        # 8 skipped ticks.
+        assert run_ticks(scheduler, TEST_GUID, worker.IDLE, 29) == 6
+
+        stats = scheduler.stats(TEST_GUID)
+        assert stats.idle_runs == 6
+        assert stats.skipped == 23
+        assert stats.pending_skips == 8
+
+    @staticmethod
+    def test_work_ends_back_off(scheduler):
+        run_ticks(scheduler, TEST_GUID, worker.IDLE, 8)
+        while scheduler.should_skip(TEST_GUID):
+            pass
+
+        assert run_ticks(scheduler, TEST_GUID, worker.CONTINUE, 3) == 3
+        assert run_ticks(scheduler, TEST_GUID, worker.IDLE, 2) == 1
+
+    @staticmethod
+    def test_skip(scheduler):
+        assert run_ticks(scheduler, TEST_GUID, worker.skip(4), 8) == 2
+        assert scheduler.stats(TEST_GUID).pending_skips == 2
+
+    @staticmethod
+    @pytest.mark.parametrize('ticks', [-1, 1.5, None, True])
+    def test_skip_bad_ticks(ticks):
+        with pytest.raises(ValueError):
+            worker.skip(ticks)
+
+    @staticmethod
+    def test_sources_are_independent(scheduler):
+        run_ticks(scheduler, TEST_GUID, worker.skip(5), 1)
+
+        assert run_ticks(scheduler, TEST_OTHER_GUID, worker.CONTINUE, 5) == 5
+        assert scheduler.stats(TEST_GUID).pending_skips == 5
+        assert sorted(scheduler.all_stats()) == sorted(
+            [TEST_GUID, TEST_OTHER_GUID])
+
+    @staticmethod
+    def test_overrun_skips_ticks(scheduler, clock):
+        def slow_worker():
+            clock.now += 35
+            return worker.CONTINUE
+
+        scheduler.run(TEST_GUID, slow_worker)
+
+        stats = scheduler.stats(TEST_GUID)
+        assert stats.overruns == 1
+        assert stats.pending_skips == 2
+        assert stats.last_seconds == 35
+
+    @staticmethod
+    def test_time_remaining(scheduler, clock):
+        remaining = []
+
+        def budgeted_worker():
+            remaining.append(worker.time_remaining())
+            clock.now += 4
+            remaining.append(worker.time_remaining())
+            clock.now += 7
+            remaining.append(worker.budget_exceeded())
+
+        scheduler.run(TEST_GUID, budgeted_worker)
+
+        assert remaining == [10, 6, True]
+        assert worker.time_remaining() is None
+        assert not worker.budget_exceeded()
+
+    @staticmethod
+    def test_failure_runs_next_tick(scheduler):
+        run_ticks(scheduler, TEST_GUID, worker.skip(3), 1)
+        while scheduler.should_skip(TEST_GUID):
+            pass
+
+        def failing_worker():
+            raise RuntimeError('failed')
+
+        with pytest.raises(RuntimeError):
+            scheduler.run(TEST_GUID, failing_worker)
+
+        stats = scheduler.stats(TEST_GUID)
+        assert stats.failures == 1
+        assert stats.pending_skips == 0
+        assert not scheduler.should_skip(TEST_GUID)
+
+    @staticmethod
+    def test_bad_hint(scheduler):
+        with pytest.raises(IncorrectReturnTypeError) as err_info:
+            scheduler.run(TEST_GUID, lambda: 5)
+
+        assert err_info.value.message == (
+            "The returned object for the linked.worker() operation was type"
+            " 'int' but should be of any one of the following types:"
+            " '['dlpx.virtualization.platform.worker.Hint', 'NoneType']'.")
+        assert scheduler.stats(TEST_GUID).failures == 1
+
+    @staticmethod
+    def test_stats(scheduler, clock):
+        def timed_worker(seconds):
+            def run():
+                clock.now += seconds
+
+            return run
+
+        scheduler.run(TEST_GUID, timed_worker(2))
+        scheduler.run(TEST_GUID, timed_worker(4))
+
+        stats = scheduler.stats(TEST_GUID)
+        assert stats.to_dict() == {
+            'runs': 2,
+            'skipped': 0,
+            'idle_runs': 0,
+            'failures': 0,
+            'overruns': 0,
+            'total_seconds': 6,
+            'max_seconds': 4,
+            'last_seconds': 4,
+            'average_seconds': 3,
+            'last_run': 1002,
+            'pending_skips': 0
+        }
+
+        # The stats returned are a copy.
+        stats.runs = 0
+        assert scheduler.stats(TEST_GUID).runs == 2
+        assert scheduler.stats(TEST_OTHER_GUID) is None
+
+    @staticmethod
+    def test_max_sources(clock):
+        scheduler = worker.WorkerScheduler(max_sources=2)
+        for guid in ('a', 'b', 'c'):
+            scheduler.run(guid, lambda: worker.IDLE)
+
+        assert len(scheduler) == 2
+        assert scheduler.stats('a') is None
+
+    @staticmethod
+    def test_reset(scheduler):
+        run_ticks(scheduler, TEST_GUID, worker.skip(5), 1)
+        run_ticks(scheduler, TEST_OTHER_GUID, worker.skip(5), 1)
+
+        scheduler.reset(TEST_GUID)
+        assert not scheduler.should_skip(TEST_GUID)
+        assert scheduler.should_skip(TEST_OTHER_GUID)
+
+        scheduler.reset()
+        assert len(scheduler) == 0
+
+    @staticmethod
+    @pytest.mark.parametrize('kwargs', [{
+        'time_budget': 0
+    }, {
+        'time_budget': '1'
+    }, {
+        'max_backoff': -1
+    }, {
+        'max_sources': 0
+    }])
+    def test_bad_arguments(kwargs):
+        with pytest.raises(ValueError):
+            worker.WorkerScheduler(**kwargs)
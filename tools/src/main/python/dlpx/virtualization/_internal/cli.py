@@ -15,6 +15,8 @@ from dlpx.virtualization._internal.commands import build as build_internal
 from dlpx.virtualization._internal.commands import \
     download_logs as download_logs_internal
 from dlpx.virtualization._internal.commands import initialize as init_internal
+from dlpx.virtualization._internal.commands import \
+    rehearse_upgrade as rehearse_upgrade_internal
 from dlpx.virtualization._internal.commands import upload as upload_internal
 
 #
@@ -318,6 +320,55 @@ def download_logs(engine, plugin_config, user, password, directory):
                                              password, directory)
 
 
+@delphix_sdk.command()
+@click.option('-c',
+              '--plugin-config',
+              default='plugin_config.yml',
+              show_default=True,
+              type=click.Path(exists=True,
+                              file_okay=True,
+                              dir_okay=False,
+                              resolve_path=True),
+              callback=click_util.validate_option_exists,
+              help='Set the path to plugin config file of the plugin to'
+              ' upgrade to. The plugin must have been built.')
+@click.option('-d',
+              '--data-directory',
+              type=click.Path(exists=True,
+                              file_okay=False,
+                              dir_okay=True,
+                              readable=True,
+                              resolve_path=True),
+              callback=click_util.validate_option_exists,
+              help='Set the directory of the objects to upgrade. It has a'
+              ' directory per object type, e.g. repository or snapshot,'
+              ' holding a <object reference>.json file per object.')
+@click.option('-l',
+              '--lua-version',
+              help='Set the version of the Lua toolkit the objects were'
+              ' created with.')
+@click.option('-m',
+              '--migration-id',
+              'migration_ids',
+              multiple=True,
+              help='Set the id of a data migration to run. Can be repeated.'
+              ' All the data migrations of the plugin are run by default.')
+def rehearse_upgrade(plugin_config, data_directory, lua_version,
+                     migration_ids):
+    """
+    Run the data migrations of the plugin on a local copy of the objects to
+    upgrade, and report their latency, throughput, size changes and failures.
+    """
+    with command_error_handler():
+        rehearsal = rehearse_upgrade_internal.rehearse_upgrade(
+            plugin_config, data_directory, lua_version, migration_ids
+            or None)
+        click.echo(rehearsal.format())
+        if rehearsal.failures:
+            raise exceptions.UpgradeRehearsalFailedError(
+                len(rehearsal.failures), rehearsal.objects)
+
+
 def get_console_logging_level(verbose, quiet):
     """
     Returns the logging level for the console based on the verbose and quiet
@@ -33,6 +33,7 @@ SWAGGER_JAR = 'codegen/swagger-codegen-cli-2.3.1.jar'
 CODEGEN_CONFIG = 'codegen/codegen-config.json'
 CODEGEN_TEMPLATE_DIR = 'codegen/templates'
 CODEGEN_COPY_FILES = ['__init__.py', 'util.py', CODEGEN_MODULE]
+IDENTITY_FIELDS_EXTENSION = 'x-identityFields'
 
 
 def generate_python(name, source_dir, plugin_config_dir, schema_content):
@@ -108,6 +109,19 @@ def _make_url_refs_opaque(json):
             _make_url_refs_opaque(element)
 
 
+#
+# Swagger only passes vendor extensions (keys starting with 'x-') of a
+# definition on to the templates. Copy identityFields into one so that the
+# generated classes know which properties identify an object, which lets the
+# platform deduplicate discovered repositories and source configs.
+#
+def _add_identity_fields_extensions(definitions):
+    for definition in definitions.values():
+        if isinstance(definition, dict) and 'identityFields' in definition:
+            definition[IDENTITY_FIELDS_EXTENSION] = list(
+                definition['identityFields'])
+
+
 def _write_swagger_file(name, schema_dict, output_dir):
     swagger_json = copy.deepcopy(SWAGGER_JSON_FORMAT)
     swagger_json['info']['title'] = name
@@ -121,6 +135,7 @@ def _write_swagger_file(name, schema_dict, output_dir):
     # objects.
     #
     _make_url_refs_opaque(swagger_json['definitions'])
+    _add_identity_fields_extensions(swagger_json['definitions'])
 
     swagger_file = os.path.join(output_dir, SWAGGER_FILE_NAME)
     logger.info('Writing swagger file to {}'.format(swagger_file))
@@ -0,0 +1,411 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+import collections
+import json
+import logging
+import multiprocessing
+import os
+import re
+import timeit
+
+from dlpx.virtualization._internal import (exceptions, file_util,
+                                           plugin_importer, plugin_util)
+from dlpx.virtualization._internal.plugin_importer import PluginImporter
+from dlpx.virtualization._internal.plugin_validator import PluginValidator
+from six.moves import queue as queue_module
+
+logger = logging.getLogger(__name__)
+
+#
+# The object types upgraded by the Delphix Engine, in the order it upgrades
+# them. The objects of a type are read from the directory of the same name in
+# the data directory, which is also the name of the upgrade decorator of the
+# type.
+#
+OBJECT_TYPES = [
+    'repository', 'source_config', 'linked_source', 'virtual_source',
+    'snapshot'
+]
+
+OBJECT_FILE_SUFFIX = '.json'
+
+# The number of failures listed in the report.
+MAX_REPORTED_FAILURES = 20
+
+# The number of seconds between checks that the rehearsal process is alive.
+POLL_SECONDS = 1
+
+_MIGRATION_ID_REGEX = re.compile(r'^\d+(\.\d+)*$')
+
+_clock = timeit.default_timer
+
+
+class MigrationStats(object):
+    """
+    The measures of one data migration over the objects it was run on.
+    """
+    def __init__(self, object_type, label):
+        self.object_type = object_type
+        self.label = label
+        self.objects = 0
+        self.failures = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def add(self, seconds, failed=False):
+        self.objects += 1
+        self.failures += int(failed)
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    @property
+    def average_seconds(self):
+        return self.seconds / self.objects if self.objects else 0.0
+
+
+class ObjectTypeStats(object):
+    """
+    The measures of the objects of one type, from decoding their parameters to
+    encoding the upgraded parameters. The size delta is measured on the
+    objects that were migrated successfully.
+    """
+    def __init__(self, object_type):
+        self.object_type = object_type
+        self.objects = 0
+        self.failures = 0
+        self.input_bytes = 0
+        # The input bytes of the objects that were migrated successfully.
+        self.migrated_input_bytes = 0
+        self.output_bytes = 0
+        self.seconds = 0.0
+
+    @property
+    def objects_per_second(self):
+        return self.objects / self.seconds if self.seconds else 0.0
+
+
+class UpgradeRehearsal(object):
+    """
+    The measures of an upgrade rehearsal: the objects of each type, every
+    data migration of their chains and the objects that failed to migrate,
+    as (object type, object reference, migration, error) tuples.
+    """
+    def __init__(self):
+        self.object_types = collections.OrderedDict()
+        self.migrations = []
+        self.failures = []
+
+    @property
+    def objects(self):
+        return sum(stats.objects for stats in self.object_types.values())
+
+    @property
+    def seconds(self):
+        return sum(stats.seconds for stats in self.object_types.values())
+
+    def format(self):
+        """
+        Returns the report of the rehearsal as text.
+        """
+        lines = ['{:<16}{:>9}{:>10}{:>12}{:>9}{:>13}{:>13}{:>10}'.format(
+            'Object type', 'Objects', 'Failures', 'Seconds', 'Obj/s',
+            'Input bytes', 'Output bytes', 'Delta')]
+        for stats in self.object_types.values():
+            lines.append(
+                '{:<16}{:>9}{:>10}{:>12.3f}{:>9.0f}{:>13}{:>13}{:>10}'.format(
+                    stats.object_type, stats.objects, stats.failures,
+                    stats.seconds, stats.objects_per_second,
+                    stats.input_bytes, stats.output_bytes,
+                    _format_delta(stats.migrated_input_bytes,
+                                  stats.output_bytes)))
+        lines.append('Total: {} objects in {:.3f} seconds.'.format(
+            self.objects, self.seconds))
+
+        if self.migrations:
+            lines.append('')
+            lines.append(
+                '{:<16}{:<32}{:>9}{:>10}{:>12}{:>12}{:>12}'.format(
+                    'Object type', 'Migration', 'Objects', 'Failures',
+                    'Total ms', 'Average ms', 'Max ms'))
+            for stats in self.migrations:
+                lines.append(
+                    '{:<16}{:<32}{:>9}{:>10}{:>12.3f}{:>12.3f}{:>12.3f}'.
+                    format(stats.object_type, stats.label, stats.objects,
+                           stats.failures, stats.seconds * 1000,
+                           stats.average_seconds * 1000,
+                           stats.max_seconds * 1000))
+
+        if self.failures:
+            lines.append('')
+            lines.append('{} objects failed to migrate:'.format(
+                len(self.failures)))
+            for object_type, object_ref, label, error in (
+                    self.failures[:MAX_REPORTED_FAILURES]):
+                lines.append('  {} {}: {} failed with {}'.format(
+                    object_type, object_ref, label, error))
+            if len(self.failures) > MAX_REPORTED_FAILURES:
+                lines.append('  ... and {} more.'.format(
+                    len(self.failures) - MAX_REPORTED_FAILURES))
+        return '\n'.join(lines)
+
+
+def rehearse_upgrade(plugin_config,
+                     data_directory,
+                     lua_version=None,
+                     migration_ids=None):
+    """
+    Replays objects captured before an upgrade through the data migrations of
+    a plugin, in the order the Delphix Engine runs them, and measures the
+    migrations.
+
+    The data directory has a directory for each object type to upgrade named
+    after its upgrade decorator, e.g. 'repository' or 'snapshot', holding a
+    '<object reference>.json' file with the parameters of each object. The
+    plugin must have been built so that its generated classes exist.
+
+    Like the other commands, the plugin module is imported by a
+    PluginImporter, and the objects are replayed in a sub process, so that
+    the plugin code does not run in dvp.
+
+    Args:
+        plugin_config: Plugin config file of the plugin to upgrade to.
+        data_directory: Directory of the captured objects.
+        lua_version: The version of the Lua toolkit the objects were created
+            with, if any.
+        migration_ids: The ids of the platform migrations to run. All the
+            migrations of the plugin are run if None.
+
+    Returns:
+        UpgradeRehearsal: The measures of the rehearsal.
+
+    Raises specifically:
+        UserError
+        PathDoesNotExistError
+        PathTypeError
+        ValidationFailedError
+    """
+    logger.debug('Rehearse upgrade parameters include'
+                 ' plugin_config: {},'
+                 ' data_directory: {},'
+                 ' lua_version: {},'
+                 ' migration_ids: {}'.format(plugin_config, data_directory,
+                                             lua_version, migration_ids))
+    if not os.path.exists(data_directory):
+        raise exceptions.PathDoesNotExistError(data_directory)
+    if not os.path.isdir(data_directory):
+        raise exceptions.PathTypeError(data_directory, 'directory')
+
+    if migration_ids is not None:
+        migration_ids = [
+            _standardize_migration_id(migration_id)
+            for migration_id in migration_ids
+        ]
+
+    result = plugin_util.validate_plugin_config_file(plugin_config, True)
+    plugin_config_content = result.plugin_config_content
+    src_dir = file_util.get_src_dir_path(plugin_config,
+                                         plugin_config_content['srcDir'])
+    module, entry_point = PluginValidator.split_entry_point(
+        plugin_config_content['entryPoint'])
+
+    importer = PluginImporter(src_dir, module, entry_point,
+                              plugin_config_content['pluginType'])
+    importer.validate_plugin_module()
+
+    return _rehearse_in_subprocess(src_dir, module, entry_point,
+                                   data_directory, lua_version, migration_ids)
+
+
+def replay_upgrade(upgrade,
+                   data_directory,
+                   lua_version=None,
+                   migration_ids=None):
+    """
+    Replays the objects of a data directory through the data migrations of
+    upgrade operations, and returns the UpgradeRehearsal measuring them.
+    Runs in the rehearsal sub process, with the standardized migration ids.
+    """
+    if migration_ids is None:
+        migration_ids = upgrade.migration_id_list
+
+    rehearsal = UpgradeRehearsal()
+    for object_type in OBJECT_TYPES:
+        directory = os.path.join(data_directory, object_type)
+        if not os.path.isdir(directory):
+            continue
+        logger.info('Replaying the {} objects of {}'.format(
+            object_type, directory))
+        _replay_objects(rehearsal, object_type, directory,
+                        _migration_chain(upgrade, object_type, lua_version,
+                                         migration_ids))
+    return rehearsal
+
+
+def _rehearse_in_subprocess(src_dir, module, entry_point, data_directory,
+                            lua_version, migration_ids):
+    """
+    Runs the rehearsal in a sub process and returns its UpgradeRehearsal.
+    NOTE:
+        The queue is read before joining the process, as a process that put
+        a large rehearsal on the queue cannot exit until it is read.
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_rehearse_plugin,
+                                      args=(queue, src_dir, module,
+                                            entry_point, data_directory,
+                                            lua_version, migration_ids))
+    process.start()
+    try:
+        result = None
+        while result is None:
+            try:
+                result = queue.get(timeout=POLL_SECONDS)
+            except queue_module.Empty:
+                if not process.is_alive() and queue.empty():
+                    raise exceptions.SDKToolingError(
+                        'The upgrade rehearsal process exited with code {}'
+                        ' without a result.'.format(process.exitcode))
+    finally:
+        process.join()
+
+    if 'rehearsal' in result:
+        return result['rehearsal']
+    if 'exception' in result:
+        raise exceptions.ValidationFailedError(
+            {'exception': [result['exception']]})
+    raise exceptions.SDKToolingError(str(result['sdk exception']))
+
+
+def _rehearse_plugin(queue, src_dir, module, entry_point, data_directory,
+                     lua_version, migration_ids):
+    """
+    Imports the plugin module the same way as PluginImporter, replays the
+    objects through the upgrade operations of its plugin object and puts the
+    rehearsal, or the error that stopped it, on the queue.
+    """
+    try:
+        module_content = plugin_importer._import_helper(
+            queue, src_dir, module)
+    except exceptions.UserError:
+        #
+        # Exception here means there was an error importing the module and
+        # queue is updated with the exception details inside _import_helper.
+        #
+        return
+
+    try:
+        upgrade = getattr(module_content, entry_point).upgrade
+        queue.put({
+            'rehearsal':
+            replay_upgrade(upgrade, data_directory, lua_version,
+                           migration_ids)
+        })
+    except Exception as err:
+        queue.put({'sdk exception': exceptions.SDKToolingError(str(err))})
+
+
+def _standardize_migration_id(migration_id):
+    """
+    Returns the canonical form of a migration id, under which the migrations
+    of a plugin are registered, e.g. '1.2' for '01.02.0'.
+    """
+    if not _MIGRATION_ID_REGEX.match(migration_id):
+        raise exceptions.UserError(
+            'The migration id \'{}\' does not follow the format'
+            ' \'{}\'.'.format(migration_id, _MIGRATION_ID_REGEX.pattern))
+    parts = [int(part) for part in migration_id.split('.')]
+    while len(parts) > 1 and parts[-1] == 0:
+        parts.pop()
+    return '.'.join(str(part) for part in parts)
+
+
+def _migration_chain(upgrade, object_type, lua_version, migration_ids):
+    """
+    Returns the (label, migration) pairs of the Lua and then platform
+    migrations the platform runs on the objects of a type, using the same
+    lookups as the upgrade operations.
+    """
+    chain = []
+    for name, migrations, argument in (('lua', upgrade.lua_migrations,
+                                        lua_version),
+                                       ('', upgrade.platform_migrations,
+                                        migration_ids)):
+        impls = getattr(migrations,
+                        'get_{}_impls_to_exec'.format(object_type))(argument)
+        ids = dict(
+            (impl, migration_id) for migration_id, impl in getattr(
+                migrations, 'get_{}_dict'.format(object_type))().items())
+        for impl in impls:
+            label = '{} {}'.format(ids[impl], impl.__name__)
+            chain.append((' '.join([name, label]).strip(), impl))
+    return chain
+
+
+def _read_objects(directory):
+    """
+    Yields the (object reference, JSON parameters) pairs of the object files
+    of a directory, in the order of their references.
+    """
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(OBJECT_FILE_SUFFIX):
+            continue
+        with open(os.path.join(directory, name), 'rb') as f:
+            metadata = f.read().decode('utf-8')
+        yield name[:-len(OBJECT_FILE_SUFFIX)], metadata
+
+
+def _replay_objects(rehearsal, object_type, directory, chain):
+    type_stats = rehearsal.object_types.setdefault(
+        object_type, ObjectTypeStats(object_type))
+    migration_stats = [
+        MigrationStats(object_type, label) for label, _ in chain
+    ]
+    rehearsal.migrations.extend(migration_stats)
+
+    for object_ref, metadata in _read_objects(directory):
+        input_bytes = len(metadata.encode('utf-8'))
+        type_stats.objects += 1
+        type_stats.input_bytes += input_bytes
+        start = _clock()
+        try:
+            current_metadata = json.loads(metadata)
+        except ValueError as err:
+            _add_failure(rehearsal, type_stats, object_ref, 'decoding', err)
+            type_stats.seconds += _clock() - start
+            continue
+
+        for (label, migration), stats in zip(chain, migration_stats):
+            migration_start = _clock()
+            try:
+                current_metadata = migration(current_metadata)
+            except Exception as err:
+                stats.add(_clock() - migration_start, failed=True)
+                _add_failure(rehearsal, type_stats, object_ref, label, err)
+                break
+            stats.add(_clock() - migration_start)
+        else:
+            try:
+                upgraded = json.dumps(current_metadata)
+            except (TypeError, ValueError) as err:
+                _add_failure(rehearsal, type_stats, object_ref, 'encoding',
+                             err)
+            else:
+                type_stats.migrated_input_bytes += input_bytes
+                type_stats.output_bytes += len(upgraded.encode('utf-8'))
+        type_stats.seconds += _clock() - start
+
+
+def _add_failure(rehearsal, type_stats, object_ref, label, err):
+    type_stats.failures += 1
+    rehearsal.failures.append(
+        (type_stats.object_type, object_ref, label, '{}: {}'.format(
+            type(err).__name__, err)))
+
+
+def _format_delta(input_bytes, output_bytes):
+    if not input_bytes:
+        return '-'
+    return '{:+.1f}%'.format(
+        (output_bytes - input_bytes) * 100.0 / input_bytes)
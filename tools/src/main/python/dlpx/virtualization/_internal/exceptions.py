@@ -1,5 +1,5 @@
 #
-# Copyright (c) 2019 by Delphix. All rights reserved.
+# Copyright (c) 2019, 2020 by Delphix. All rights reserved.
 #
 
 import collections
@@ -295,6 +295,20 @@ class SubprocessFailedError(UserError):
         super(SubprocessFailedError, self).__init__(message)
 
 
+class UpgradeRehearsalFailedError(UserError):
+    """
+    UpgradeRehearsalFailedError gets raised when the data migrations of a
+    plugin failed on some of the objects replayed by the rehearse-upgrade
+    command.
+    """
+    def __init__(self, failures, objects):
+        self.failures = failures
+        self.objects = objects
+        message = ('The data migrations failed on {} of {} objects.'
+                   ' UPGRADE REHEARSAL FAILED.'.format(failures, objects))
+        super(UpgradeRehearsalFailedError, self).__init__(message)
+
+
 class ValidationFailedError(UserError):
     """
     ValidationFailedError gets raised when validation fails on plugin config
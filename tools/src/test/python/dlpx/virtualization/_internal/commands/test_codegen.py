@@ -185,9 +185,31 @@ class TestCodegen:
         with open(expected_file, 'rb') as f:
             content = json.load(f)
 
+        schema_content['repositoryDefinition'][
+            codegen.IDENTITY_FIELDS_EXTENSION] = ['name']
+        schema_content['sourceConfigDefinition'][
+            codegen.IDENTITY_FIELDS_EXTENSION] = ['path']
         assert content['definitions'] == schema_content
         assert content['info']['title'] == name
 
+    @staticmethod
+    def test_write_swagger_file_identity_fields(tmpdir, schema_content):
+        codegen._write_swagger_file('test', schema_content, tmpdir.strpath)
+
+        with open(tmpdir.join(codegen.SWAGGER_FILE_NAME).strpath, 'rb') as f:
+            definitions = json.load(f)['definitions']
+
+        assert definitions['repositoryDefinition']['x-identityFields'] == [
+            'name'
+        ]
+        assert definitions['sourceConfigDefinition']['x-identityFields'] == [
+            'path'
+        ]
+        assert 'x-identityFields' not in definitions['snapshotDefinition']
+
+        # The schemas passed in are left untouched.
+        assert 'x-identityFields' not in schema_content['repositoryDefinition']
+
     @staticmethod
     def test_write_swagger_file_with_delphix_refs(
             tmpdir, schema_content, linked_source_definition_with_refs,
@@ -204,6 +226,10 @@ class TestCodegen:
 
         schema_content['linkedSourceDefinition'] = \
             linked_source_definition_with_opaque_refs
+        schema_content['repositoryDefinition'][
+            codegen.IDENTITY_FIELDS_EXTENSION] = ['name']
+        schema_content['sourceConfigDefinition'][
+            codegen.IDENTITY_FIELDS_EXTENSION] = ['path']
         assert content['definitions'] == schema_content
         assert content['info']['title'] == name
 
@@ -0,0 +1,166 @@
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+
+import json
+import sys
+
+import pytest
+from dlpx.virtualization._internal import exceptions
+from dlpx.virtualization._internal.commands import rehearse_upgrade
+from dlpx.virtualization.platform import MigrationType, Plugin
+
+PLUGIN_MODULE = '''
+from dlpx.virtualization.platform import Plugin
+
+vfiles = Plugin()
+
+
+@vfiles.upgrade.repository('2020.01.02')
+def add_port(old_repository):
+    return dict(old_repository, port=5432)
+'''
+
+
+@pytest.fixture
+def plugin_config_content(plugin_config_content, src_dirname):
+    # The source directory is relative to the plugin config file.
+    return dict(plugin_config_content, srcDir=src_dirname)
+
+
+@pytest.fixture
+def plugin_module(src_dir, entry_point_module):
+    with open('{}/{}.py'.format(src_dir, entry_point_module), 'w') as f:
+        f.write(PLUGIN_MODULE)
+    yield
+    sys.modules.pop(entry_point_module, None)
+
+
+@pytest.fixture
+def upgrade():
+    plugin = Plugin()
+
+    @plugin.upgrade.repository('1.1', MigrationType.LUA)
+    def lua_repository(old_repository):
+        return dict(old_repository, lua=True)
+
+    @plugin.upgrade.repository('2020.01.02')
+    def add_port(old_repository):
+        if old_repository['name'] == 'bad':
+            raise ValueError('bad repository')
+        return dict(old_repository, port=5432)
+
+    @plugin.upgrade.snapshot('2020.1.3')
+    def drop_files(old_snapshot):
+        return {'name': old_snapshot['name']}
+
+    return plugin.upgrade
+
+
+@pytest.fixture
+def data_directory(tmpdir):
+    data = tmpdir.join('upgrade_data')
+    for object_type, object_ref, metadata in [
+        ('repository', 'REPOSITORY-1', {'name': 'one'}),
+        ('repository', 'REPOSITORY-2', {'name': 'bad'}),
+        ('snapshot', 'SNAPSHOT-1', {'name': 's', 'files': ['a', 'b']}),
+    ]:
+        data.join(object_type, object_ref + '.json').write(
+            json.dumps(metadata), ensure=True)
+    data.join('snapshot', 'notes.txt').write('not an object')
+    return data.strpath
+
+
+class TestRehearseUpgrade:
+    @staticmethod
+    def test_replay_upgrade(upgrade, data_directory):
+        rehearsal = rehearse_upgrade.replay_upgrade(upgrade,
+                                                    data_directory,
+                                                    lua_version='1.0')
+
+        assert list(rehearsal.object_types) == ['repository', 'snapshot']
+        repository = rehearsal.object_types['repository']
+        assert (repository.objects, repository.failures) == (2, 1)
+        assert repository.output_bytes == len(
+            '{"lua": true, "name": "one", "port": 5432}')
+        snapshot = rehearsal.object_types['snapshot']
+        assert (snapshot.objects, snapshot.failures) == (1, 0)
+        assert snapshot.output_bytes < snapshot.input_bytes
+
+        assert [(m.object_type, m.label, m.objects, m.failures)
+                for m in rehearsal.migrations] == [
+                    ('repository', 'lua 1.1 lua_repository', 2, 0),
+                    ('repository', '2020.1.2 add_port', 2, 1),
+                    ('snapshot', '2020.1.3 drop_files', 1, 0)
+                ]
+        assert rehearsal.failures == [
+            ('repository', 'REPOSITORY-2', '2020.1.2 add_port',
+             'ValueError: bad repository')
+        ]
+        assert rehearsal.objects == 3
+
+        report = rehearsal.format()
+        assert 'Total: 3 objects' in report
+        assert ('repository REPOSITORY-2: 2020.1.2 add_port failed with'
+                ' ValueError: bad repository') in report
+
+    @staticmethod
+    def test_replay_upgrade_migration_ids(upgrade, data_directory):
+        rehearsal = rehearse_upgrade.replay_upgrade(
+            upgrade, data_directory, migration_ids=['2020.1.3'])
+
+        assert [m.label for m in rehearsal.migrations] == [
+            '2020.1.3 drop_files'
+        ]
+        assert not rehearsal.failures
+
+    @staticmethod
+    def test_rehearse_upgrade(plugin_module, entry_point_module,
+                              plugin_config_file, data_directory):
+        rehearsal = rehearse_upgrade.rehearse_upgrade(
+            plugin_config_file, data_directory, migration_ids=['2020.01.2.0'])
+
+        assert [(m.label, m.objects, m.failures)
+                for m in rehearsal.migrations] == [('2020.1.2 add_port', 2, 0)]
+        assert rehearsal.object_types['snapshot'].objects == 1
+        assert not rehearsal.failures
+        # The plugin module is only imported in sub processes.
+        assert entry_point_module not in sys.modules
+
+    @staticmethod
+    def test_rehearse_upgrade_bad_migration_id(upgrade, plugin_config_file,
+                                               data_directory):
+        with pytest.raises(exceptions.UserError) as err_info:
+            rehearse_upgrade.rehearse_upgrade(plugin_config_file,
+                                              data_directory,
+                                              migration_ids=['2020.a'])
+
+        assert err_info.value.message == (
+            "The migration id '2020.a' does not follow the format"
+            " '^\\d+(\\.\\d+)*$'.")
+
+    @staticmethod
+    def test_replay_upgrade_bad_json(upgrade, data_directory, tmpdir):
+        tmpdir.join('upgrade_data', 'snapshot',
+                    'SNAPSHOT-2.json').write('{"name": ')
+
+        rehearsal = rehearse_upgrade.replay_upgrade(upgrade, data_directory)
+
+        assert rehearsal.failures[-1][:3] == ('snapshot', 'SNAPSHOT-2',
+                                              'decoding')
+        assert rehearsal.migrations[-1].objects == 1
+
+    @staticmethod
+    def test_rehearse_upgrade_missing_data(plugin_config_file, tmpdir):
+        with pytest.raises(exceptions.PathDoesNotExistError):
+            rehearse_upgrade.rehearse_upgrade(plugin_config_file,
+                                              tmpdir.join('missing').strpath)
+
+    @staticmethod
+    def test_rehearse_upgrade_import_error(src_dir, plugin_config_file,
+                                           data_directory):
+        with pytest.raises(exceptions.ValidationFailedError) as err_info:
+            rehearse_upgrade.rehearse_upgrade(plugin_config_file,
+                                              data_directory)
+
+        assert 'python_vfiles' in err_info.value.message
@@ -796,3 +796,71 @@ class TestDownloadCli:
             u"'--engine': Option is required "
             u"and must be specified via the command line."
             u"\n")
+
+
+class TestRehearseUpgradeCli:
+    @staticmethod
+    @mock.patch('dlpx.virtualization._internal.commands.rehearse_upgrade.'
+                'rehearse_upgrade')
+    def test_valid_params(mock_rehearse_upgrade, plugin_config_file, tmpdir):
+        mock_rehearse_upgrade.return_value.format.return_value = 'report'
+        mock_rehearse_upgrade.return_value.failures = []
+
+        runner = click_testing.CliRunner()
+        result = runner.invoke(cli.delphix_sdk, [
+            'rehearse-upgrade', '-c', plugin_config_file, '-d',
+            tmpdir.strpath, '-l', '1.1', '-m', '2020.1', '-m', '2020.2'
+        ])
+
+        assert result.exit_code == 0, 'Output: {}'.format(result.output)
+        assert result.output == 'report\n'
+        mock_rehearse_upgrade.assert_called_once_with(
+            plugin_config_file, tmpdir.strpath, '1.1', ('2020.1', '2020.2'))
+
+    @staticmethod
+    @mock.patch('dlpx.virtualization._internal.commands.rehearse_upgrade.'
+                'rehearse_upgrade')
+    def test_default_migration_ids(mock_rehearse_upgrade, plugin_config_file,
+                                   tmpdir):
+        mock_rehearse_upgrade.return_value.format.return_value = 'report'
+        mock_rehearse_upgrade.return_value.failures = []
+
+        runner = click_testing.CliRunner()
+        result = runner.invoke(cli.delphix_sdk, [
+            'rehearse-upgrade', '-c', plugin_config_file, '-d',
+            tmpdir.strpath
+        ])
+
+        assert result.exit_code == 0, 'Output: {}'.format(result.output)
+        mock_rehearse_upgrade.assert_called_once_with(
+            plugin_config_file, tmpdir.strpath, None, None)
+
+    @staticmethod
+    @mock.patch('dlpx.virtualization._internal.commands.rehearse_upgrade.'
+                'rehearse_upgrade')
+    def test_failures(mock_rehearse_upgrade, plugin_config_file, tmpdir):
+        mock_rehearse_upgrade.return_value.format.return_value = 'report'
+        mock_rehearse_upgrade.return_value.failures = [
+            ('repository', 'REPOSITORY-1', '2020.1 add_port', 'ValueError')
+        ]
+        mock_rehearse_upgrade.return_value.objects = 10
+
+        runner = click_testing.CliRunner()
+        result = runner.invoke(cli.delphix_sdk, [
+            'rehearse-upgrade', '-c', plugin_config_file, '-d',
+            tmpdir.strpath
+        ])
+
+        assert result.exit_code == 1, 'Output: {}'.format(result.output)
+        assert result.output == (
+            'report\nThe data migrations failed on 1 of 10 objects.'
+            ' UPGRADE REHEARSAL FAILED.\n')
+
+    @staticmethod
+    def test_missing_data_directory(plugin_config_file):
+        runner = click_testing.CliRunner()
+        result = runner.invoke(cli.delphix_sdk,
+                               ['rehearse-upgrade', '-c', plugin_config_file])
+
+        assert result.exit_code == 2
+        assert 'Option is required' in result.output